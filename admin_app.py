@@ -1,90 +1,110 @@
 import streamlit as st
 import json
-import matplotlib.pyplot as plt
-import gpxpy
+import math
+import os
+import sqlite3
+import time
+import uuid
 import base64
+from concurrent.futures import Executor
+from itertools import islice
+
+from trailMng.batch import make_pool, parse_uploads
+from trailMng.cache import TrackCache, content_key
+from trailMng.drafts import TRAIL_FIELDS, Draft, DraftStore, InvalidDocument, new_draft
+from trailMng.media import MediaPreviewService
+from trailMng.patch import diff_documents
+from trailMng.profiling import DEFAULT_LOG, Profiler
+from trailMng.render import FigureCache, RenderParams, render_track_map, render_tracks_overlay
+from trailMng.search import TrailSearchIndex, group_by_trail
+from trailMng.spatial import SpatialIndex
+from trailMng.simplify import DEFAULT_TOLERANCE_PX
+from trailMng.trails import MEDIA_TYPES, build_trail_json, find_mismatches, with_media_key
+
+# Define a list of colors for the individual media item frames (distinct and vibrant)
+FRAME_COLORS = [
+    "#FFDCDC",  # Light Red
+    "#DCF7FF",  # Light Blue
+    "#DCFFDC",  # Light Green
+    "#FFFBDC",  # Light Yellow
+    "#FFEDDC",  # Light Orange
+    "#E6E6FA",  # Lavender
+    "#D4EDDA"   # Mint Green
+]
+BORDER_COLORS = [
+    "#FF6347",  # Tomato
+    "#00BFFF",  # Deep Sky Blue
+    "#32CD32",  # Lime Green
+    "#FFD700",  # Gold
+    "#FF8C00",  # Dark Orange
+    "#9370DB",  # Medium Purple
+    "#20B2AA"   # Light Sea Green
+]
+
+# Media items rendered per page of the editor
+MEDIA_PAGE_SIZE = 10
+
+# Trail JSON directory indexed by the search tab
+TRAILS_DIR = os.environ.get("TRAILMNG_TRAILS_DIR", os.path.join(os.path.dirname(__file__), "trailjsons"))
+# Trail tracks, one <trailId>.gpx per trail, indexed for the nearby and overlap queries
+GPX_DIR = os.environ.get("TRAILMNG_GPX_DIR", os.path.join(os.path.dirname(__file__), "gpx"))
 
 
 # Function to create or edit trail description JSON
-def create_or_edit_trail_description():
+def create_or_edit_trail_description(profiler: Profiler):
     """
     Creates a user interface for creating and editing trail description JSON files.
 
     This function allows uploading existing English and Hebrew JSON files, modifying their content,
     adding or removing media items at any position, and downloading the updated JSON files.
+    Every edit is saved to the draft store as it is made, so a refresh (the draft id is kept in
+    the URL) or the "Saved drafts" list brings the draft back. Differences between the uploaded
+    English and Hebrew files are listed, and the export shows the changes to each uploaded file.
     """
     st.header("Trail Description JSON Creation/Editing")
-
-    # Use session state to store media list
-    if 'media_list' not in st.session_state:
-        st.session_state.media_list = []
+    store = get_draft_store()
 
     # Upload existing JSON files
     uploaded_file_en = st.file_uploader("Upload English JSON file", type=["json"], key="en")
     uploaded_file_he = st.file_uploader("Upload Hebrew JSON file", type=["json"], key="he")
 
-    # Initialize variables
-    trail_id = ""
-    trail_name_en = ""
-    trail_description_en = ""
-    trail_name_he = ""
-    trail_description_he = ""
-    media_dict = {}
-
-    # Load English JSON
-    if uploaded_file_en is not None:
-        try:
-            trail_data_en = json.load(uploaded_file_en)
-            trail_id = trail_data_en.get("trailId", "")
-            trail_name_en = trail_data_en.get("name", "")
-            trail_description_en = trail_data_en.get("description", "")
-            for media in trail_data_en.get("media", []):
-                media_id = media.get("id", "")
-                if media_id not in media_dict:
-                    media_dict[media_id] = {}
-                media_dict[media_id].update({
-                    "id": media_id,
-                    "type": media.get("type", ""),
-                    "url": media.get("url", ""),
-                    "description_en": media.get("description", "")
-                })
-        except json.JSONDecodeError:
-            st.error("Invalid English JSON file.")
-            return
-
-    # Load Hebrew JSON
-    if uploaded_file_he is not None:
-        try:
-            trail_data_he = json.load(uploaded_file_he)
-            trail_id = trail_data_he.get("trailId", trail_id)
-            trail_name_he = trail_data_he.get("name", "")
-            trail_description_he = trail_data_he.get("description", "")
-            for media in trail_data_he.get("media", []):
-                media_id = media.get("id", "")
-                if media_id not in media_dict:
-                    media_dict[media_id] = {}
-                media_dict[media_id].update({
-                    "id": media_id,
-                    "type": media.get("type", ""),
-                    "url": media.get("url", ""),
-                    "description_he": media.get("description", "")
-                })
-        except json.JSONDecodeError:
-            st.error("Invalid Hebrew JSON file.")
-            return
-
-    if not st.session_state.media_list and media_dict:
-        st.session_state.media_list = list(media_dict.values())
-
-    # Trail fields
-    trail_id = st.text_input("Trail ID", value=trail_id)
+    # A new upload is parsed once; its draft, edits included, is then read from the store
+    with profiler.span("editor.load_json"):
+        uploads = {lang: f for lang, f in (("en", uploaded_file_en), ("he", uploaded_file_he)) if f is not None}
+        source = sorted((lang, f.file_id) for lang, f in uploads.items())
+        if uploads and source != st.session_state.get("draft_source"):
+            try:
+                draft_id = store.open_upload({lang: f.getvalue() for lang, f in uploads.items()})
+            except InvalidDocument as e:
+                st.error(f"Invalid {'English' if e.lang == 'en' else 'Hebrew'} JSON file.")
+                return
+            st.session_state.draft_source = source
+            open_draft(store.load(draft_id))
+
+    # Otherwise keep the session's draft, or the one named in the URL after a refresh
+    with profiler.span("editor.draft"):
+        if "draft_trail_id" not in st.session_state:
+            draft_id = st.session_state.get("draft_id") or st.query_params.get("draft", "")
+            open_draft(store.load(draft_id) or new_draft())
+        saved_drafts(store)
+    mismatches = st.session_state.draft_mismatches
+    if mismatches:
+        with st.expander(f"⚠️ {len(mismatches)} differences between the English and Hebrew files"):
+            st.markdown("\n".join(f"- {mismatch.message}" for mismatch in mismatches))
+
+    # Trail fields, each saved on change
+    trail_id = st.text_input("Trail ID", key="draft_trail_id", on_change=save_draft_field, args=("trail_id",))
     st.subheader("English Version")
-    trail_name_en = st.text_input("Trail Name (English)", value=trail_name_en)
-    trail_description_en = st.text_area("Trail Description (English)", value=trail_description_en)
+    trail_name_en = st.text_input("Trail Name (English)", key="draft_name_en",
+                                  on_change=save_draft_field, args=("name_en",))
+    trail_description_en = st.text_area("Trail Description (English)", key="draft_description_en",
+                                        on_change=save_draft_field, args=("description_en",))
 
     st.subheader("Hebrew Version")
-    trail_name_he = st.text_input("Trail Name (Hebrew)", value=trail_name_he)
-    trail_description_he = st.text_area("Trail Description (Hebrew)", value=trail_description_he)
+    trail_name_he = st.text_input("Trail Name (Hebrew)", key="draft_name_he",
+                                  on_change=save_draft_field, args=("name_he",))
+    trail_description_he = st.text_area("Trail Description (Hebrew)", key="draft_description_he",
+                                        on_change=save_draft_field, args=("description_he",))
 
     # --- Container for the entire Media Items section (less dominant frame) ---
     with st.container():
@@ -98,157 +118,479 @@ def create_or_edit_trail_description():
         st.subheader("Media Items")
 
         if st.button("➕ Add Media Item at the Top"):
-            st.session_state.media_list.insert(0, {})
+            item = with_media_key({})
+            st.session_state.media_list.insert_after(None, item)
+            store.insert_media(st.session_state.draft_id, item)
             st.rerun()
 
-        # Define a list of colors for the individual media item frames (distinct and vibrant)
-        frame_colors = [
-            "#FFDCDC",  # Light Red
-            "#DCF7FF",  # Light Blue
-            "#DCFFDC",  # Light Green
-            "#FFFBDC",  # Light Yellow
-            "#FFEDDC",  # Light Orange
-            "#E6E6FA",  # Lavender
-            "#D4EDDA"   # Mint Green
-        ]
-        border_colors = [
-            "#FF6347",  # Tomato
-            "#00BFFF",  # Deep Sky Blue
-            "#32CD32",  # Lime Green
-            "#FFD700",  # Gold
-            "#FF8C00",  # Dark Orange
-            "#9370DB",  # Medium Purple
-            "#20B2AA"   # Light Sea Green
-        ]
-
-
-        # Media fields
-        for i, media_item in enumerate(st.session_state.media_list):
-            with st.container():
-                # Cycle through the colors for each media item's frame
-                bg_color = frame_colors[i % len(frame_colors)]
-                b_color = border_colors[i % len(border_colors)] # Use a distinct border color
-                st.markdown(
-                    f"""
-                    <div style="background-color: {bg_color}; border: 3px solid {b_color}; padding: 18px; border-radius: 10px; margin-bottom: 12px; margin-top: 12px;">
-                    """,
-                    unsafe_allow_html=True
-                )
-                st.markdown(f"#### 🖼️ Media Item {i + 1}")
-
-                media_item["id"] = st.text_input(f"Media ID", value=media_item.get("id", ""), key=f"id_{i}")
-                media_item["type"] = st.selectbox(f"Media Type", ["image", "video"],
-                                                  index=["image", "video"].index(media_item.get("type", "image")),
-                                                  key=f"type_{i}")
-                media_item["url"] = st.text_input(f"Media URL", value=media_item.get("url", ""), key=f"url_{i}")
-
-                if media_item["type"] == "image" and media_item["url"]:
-                    st.image(media_item["url"], caption=f"Media {i + 1}", use_container_width=True)
-                elif media_item["type"] == "video" and media_item["url"]:
+        # Only the current page of media items is rendered
+        media_list = st.session_state.media_list
+        pages = max(1, math.ceil(len(media_list) / MEDIA_PAGE_SIZE))
+        page = 1
+        if pages > 1:
+            if st.session_state.get("media_page", 1) > pages:
+                st.session_state.media_page = pages
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="media_page")
+        first = (page - 1) * MEDIA_PAGE_SIZE
+        page_keys = list(islice(media_list.keys(), first, first + MEDIA_PAGE_SIZE))
+        # Fetch the page's missing previews concurrently rather than one item at a time
+        with profiler.span("editor.media_previews"):
+            get_media_previews().fetch_many(media_list[key].get("url", "") for key in page_keys)
+        with profiler.span("editor.media_items"):
+            for i, key in enumerate(page_keys, start=first):
+                media_item_editor(i, key)
+
+        st.markdown("</div>", unsafe_allow_html=True) # Closing the outer div for the media section
+
+    # Preview and download
+    with profiler.span("editor.export"):
+        if st.button("Preview and Download JSONs"):
+            # English JSON
+            trail_data_en = build_trail_json(trail_id, trail_name_en, trail_description_en,
+                                             st.session_state.media_list, "en")
+            st.subheader("English JSON Preview")
+            st.json(trail_data_en)
+            json_data_en = json.dumps(trail_data_en, ensure_ascii=False, indent=4)
+            b64_en = base64.b64encode(json_data_en.encode()).decode()
+            href_en = f'<a href="data:file/json;base64,{b64_en}" download="{trail_id}_en.json">Download English JSON File</a>'
+            st.markdown(href_en, unsafe_allow_html=True)
+            show_changes("en", trail_data_en, trail_id)
+
+            # Hebrew JSON
+            trail_data_he = build_trail_json(trail_id, trail_name_he, trail_description_he,
+                                             st.session_state.media_list, "he")
+            st.subheader("Hebrew JSON Preview")
+            st.json(trail_data_he)
+            json_data_he = json.dumps(trail_data_he, ensure_ascii=False, indent=4)
+            b64_he = base64.b64encode(json_data_he.encode()).decode()
+            href_he = f'<a href="data:file/json;base64,{b64_he}" download="{trail_id}_he.json">Download Hebrew JSON File</a>'
+            st.markdown(href_he, unsafe_allow_html=True)
+            show_changes("he", trail_data_he, trail_id)
+
+
+@st.fragment
+def media_item_editor(i, media_key):
+    """
+    Renders the editor for one media item.
+
+    Runs as a fragment, so typing in one item only re-executes that item. Widget keys come from
+    the item's stable editor key rather than its position, so inserting or removing items does
+    not shift widget state onto the wrong item. Each field is saved to the draft on change.
+    """
+    media_item = st.session_state.media_list[media_key]
+    with st.container():
+        # Cycle through the colors for each media item's frame
+        bg_color = FRAME_COLORS[i % len(FRAME_COLORS)]
+        b_color = BORDER_COLORS[i % len(BORDER_COLORS)] # Use a distinct border color
+        st.markdown(
+            f"""
+            <div style="background-color: {bg_color}; border: 3px solid {b_color}; padding: 18px; border-radius: 10px; margin-bottom: 12px; margin-top: 12px;">
+            """,
+            unsafe_allow_html=True
+        )
+        st.markdown(f"#### 🖼️ Media Item {i + 1}")
+
+        media_type = media_item.get("type") or "image"
+        media_item["id"] = st.text_input(f"Media ID", value=media_item.get("id", ""), key=f"id_{media_key}",
+                                         on_change=save_media_field, args=(media_key, "id", f"id_{media_key}"))
+        media_item["type"] = st.selectbox(f"Media Type", MEDIA_TYPES,
+                                          index=MEDIA_TYPES.index(media_type) if media_type in MEDIA_TYPES else 0,
+                                          key=f"type_{media_key}",
+                                          on_change=save_media_field, args=(media_key, "type", f"type_{media_key}"))
+        media_item["url"] = st.text_input(f"Media URL", value=media_item.get("url", ""), key=f"url_{media_key}",
+                                          on_change=save_media_field, args=(media_key, "url", f"url_{media_key}"))
+
+        # Previews come from the local cache, never the full-resolution URL
+        if media_item["url"]:
+            previews = get_media_previews()
+            preview = previews.info(media_item["url"])
+            thumbnail = previews.thumbnail_bytes(preview)
+            if not preview.ok:
+                st.warning(f"Media URL is {preview.describe()}")
+            elif media_item["type"] == "image" and thumbnail is not None:
+                st.image(thumbnail, caption=f"Media {i + 1} ({preview.describe()})")
+            else:
+                st.caption(preview.describe())
+                if media_item["type"] == "video" and st.toggle("Play video", key=f"play_{media_key}"):
                     st.video(media_item["url"])
 
-                media_item["description_en"] = st.text_area(f"Media Description (English)",
-                                                            value=media_item.get("description_en", ""),
-                                                            key=f"desc_en_{i}")
-                media_item["description_he"] = st.text_area(f"Media Description (Hebrew)",
-                                                            value=media_item.get("description_he", ""),
-                                                            key=f"desc_he_{i}")
+        media_item["description_en"] = st.text_area(f"Media Description (English)",
+                                                    value=media_item.get("description_en", ""),
+                                                    key=f"desc_en_{media_key}", on_change=save_media_field,
+                                                    args=(media_key, "description_en", f"desc_en_{media_key}"))
+        media_item["description_he"] = st.text_area(f"Media Description (Hebrew)",
+                                                    value=media_item.get("description_he", ""),
+                                                    key=f"desc_he_{media_key}", on_change=save_media_field,
+                                                    args=(media_key, "description_he", f"desc_he_{media_key}"))
+
+        # Structural changes need the whole list re-rendered
+        media_list = st.session_state.media_list
+        before, after = media_list.key_before(media_key), media_list.key_after(media_key)
+        col1, col2, col3 = st.columns(3)
+        if col1.button(f"Remove Media Item {i + 1}", key=f"remove_{media_key}"):
+            media_list.remove(media_key)
+            get_draft_store().remove_media(st.session_state.draft_id, media_key)
+            st.rerun()
+        if col2.button("⬆️ Move Up", key=f"up_{media_key}", disabled=before is None):
+            anchor = media_list.key_before(before)
+            media_list.move_after(media_key, anchor)
+            get_draft_store().move_media(st.session_state.draft_id, media_key, anchor)
+            st.rerun()
+        if col3.button("⬇️ Move Down", key=f"down_{media_key}", disabled=after is None):
+            media_list.move_after(media_key, after)
+            get_draft_store().move_media(st.session_state.draft_id, media_key, after)
+            st.rerun()
 
-                if st.button(f"Remove Media Item {i + 1}", key=f"remove_{i}"):
-                    st.session_state.media_list.pop(i)
-                    st.rerun()
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    if st.button(f"➕ Add Media Item Below Item {i + 1}", key=f"add_after_{media_key}"):
+        item = with_media_key({})
+        st.session_state.media_list.insert_after(media_key, item)
+        get_draft_store().insert_media(st.session_state.draft_id, item, after=media_key)
+        st.rerun()
+
+
+def open_draft(draft: Draft):
+    """Make ``draft`` the one being edited: fill the editor from it and keep its id in the URL."""
+    st.session_state.draft_id = draft.id
+    for field in TRAIL_FIELDS:
+        st.session_state[f"draft_{field}"] = getattr(draft.trail, field)
+    st.session_state.media_list = draft.trail.media_list
+    st.session_state.media_page = 1
+    st.session_state.draft_bases = draft.bases
+    st.session_state.draft_mismatches = (find_mismatches(draft.bases["en"], draft.bases["he"])
+                                         if len(draft.bases) == 2 else [])
+    st.query_params["draft"] = draft.id
+
+
+def show_changes(lang, document, trail_id):
+    """The changes to the uploaded file of ``lang`` as a JSON Patch, for review and download."""
+    base = st.session_state.draft_bases.get(lang)
+    if base is None:
+        return
+    ops = diff_documents(base, document)
+    label = "English" if lang == "en" else "Hebrew"
+    st.subheader(f"{label} Changes (JSON Patch)")
+    if not ops:
+        st.caption("No changes to the uploaded file.")
+        return
+    st.json(ops)
+    b64 = base64.b64encode(json.dumps(ops, ensure_ascii=False, indent=4).encode()).decode()
+    href = f'<a href="data:file/json;base64,{b64}" download="{trail_id}_{lang}.patch.json">Download {label} JSON Patch</a>'
+    st.markdown(href, unsafe_allow_html=True)
+
+
+def save_draft_field(field):
+    """on_change callback of a trail field widget."""
+    get_draft_store().save_field(st.session_state.draft_id, field, st.session_state[f"draft_{field}"])
+
+
+def save_media_field(media_key, field, widget_key):
+    """on_change callback of a media item widget."""
+    get_draft_store().save_media_field(st.session_state.draft_id, media_key, field, st.session_state[widget_key])
+
+
+def saved_drafts(store: DraftStore):
+    """Reopen a recently edited draft, or start an empty one."""
+    with st.expander("📂 Saved drafts"):
+        drafts = {d.id: d for d in store.recent()}
+        choice = st.selectbox("Draft", list(drafts), index=None, placeholder="Choose a draft", key="draft_choice",
+                              format_func=lambda d: f"{drafts[d].name or drafts[d].trail_id or 'Untitled'} · "
+                                                    f"{drafts[d].media} media · "
+                                                    f"{time.strftime('%d/%m %H:%M', time.localtime(drafts[d].updated))}")
+        col1, col2 = st.columns(2)
+        if col1.button("Open draft", disabled=choice is None):
+            open_draft(store.load(choice) or new_draft())
+            st.rerun()
+        if col2.button("New empty draft"):
+            open_draft(new_draft())
+            st.rerun()
 
-                st.markdown("</div>", unsafe_allow_html=True)
 
-            if st.button(f"➕ Add Media Item Below Item {i + 1}", key=f"add_after_{i}"):
-                st.session_state.media_list.insert(i + 1, {})
-                st.rerun()
+@st.cache_resource
+def get_track_cache() -> TrackCache:
+    """Parsed-track cache shared by all sessions (configured via TRAILMNG_* env vars)."""
+    return TrackCache.from_env()
 
-        st.markdown("</div>", unsafe_allow_html=True) # Closing the outer div for the media section
 
-    # Preview and download
-    if st.button("Preview and Download JSONs"):
-        # English JSON
-        trail_data_en = {
-            "trailId": trail_id,
-            "name": trail_name_en,
-            "description": trail_description_en,
-            "media": [
-                {
-                    "id": media.get("id"),
-                    "type": media.get("type"),
-                    "url": media.get("url"),
-                    "description": media.get("description_en")
-                } for media in st.session_state.media_list
-            ]
-        }
-        st.subheader("English JSON Preview")
-        st.json(trail_data_en)
-        json_data_en = json.dumps(trail_data_en, ensure_ascii=False, indent=4)
-        b64_en = base64.b64encode(json_data_en.encode()).decode()
-        href_en = f'<a href="data:file/json;base64,{b64_en}" download="{trail_id}_en.json">Download English JSON File</a>'
-        st.markdown(href_en, unsafe_allow_html=True)
-
-        # Hebrew JSON
-        trail_data_he = {
-            "trailId": trail_id,
-            "name": trail_name_he,
-            "description": trail_description_he,
-            "media": [
-                {
-                    "id": media.get("id"),
-                    "type": media.get("type"),
-                    "url": media.get("url"),
-                    "description": media.get("description_he")
-                } for media in st.session_state.media_list
-            ]
-        }
-        st.subheader("Hebrew JSON Preview")
-        st.json(trail_data_he)
-        json_data_he = json.dumps(trail_data_he, ensure_ascii=False, indent=4)
-        b64_he = base64.b64encode(json_data_he.encode()).decode()
-        href_he = f'<a href="data:file/json;base64,{b64_he}" download="{trail_id}_he.json">Download Hebrew JSON File</a>'
-        st.markdown(href_he, unsafe_allow_html=True)
+@st.cache_resource
+def get_draft_store() -> DraftStore:
+    """Editor drafts shared by all sessions (configured via TRAILMNG_DRAFTS_DB)."""
+    return DraftStore.from_env()
+
+
+@st.cache_resource
+def get_figure_cache() -> FigureCache:
+    """Rendered GPX figures shared by all sessions."""
+    return FigureCache()
+
+
+@st.cache_resource
+def get_gpx_pool() -> Executor:
+    """Process pool that parses batches of GPX uploads, shared by all sessions."""
+    return make_pool()
+
+
+@st.cache_resource
+def get_media_previews() -> MediaPreviewService:
+    """Media metadata and thumbnails shared by all sessions (configured via TRAILMNG_MEDIA_CACHE_DIR)."""
+    return MediaPreviewService.from_env()
+
+
+@st.cache_resource
+def get_search_index() -> TrailSearchIndex:
+    """Full-text index of TRAILS_DIR, brought up to date once per server process."""
+    index = TrailSearchIndex.from_env()
+    index.update(TRAILS_DIR)
+    return index
+
+
+@st.cache_resource
+def get_spatial_index() -> SpatialIndex:
+    """Tile index of the tracks in GPX_DIR, brought up to date once per server process."""
+    index = SpatialIndex.from_env()
+    index.update(GPX_DIR)
+    return index
 
 
 # GPX graph
-def display_gpx_graph():
+def display_gpx_graph(profiler: Profiler):
     """
     Displays a graph of a GPX file.
 
-    This function allows uploading a GPX file and displays a plot of the track.
+    This function allows uploading one or more GPX files and displays a plot of the track. Several
+    files are parsed in parallel, summarized in a table and overlaid on one plot. Track files
+    converted with ``python -m trailMng.store`` are accepted as well and load without parsing.
     """
     st.header("GPX Graph")
-    uploaded_file = st.file_uploader("Upload GPX file", type=["gpx"])
+    uploaded_files = st.file_uploader("Upload GPX files", type=["gpx", "trk"], accept_multiple_files=True)
+    tolerance_px = st.slider("Simplification tolerance (pixels)", 0.0, 5.0, DEFAULT_TOLERANCE_PX, 0.25)
+
+    # Several files: summary and overlay of all of them, then the details of one
+    uploaded_file = None
+    if len(uploaded_files) > 1:
+        show_gpx_batch(uploaded_files, tolerance_px, profiler)
+        names = [f.name for f in uploaded_files]
+        uploaded_file = uploaded_files[st.selectbox("Track details", range(len(names)), format_func=names.__getitem__)]
+    elif uploaded_files:
+        uploaded_file = uploaded_files[0]
     if uploaded_file is not None:
         try:
-            gpx = gpxpy.parse(uploaded_file)
-            latitudes, longitudes = [], []
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        latitudes.append(point.latitude)
-                        longitudes.append(point.longitude)
-
-            if not latitudes or not longitudes:
+            with profiler.span("gpx.parse"):
+                track_key, track = get_track_cache().get_or_load(uploaded_file.getvalue())
+
+            if len(track) == 0:
                 st.warning("No track points found in the GPX file.")
                 return
 
-            fig, ax = plt.subplots()
-            ax.plot(longitudes, latitudes, marker='o', linestyle='-')
-            ax.set_xlabel("Longitude")
-            ax.set_ylabel("Latitude")
-            ax.set_title("GPX Track")
-            ax.grid(True)
-            st.pyplot(fig)
+            params = RenderParams(tolerance_px=tolerance_px)
+            with profiler.span("gpx.render"):
+                rendered = get_figure_cache().get_or_render(track_key, "map", params,
+                                                            lambda: render_track_map(track, params))
+            with profiler.span("gpx.display"):
+                st.image(rendered.data)
+                st.caption(f"Plotted {rendered.track_points:,} of {rendered.original_points:,} track points.")
         except Exception as e:
             st.error(f"An error occurred while parsing the GPX file: {e}")
+        else:
+            show_overlapping_trails(track, profiler)
+
+
+def show_gpx_batch(uploaded_files, tolerance_px, profiler: Profiler):
+    """
+    Parses several GPX files on the process pool and summarizes them.
+
+    Cached tracks appear at once, and the summary table grows as each remaining file finishes.
+    All tracks are then drawn on one figure.
+    """
+    uploads = [(f.name, f.getvalue()) for f in uploaded_files]
+    progress = st.progress(0.0, text="Parsing GPX files...")
+    table = st.empty()
+    results = {}
+    with profiler.span("gpx.batch_parse"):
+        for done, result in enumerate(parse_uploads(uploads, get_track_cache(), get_gpx_pool()), start=1):
+            results[result.index] = result
+            progress.progress(done / len(uploads), text=f"Parsed {done} of {len(uploads)} files")
+            table.dataframe([gpx_summary_row(r) for r in results.values()], hide_index=True)
+    progress.empty()
+
+    # Upload order keeps the colours stable between reruns
+    ready = [results[index] for index in range(len(uploads)) if results[index].stats is not None]
+    if not ready:
+        return
+    params = RenderParams(tolerance_px=tolerance_px)
+    overlay_key = content_key("\n".join(f"{r.key} {r.name}" for r in ready).encode("utf-8"))
+    with profiler.span("gpx.batch_render"):
+        rendered = get_figure_cache().get_or_render(
+            overlay_key, "overlay", params,
+            lambda: render_tracks_overlay([r.track for r in ready], [r.name for r in ready], params))
+    st.image(rendered.data)
+
+
+def gpx_summary_row(result):
+    """One row of the multi-file summary table."""
+    stats = result.stats
+    if stats is None:
+        return {"File": result.name, "Status": result.error or "No track points"}
+    return {
+        "File": result.name,
+        "Points": stats.points,
+        "Distance (km)": round(stats.distance_m / 1000, 2),
+        "Min elevation (m)": round(stats.min_ele) if stats.min_ele is not None else None,
+        "Max elevation (m)": round(stats.max_ele) if stats.max_ele is not None else None,
+        "Duration": format_duration(stats.duration_s) if stats.duration_s is not None else None,
+        "Status": "OK",
+    }
+
+
+def format_duration(seconds):
+    """Seconds as ``h:mm:ss`` (or ``m:ss`` under an hour)."""
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def show_overlapping_trails(track, profiler: Profiler):
+    """
+    Lists the existing trails that this track runs along.
+
+    The answer comes from the spatial index of GPX_DIR, so no other GPX file is opened.
+    """
+    try:
+        with profiler.span("spatial.overlap"):
+            overlaps = get_spatial_index().overlaps(track)
+        if not overlaps:
+            return
+        names = get_search_index().trail_names()
+    except (sqlite3.Error, OSError) as e:
+        st.warning(f"Could not look up the existing trails along this track: {e}")
+        return
+    percent = lambda label: st.column_config.ProgressColumn(label, min_value=0.0, max_value=1.0, format="percent")
+    st.subheader("Existing Trails Along This Track")
+    st.dataframe(
+        [
+            {
+                "Trail": names.get(overlap.trail_id, overlap.trail_id),
+                "trailId": overlap.trail_id,
+                "Of this track": overlap.share,
+                "Of the trail": overlap.covered,
+            }
+            for overlap in overlaps
+        ],
+        column_config={"Of this track": percent("Of this track"), "Of the trail": percent("Of the trail")},
+        hide_index=True,
+    )
+
+
+# Trail search
+def search_trails(profiler: Profiler):
+    """
+    Searches trail names and descriptions, including media descriptions, in both languages.
+
+    Results come from the full-text index and are grouped per trail, listing the exact
+    media items that matched.
+    """
+    st.header("Trail Search")
+    index = get_search_index()
+
+    query = st.text_input("Search trails (English or Hebrew)", key="search_query")
+    language = st.radio("Language", ["Both", "English", "Hebrew"], horizontal=True, key="search_lang")
+    if st.button("🔄 Refresh Index"):
+        counts = index.update(TRAILS_DIR)
+        st.caption(f"{counts['indexed']} files indexed, {counts['removed']} removed, "
+                   f"{counts['unchanged']} unchanged.")
+
+    if not query:
+        return
+    with profiler.span("search.query"):
+        hits = index.search(query, {"English": "en", "Hebrew": "he"}.get(language))
+    if not hits:
+        st.info("No matching trails.")
+        return
+    for trail_hits in group_by_trail(hits).values():
+        with st.expander(f"{trail_hits[0].trail_name} ({len(trail_hits)} matches)", expanded=True):
+            for hit in trail_hits:
+                where = f"Media {hit.media_id}" if hit.field == "media" else hit.field.capitalize()
+                st.markdown(f"**{where}** ({hit.lang}): {hit.snippet}")
+
+
+def find_nearby_trails(profiler: Profiler):
+    """
+    Lists the trails passing within a radius of a point, such as a trailhead or a parking lot.
+
+    Distances are measured to the nearest point of each track in the spatial index of GPX_DIR.
+    """
+    st.header("Trails Near a Point")
+    index = get_spatial_index()
+    col1, col2, col3 = st.columns(3)
+    lat = col1.number_input("Latitude", -90.0, 90.0, 32.0, format="%.6f", key="near_lat")
+    lon = col2.number_input("Longitude", -180.0, 180.0, 35.0, format="%.6f", key="near_lon")
+    radius_m = col3.number_input("Radius (m)", 50, 20000, 500, 50, key="near_radius")
+    if st.button("🔄 Refresh Track Index"):
+        counts = index.update(GPX_DIR)
+        st.caption(f"{counts['indexed']} tracks indexed, {counts['removed']} removed, "
+                   f"{counts['unchanged']} unchanged, {counts['failed']} unreadable.")
+
+    with profiler.span("spatial.near"):
+        hits = index.near(lat, lon, radius_m)
+    if not hits:
+        st.info(f"No indexed trail passes within {radius_m} m ({len(index)} tracks indexed).")
+        return
+    names = get_search_index().trail_names()
+    st.dataframe(
+        [{"Trail": names.get(hit.trail_id, hit.trail_id), "trailId": hit.trail_id,
+          "Distance (m)": round(hit.distance_m)} for hit in hits],
+        hide_index=True,
+    )
+
+
+# Profiling
+def new_profiler() -> Profiler:
+    """Profiler for this rerun, switched on from the sidebar (on by default with TRAILMNG_PROFILE=1)."""
+    enabled = st.sidebar.toggle("⏱️ Profile reruns", value=os.environ.get("TRAILMNG_PROFILE") == "1",
+                                key="profiling")
+    if "profile_session" not in st.session_state:
+        st.session_state.profile_session = uuid.uuid4().hex[:8]
+    return Profiler(enabled, os.environ.get("TRAILMNG_PROFILE_LOG", DEFAULT_LOG), st.session_state.profile_session)
+
+
+def show_profile(profiler: Profiler):
+    """
+    Logs this rerun's timings and shows them in the sidebar.
+
+    Lists the time per stage, the peak memory of the server process and the hit counts of the
+    shared caches.
+    """
+    if not profiler.enabled:
+        return
+    profiler.count("track_cache", get_track_cache().stats())
+    profiler.count("figure_cache", {"hits": get_figure_cache().hits, "misses": get_figure_cache().misses})
+    profiler.count("media_fetches", get_media_previews().fetches)
+    report = profiler.write()
+
+    with st.sidebar:
+        st.metric("Rerun", f"{report['total_ms']:.0f} ms")
+        st.dataframe({"Stage": list(report["spans"]), "ms": [round(ms, 1) for ms in report["spans"].values()]},
+                     hide_index=True)
+        if report["peak_mb"] is not None:
+            st.caption(f"Peak memory: {report['peak_mb']:.0f} MB")
+        track_cache = report["counters"]["track_cache"]
+        figure_cache = report["counters"]["figure_cache"]
+        st.caption(f"Track cache: {track_cache['hits']} hits, {track_cache['disk_hits']} disk hits, "
+                   f"{track_cache['misses']} misses")
+        st.caption(f"Figure cache: {figure_cache['hits']} hits, {figure_cache['misses']} misses")
+        st.caption(f"Media fetches: {report['counters']['media_fetches']}")
 
 
 # App layout
 st.title("Admin Task Management App")
-tab1, tab2 = st.tabs(["Trail Description JSON", "GPX Graph"])
+profiler = new_profiler()
+tab1, tab2, tab3 = st.tabs(["Trail Description JSON", "GPX Graph", "Trail Search"])
 with tab1:
-    create_or_edit_trail_description()
+    create_or_edit_trail_description(profiler)
 with tab2:
-    display_gpx_graph()
\ No newline at end of file
+    display_gpx_graph(profiler)
+with tab3:
+    search_trails(profiler)
+    find_nearby_trails(profiler)
+show_profile(profiler)
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files::
+
+    python -m benchmarks.compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+Benchmarks are matched by id and compared on their best (minimum) time.
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+# Changes smaller than this are reported as noise
+DEFAULT_THRESHOLD = 0.10
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change treated as significant (default 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit with status 1 if any benchmark got significantly slower")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for path in (args.old, args.new):
+        with open(path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+    old, new = ({r["id"]: r for r in run["results"]} for run in runs)
+    print(f"old: {runs[0]['environment']['commit']}  new: {runs[1]['environment']['commit']}")
+
+    regressions = 0
+    for bench_id in [i for i in new if i in old]:
+        before, after = old[bench_id]["min_ms"], new[bench_id]["min_ms"]
+        ratio = after / before if before else float("inf")
+        if ratio > 1 + args.threshold:
+            verdict = "slower"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            verdict = "faster"
+        else:
+            verdict = ""
+        print(f"{bench_id:70} {before:12.3f} -> {after:12.3f} ms  {ratio:6.2f}x {verdict}")
+    for bench_id in new.keys() - old.keys():
+        print(f"{bench_id:70} new")
+    for bench_id in old.keys() - new.keys():
+        print(f"{bench_id:70} removed")
+    return 1 if args.fail_on_regression and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
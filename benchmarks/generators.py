@@ -0,0 +1,77 @@
+"""
+Synthetic inputs for the benchmarks.
+
+Everything is generated from a seed, so two runs (or two commits) measure exactly the
+same data.
+"""
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+# Start of the random walk: central Israel, where the real trails are
+_START_LAT = 32.1
+_START_LON = 35.0
+_START_TIME = np.datetime64("2024-03-01T06:00:00", "s")
+
+_EN_WORDS = ("trail", "spring", "ridge", "path", "view", "olive", "stream", "ruins", "forest",
+             "climb", "descent", "marked", "parking", "shade", "water", "loop", "easy", "steep")
+_HE_WORDS = ("שביל", "מעיין", "רכס", "נוף", "זית", "נחל", "חורבה", "יער", "עלייה", "ירידה",
+             "מסומן", "חניה", "צל", "מים", "מעגלי", "קל", "תלול", "בנחל", "והמעיין", "לתצפית")
+
+
+def gpx_document(points: int, tracks: int = 1, segments: int = 1, elevation: bool = True,
+                 times: bool = True, seed: int = 0) -> bytes:
+    """A GPX 1.1 file of ``points`` track points split over ``tracks`` × ``segments``.
+
+    The points are a random walk of roughly 5 m steps, 3 s apart.
+    """
+    rng = np.random.default_rng(seed)
+    lat = _START_LAT + np.cumsum(rng.normal(0, 4e-5, points))
+    lon = _START_LON + np.cumsum(rng.normal(2e-5, 4e-5, points))
+    ele = 200 + np.cumsum(rng.normal(0, 0.8, points))
+    stamps = np.datetime_as_string(_START_TIME + np.arange(points) * 3, unit="s")
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<gpx version="1.1" creator="trailMng benchmarks" xmlns="http://www.topografix.com/GPX/1/1">']
+    bounds = np.linspace(0, points, tracks * segments + 1).astype(int)
+    for t in range(tracks):
+        lines.append(f"<trk><name>Track {t + 1}</name>")
+        for s in range(segments):
+            start, end = bounds[t * segments + s], bounds[t * segments + s + 1]
+            lines.append("<trkseg>")
+            for i in range(start, end):
+                point = f'<trkpt lat="{lat[i]:.7f}" lon="{lon[i]:.7f}">'
+                if elevation:
+                    point += f"<ele>{ele[i]:.1f}</ele>"
+                if times:
+                    point += f"<time>{stamps[i]}Z</time>"
+                lines.append(point + "</trkpt>")
+            lines.append("</trkseg>")
+        lines.append("</trk>")
+    lines.append("</gpx>")
+    return "\n".join(lines).encode("utf-8")
+
+
+def _text(rng: np.random.Generator, words: Tuple[str, ...], count: int) -> str:
+    return " ".join(words[i] for i in rng.integers(0, len(words), count))
+
+
+def trail_documents(media_items: int, text_words: int = 300,
+                    seed: int = 0) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """English and Hebrew documents of one trail with ``media_items`` shared media items."""
+    rng = np.random.default_rng(seed)
+    documents = []
+    for words in (_EN_WORDS, _HE_WORDS):
+        media = [{
+            "id": f"media{i}",
+            "type": "video" if i % 5 == 0 else "image",
+            "url": f"https://static.example.com/media/{seed}/{i}.{'mp4' if i % 5 == 0 else 'jpg'}",
+            "description": _text(rng, words, 30),
+        } for i in range(media_items)]
+        documents.append({
+            "trailId": f"bench-{seed}",
+            "name": _text(rng, words, 4),
+            "description": _text(rng, words, text_words),
+            "media": media,
+        })
+    return documents[0], documents[1]
@@ -0,0 +1,80 @@
+"""
+Import-time budget for the trailMng package.
+
+Imports the package and each of its modules in a fresh interpreter and fails when
+one of them loads a UI or heavy optional dependency, or takes longer than the
+budget::
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 150
+
+Exits with status 1 on any violation, so it can gate CI; ``tests/test_import_budget.py``
+runs the same check as part of the test suite.
+"""
+import argparse
+import json
+import os
+import pkgutil
+import subprocess
+import sys
+from typing import List, Optional
+
+import trailMng
+
+# Modules that must only be imported inside the functions that use them
+FORBIDDEN = ("streamlit", "matplotlib", "gpxpy", "PIL", "requests", "altair", "pandas")
+DEFAULT_BUDGET_MS = 300.0
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def modules() -> List[str]:
+    return ["trailMng"] + [f"trailMng.{m.name}" for m in pkgutil.iter_modules(trailMng.__path__)]
+
+
+def probe(module: str, runs: int) -> dict:
+    """Best-of-``runs`` import time of ``module`` and the modules it loaded."""
+    best = None
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)],
+                             capture_output=True, text=True, check=True, cwd=ROOT).stdout
+        result = json.loads(out)
+        if best is None or result["ms"] < best["ms"]:
+            best = result
+    return best
+
+
+def forbidden_loaded(result: dict) -> List[str]:
+    """The FORBIDDEN packages among the modules a probe loaded."""
+    return sorted({name.split(".")[0] for name in result["modules"]} & set(FORBIDDEN))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that trailMng imports stay light.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Maximum import time per module")
+    parser.add_argument("--runs", type=int, default=3, help="Imports per module (best is kept)")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for module in modules():
+        result = probe(module, args.runs)
+        loaded = forbidden_loaded(result)
+        problems = []
+        if loaded:
+            problems.append(f"loads {', '.join(loaded)}")
+        if result["ms"] > args.budget_ms:
+            problems.append(f"over the {args.budget_ms:.0f} ms budget")
+        failures += bool(problems)
+        print(f"{module:24} {result['ms']:8.1f} ms  {'; '.join(problems) or 'ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+Benchmark suite for the GPX and trail JSON paths.
+
+Covers GPX parsing, track files, distance/statistics, plotting, the EN/HE merge,
+JSON serialization, distribution exports and spatial queries on synthetic inputs, and writes the timings
+as JSON so runs from different commits can be compared::
+
+    python -m benchmarks.run                     # default sizes
+    python -m benchmarks.run --full              # adds 1M-point tracks and 5k media items
+    python -m benchmarks.run -k parse -k stats   # only matching benchmarks
+    python -m benchmarks.compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+Input generation is not timed.
+"""
+import argparse
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.generators import gpx_document, trail_documents
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+GPX_POINTS = (1_000, 10_000, 100_000)
+GPX_POINTS_FULL = GPX_POINTS + (1_000_000,)
+MEDIA_ITEMS = (1, 100, 1_000)
+MEDIA_ITEMS_FULL = MEDIA_ITEMS + (5_000,)
+# Indexed tracks of the spatial benchmarks; every synthetic track starts at the same point,
+# so the queries see far more candidates than a real catalog would give them
+SPATIAL_TRACKS = (50, 200)
+SPATIAL_TRACKS_FULL = SPATIAL_TRACKS + (1_000,)
+# Directories of the benchmark indexes, removed when the run exits
+_TEMP_DIRS: List[tempfile.TemporaryDirectory] = []
+# gpxpy builds an object per point; beyond this it only measures patience
+GPXPY_MAX_POINTS = 100_000
+# (tracks, segments, elevation) layouts of the synthetic GPX files
+GPX_LAYOUTS = ((1, 1, True), (3, 4, True), (1, 1, False))
+
+
+@dataclass
+class Case:
+    name: str
+    params: Dict[str, Any]
+    # Prepares the inputs and returns the callable to time
+    setup: Callable[[], Callable[[], Any]]
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}[{','.join(f'{k}={v}' for k, v in self.params.items())}]"
+
+
+@dataclass
+class Result:
+    id: str
+    name: str
+    params: Dict[str, Any]
+    min_ms: float
+    median_ms: float
+    runs: int
+    loops: int
+
+
+@lru_cache(maxsize=None)
+def _gpx(points: int, tracks: int, segments: int, elevation: bool) -> bytes:
+    return gpx_document(points, tracks, segments, elevation)
+
+
+@lru_cache(maxsize=None)
+def _track(points: int, tracks: int, segments: int, elevation: bool):
+    from trailMng.gpx_stream import read_track
+
+    return read_track(io.BytesIO(_gpx(points, tracks, segments, elevation)))
+
+
+def _render_track_overview(track, params):
+    """Track map and elevation profile drawn side by side with matplotlib.
+
+    This is how the GPX tab drew the profile before it moved to a browser chart
+    (``plot.profile``). It is kept here only as the baseline of ``plot.overview``.
+    """
+    from trailMng.render import RenderedFigure, _encode, _new_figure
+    from trailMng.simplify import axes_pixel_size, simplify_to_pixels
+    from trailMng.track import cumulative_distance
+
+    dist_km = cumulative_distance(track.lat, track.lon) / 1000
+    fig, (ax1, ax2) = _new_figure(params, ncols=2)
+
+    track_simple = simplify_to_pixels(track.lon, track.lat, *axes_pixel_size(ax1), params.tolerance_px)
+    profile_simple = simplify_to_pixels(dist_km, track.ele, *axes_pixel_size(ax2), params.tolerance_px)
+    t_idx, p_idx = track_simple.indices, profile_simple.indices
+
+    ax1.plot(track.lon[t_idx], track.lat[t_idx], 'b-', linewidth=2)
+    ax1.plot(track.lon[0], track.lat[0], 'go', markersize=10, label='Start')
+    ax1.plot(track.lon[-1], track.lat[-1], 'ro', markersize=10, label='End')
+    ax1.set_title("Track Map")
+    ax1.set_xlabel("Longitude")
+    ax1.set_ylabel("Latitude")
+    ax1.grid(True, alpha=0.3)
+    ax1.legend()
+
+    ax2.fill_between(dist_km[p_idx], track.ele[p_idx], alpha=0.3, color='green')
+    ax2.plot(dist_km[p_idx], track.ele[p_idx], 'g-', linewidth=2)
+    ax2.set_title("Elevation Profile")
+    ax2.set_xlabel("Distance (km)")
+    ax2.set_ylabel("Elevation (m)")
+    ax2.grid(True, alpha=0.3)
+
+    fig.tight_layout()
+    return RenderedFigure(data=_encode(fig, params), fmt=params.fmt, track_points=track_simple.kept,
+                          profile_points=profile_simple.kept, original_points=len(track))
+
+
+@lru_cache(maxsize=None)
+def _trail(media_items: int):
+    return trail_documents(media_items)
+
+
+def gpx_cases(sizes) -> List[Case]:
+    from trailMng.cache import TrackCache
+    from trailMng.elevation import ElevationProfile
+    from trailMng.export import encode_polyline, minified, track_geojson, track_levels
+    from trailMng.gpx_stream import read_track
+    from trailMng.render import PROFILE_WIDTH_PX, FigureCache, RenderParams, profile_chart, render_track_map
+    from trailMng.store import encode_track, load_stored_track, save_track
+    from trailMng.track import cumulative_distance, track_from_gpx, track_stats
+
+    cases = []
+    for points in sizes:
+        for tracks, segments, elevation in GPX_LAYOUTS:
+            layout = (points, tracks, segments, elevation)
+            params = {"points": points, "tracks": tracks, "segments": segments, "ele": elevation}
+
+            def parse_stream(layout=layout):
+                data = _gpx(*layout)
+                return lambda: read_track(io.BytesIO(data))
+
+            def parse_gpxpy(layout=layout):
+                import gpxpy
+
+                text = _gpx(*layout).decode("utf-8")
+                return lambda: track_from_gpx(gpxpy.parse(text))
+
+            def parse_store(layout=layout):
+                _TEMP_DIRS.append(tempfile.TemporaryDirectory(prefix="trailmng-bench-"))
+                path = os.path.join(_TEMP_DIRS[-1].name, "track.trk")
+                save_track(_track(*layout), path)
+                return lambda: load_stored_track(path)
+
+            def encode_store(layout=layout):
+                track = _track(*layout)
+                return lambda: encode_track(track)
+
+            def export_track(layout=layout):
+                track = _track(*layout)
+                return lambda: [(encode_polyline(simplified.lat, simplified.lon),
+                                 minified(track_geojson(simplified, {})))
+                                for simplified, _ in track_levels(track).values()]
+
+            def cache_hit(layout=layout):
+                data = _gpx(*layout)
+                cache = TrackCache()
+                cache.get_or_load(data)
+                return lambda: cache.get_or_load(data)
+
+            def distance(layout=layout):
+                track = _track(*layout)
+                return lambda: cumulative_distance(track.lat, track.lon)
+
+            def stats(layout=layout):
+                track = _track(*layout)
+                return lambda: track_stats(track)
+
+            def elevation_profile(layout=layout):
+                track = _track(*layout)
+                return lambda: ElevationProfile(track)
+
+            def range_query(layout=layout):
+                profile = ElevationProfile(_track(*layout))
+                middle = profile.total_m / 2
+                return lambda: (profile.summary(middle / 2, middle), profile.grade_histogram(middle / 2, middle))
+
+            def plot_map(layout=layout):
+                track = _track(*layout)
+                return lambda: render_track_map(track, RenderParams())
+
+            def plot_overview(layout=layout):
+                track = _track(*layout)
+                params = RenderParams(width_in=12, height_in=4)
+                return lambda: _render_track_overview(track, params)
+
+            def plot_profile(layout=layout):
+                profile = ElevationProfile(_track(*layout))
+
+                def run():
+                    idx = profile.downsample(PROFILE_WIDTH_PX)
+                    return profile_chart(profile.dist[idx], profile.ele[idx], "", zoom=True).to_dict()
+                return run
+
+            def plot_cached(layout=layout):
+                track = _track(*layout)
+                cache = FigureCache()
+                params = RenderParams()
+                render = lambda: render_track_map(track, params)
+                cache.get_or_render("bench", "map", params, render)
+                return lambda: cache.get_or_render("bench", "map", params, render)
+
+            cases += [Case("parse.stream", params, parse_stream),
+                      Case("parse.store", params, parse_store),
+                      Case("store.encode", params, encode_store),
+                      Case("export.track", params, export_track),
+                      Case("parse.cache_hit", params, cache_hit),
+                      Case("stats.distance", params, distance),
+                      Case("stats.track_stats", params, stats),
+                      Case("stats.elevation_profile", params, elevation_profile),
+                      Case("stats.range_query", params, range_query),
+                      Case("plot.map", params, plot_map),
+                      Case("plot.overview", params, plot_overview),
+                      Case("plot.profile", params, plot_profile),
+                      Case("plot.cached", params, plot_cached)]
+            if points <= GPXPY_MAX_POINTS:
+                cases.append(Case("parse.gpxpy", params, parse_gpxpy))
+    return cases
+
+
+def trail_cases(sizes) -> List[Case]:
+    from trailMng.export import compressors, minified
+    from trailMng.patch import diff_documents
+    from trailMng.trails import build_trail_documents, find_mismatches, merge_trail_documents
+
+    cases = []
+    for media_items in sizes:
+        params = {"media": media_items}
+
+        def merge(media_items=media_items):
+            en, he = _trail(media_items)
+            return lambda: merge_trail_documents(en, he)
+
+        def build(media_items=media_items):
+            merged = merge_trail_documents(*_trail(media_items))
+            return lambda: build_trail_documents(merged)
+
+        def serialize(media_items=media_items):
+            documents = build_trail_documents(merge_trail_documents(*_trail(media_items)))
+            # The export format of both apps
+            return lambda: [json.dumps(doc, ensure_ascii=False, indent=4) for doc in documents.values()]
+
+        def distribute(media_items=media_items):
+            documents = build_trail_documents(merge_trail_documents(*_trail(media_items)))
+            encoders = [compress for _, compress in compressors().values()]
+            # The distribution format: minified, plus every precompressed variant
+            return lambda: [compress(minified(doc)) for doc in documents.values() for compress in encoders]
+
+        def mismatches(media_items=media_items):
+            en, he = _trail(media_items)
+            return lambda: find_mismatches(en, he)
+
+        def diff(media_items=media_items):
+            en, _ = _trail(media_items)
+            # One edited description and the last item moved to the front
+            edited = json.loads(json.dumps(en))
+            edited["media"][len(edited["media"]) // 2]["description"] = "edited"
+            edited["media"].insert(0, edited["media"].pop())
+            return lambda: diff_documents(en, edited)
+
+        cases += [Case("trail.merge", params, merge),
+                  Case("trail.mismatches", params, mismatches),
+                  Case("trail.diff", params, diff),
+                  Case("trail.build_json", params, build),
+                  Case("trail.serialize", params, serialize),
+                  Case("trail.distribute", params, distribute)]
+    return cases
+
+
+def spatial_cases(sizes) -> List[Case]:
+    from trailMng.gpx_stream import read_track
+    from trailMng.spatial import SpatialIndex
+
+    cases = []
+    for count in sizes:
+        params = {"tracks": count}
+
+        @lru_cache(maxsize=None)
+        def index(count=count):
+            _TEMP_DIRS.append(tempfile.TemporaryDirectory(prefix="trailmng-bench-"))
+            spatial = SpatialIndex(os.path.join(_TEMP_DIRS[-1].name, "spatial.sqlite"))
+            for seed in range(count):
+                spatial.add_track(f"bench-{seed}", read_track(io.BytesIO(gpx_document(2_000, seed=seed))))
+            return spatial
+
+        def near(index=index):
+            spatial = index()
+            return lambda: spatial.near(32.1, 35.02, 500)
+
+        def bbox(index=index):
+            spatial = index()
+            return lambda: spatial.in_bbox(32.09, 35.0, 32.1, 35.02)
+
+        def overlap(index=index):
+            spatial = index()
+            track = read_track(io.BytesIO(gpx_document(2_000, seed=count)))
+            return lambda: spatial.overlaps(track)
+
+        cases += [Case("spatial.near", params, near),
+                  Case("spatial.bbox", params, bbox),
+                  Case("spatial.overlap", params, overlap)]
+    return cases
+
+
+def measure(func: Callable[[], Any], repeat: int, budget_s: float) -> Result:
+    """Time ``func`` like ``timeit``: calibrate a loop count, then repeat within a time budget.
+
+    One untimed call comes first, so lazy imports and first-use setup are not in any sample.
+    """
+    func()
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    runs = max(1, min(repeat, int(budget_s / max(elapsed, 1e-9))))
+    times = [elapsed / loops] + [t / loops for t in timer.repeat(runs - 1, loops)]
+    return Result(id="", name="", params={}, min_ms=min(times) * 1000,
+                  median_ms=float(np.median(times)) * 1000, runs=runs, loops=loops)
+
+
+def environment() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(__file__)).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the trailMng benchmarks.")
+    parser.add_argument("-k", dest="filters", action="append", default=[],
+                        help="Only run benchmarks whose id contains this text (repeatable)")
+    parser.add_argument("--full", action="store_true", help="Include the largest inputs")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per benchmark")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds to spend per benchmark at most")
+    parser.add_argument("-o", "--output", help="Results file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    cases = (gpx_cases(GPX_POINTS_FULL if args.full else GPX_POINTS)
+             + trail_cases(MEDIA_ITEMS_FULL if args.full else MEDIA_ITEMS)
+             + spatial_cases(SPATIAL_TRACKS_FULL if args.full else SPATIAL_TRACKS))
+    if args.filters:
+        cases = [c for c in cases if any(f in c.id for f in args.filters)]
+
+    env = environment()
+    results = []
+    for case in cases:
+        result = measure(case.setup(), args.repeat, args.budget)
+        result.id, result.name, result.params = case.id, case.name, case.params
+        results.append(result)
+        print(f"{case.id:70} {result.min_ms:12.3f} ms  (median {result.median_ms:.3f}, "
+              f"{result.runs}×{result.loops})", file=sys.stderr)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{env['commit'] or 'results'}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": env, "results": [asdict(r) for r in results]}, f, indent=2)
+    print(f"{len(results)} benchmarks -> {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The repository is not installed as a package: make trailMng and benchmarks importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
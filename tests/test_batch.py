@@ -0,0 +1,47 @@
+import sys
+import types
+
+from benchmarks.generators import gpx_document
+from trailMng.batch import make_pool, parse_uploads, pool_context, summarize_gpx
+from trailMng.cache import TrackCache
+
+
+def test_pool_does_not_fork():
+    assert pool_context().get_start_method() in ("forkserver", "spawn")
+
+
+def test_parse_uploads_in_pool():
+    uploads = [(f"track{i}.gpx", gpx_document(500, 1, 2, True, seed=i)) for i in range(3)]
+    uploads += [("copy.gpx", uploads[0][1]), ("broken.gpx", b"<gpx><trk>"), ("track1.gpx", uploads[2][1])]
+    cache = TrackCache()
+    pool = make_pool(2)
+    try:
+        results = {r.index: r for r in parse_uploads(uploads, cache, pool)}
+    finally:
+        pool.shutdown()
+    assert [results[i].name for i in range(len(uploads))] == [name for name, _ in uploads]
+    assert results[4].error and results[4].track is None
+    for i, (_, data) in enumerate(uploads[:3]):
+        assert results[i].error is None
+        assert results[i].stats == summarize_gpx(data)[1]
+    assert results[3].track is results[0].track
+    # Two files named track1.gpx keep their own results
+    assert results[5].track is results[2].track and results[5].track is not results[1].track
+    # The second pass is served from the cache
+    assert [r.track for r in parse_uploads(uploads[:1], cache, None)] == [results[0].track]
+
+
+def test_workers_do_not_run_the_main_script(tmp_path, monkeypatch):
+    # Streamlit runs the app as __main__; a worker that ran it again would die here
+    script = tmp_path / "app.py"
+    script.write_text("raise SystemExit('the app ran in a worker')\n")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+    uploads = [(f"track{i}.gpx", gpx_document(200, seed=i)) for i in range(2)]
+    pool = make_pool(2)
+    try:
+        results = list(parse_uploads(uploads, TrackCache(), pool))
+    finally:
+        pool.shutdown()
+    assert [r.error for r in results] == [None, None]
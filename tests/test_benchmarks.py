@@ -0,0 +1,17 @@
+import time
+
+from benchmarks.run import measure
+
+
+def test_first_call_is_not_timed():
+    calls = []
+
+    def func():
+        # Stands in for a lazy import or a first figure build
+        if not calls:
+            time.sleep(0.2)
+        calls.append(sum(range(1000)))
+
+    result = measure(func, repeat=3, budget_s=1.0)
+    # Calibrating on the slow call would settle on one loop and keep a 200 ms sample
+    assert result.loops > 100 and result.median_ms < 20
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from benchmarks.generators import trail_documents
+from trailMng.build import BUNDLE_NAME, MANIFEST_NAME, IncrementalBuilder
+from trailMng.catalog import compile_catalog
+
+KEYS = ["trail0", "trail1", "trail2"]
+
+
+def _write_pair(directory, seed, name=None):
+    for lang, document in zip(("en", "he"), trail_documents(3, 20, seed=seed)):
+        document["trailId"] = f"trail{seed}"
+        if name is not None:
+            document["name"] = name
+        (directory / f"trail{seed}_{lang}.json").write_text(json.dumps(document, ensure_ascii=False),
+                                                            encoding="utf-8")
+
+
+@pytest.fixture
+def trails(tmp_path):
+    directory = tmp_path / "trailjsons"
+    directory.mkdir()
+    for seed in range(3):
+        _write_pair(directory, seed)
+    return directory
+
+
+def _build(trails, build_dir):
+    report = IncrementalBuilder(str(trails), str(build_dir), jobs=1).build()
+    with open(build_dir / BUNDLE_NAME, encoding="utf-8") as f:
+        bundle = json.load(f)
+    # Whatever was reused, the bundle is what a full compile gives
+    assert bundle == compile_catalog(str(trails), jobs=1)[0]
+    return report, bundle
+
+
+def test_first_build_compiles_everything(trails, tmp_path):
+    report, bundle = _build(trails, tmp_path / "build")
+    assert sorted(report.compiled) == KEYS and report.unchanged == 0
+    assert [entry["trailId"] for entry in bundle["trails"]] == KEYS
+
+
+def test_unchanged_tree_does_no_work(trails, tmp_path):
+    build = tmp_path / "build"
+    _build(trails, build)
+    bundle_mtime = os.stat(build / BUNDLE_NAME).st_mtime_ns
+    builder = IncrementalBuilder(str(trails), str(build), jobs=1)
+    report = builder.build()
+    assert (report.compiled, report.removed, report.unchanged) == ([], [], 3)
+    assert os.stat(build / BUNDLE_NAME).st_mtime_ns == bundle_mtime
+
+    # A touched file with the same bytes is hashed, not recompiled
+    os.utime(trails / "trail1_he.json", ns=(0, 0))
+    assert builder.build().compiled == []
+
+
+def test_only_changed_pairs_are_recompiled(trails, tmp_path):
+    build = tmp_path / "build"
+    _build(trails, build)
+    _write_pair(trails, 1, name="Renamed")
+    report, bundle = _build(trails, build)
+    assert (report.compiled, report.unchanged) == (["trail1"], 2)
+    assert bundle["trails"][1]["en"]["name"] == "Renamed"
+
+
+def test_added_and_removed_pairs(trails, tmp_path):
+    build = tmp_path / "build"
+    _build(trails, build)
+    outputs = set(os.listdir(build / "trails"))
+    (trails / "trail0_en.json").unlink()
+    (trails / "trail0_he.json").unlink()
+    _write_pair(trails, 3)
+    report, bundle = _build(trails, build)
+    assert (report.compiled, report.removed) == (["trail3"], ["trail0"])
+    assert [entry["trailId"] for entry in bundle["trails"]] == ["trail1", "trail2", "trail3"]
+    # The removed pair's output file is deleted with it
+    assert len(outputs - set(os.listdir(build / "trails"))) == 1
+    assert len(os.listdir(build / "trails")) == 3
+
+
+def test_deleted_outputs_are_rebuilt(trails, tmp_path):
+    build = tmp_path / "build"
+    _build(trails, build)
+    for name in os.listdir(build / "trails"):
+        os.remove(build / "trails" / name)
+    report, _ = _build(trails, build)
+    assert sorted(report.compiled) == KEYS
+
+    # Without the bundle only the bundle is written again
+    os.remove(build / BUNDLE_NAME)
+    report, _ = _build(trails, build)
+    assert report.compiled == [] and report.unchanged == 3
+
+
+@pytest.mark.parametrize("manifest", ["{not json", '{"version": 0}', ""])
+def test_corrupt_manifest_forces_full_rebuild(trails, tmp_path, manifest):
+    build = tmp_path / "build"
+    _build(trails, build)
+    (build / MANIFEST_NAME).write_text(manifest, encoding="utf-8")
+    report, _ = _build(trails, build)
+    assert sorted(report.compiled) == KEYS
+
+
+def test_manifest_of_another_source_is_not_reused(trails, tmp_path):
+    build = tmp_path / "build"
+    _build(trails, build)
+    other = tmp_path / "other"
+    other.mkdir()
+    _write_pair(other, 0)
+    report, bundle = _build(other, build)
+    assert (report.compiled, report.removed) == (["trail0"], [])
+    assert len(bundle["trails"]) == 1
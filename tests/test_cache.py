@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from benchmarks.generators import gpx_document
+from trailMng.cache import DEFAULT_MAX_MB, LRUCache, TrackCache, content_key
+from trailMng.gpx_stream import load_track
+
+
+def test_lru_evicts_oldest_past_budget():
+    cache = LRUCache(max_bytes=100)
+    for key in "abc":
+        cache.put(key, key.upper(), 40)
+    # "a" was the oldest when "c" took the total to 120
+    assert "a" not in cache and len(cache) == 2 and cache.nbytes == 80
+    assert cache.evictions == 1
+
+    # Reading "b" makes "c" the oldest
+    assert cache.get("b") == "B"
+    cache.put("d", "D", 40)
+    assert "c" not in cache and "b" in cache and "d" in cache
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert cache.get("c") is None and cache.misses == 1
+
+
+def test_lru_sizes():
+    cache = LRUCache(max_bytes=100)
+    cache.put("big", "x", 101)
+    assert "big" not in cache and cache.nbytes == 0
+    cache.put("a", "x", 30)
+    cache.put("a", "y", 60)
+    assert (len(cache), cache.nbytes, cache.get("a")) == (1, 60, "y")
+    cache.put("b", "z", 100)
+    assert "a" not in cache and len(cache) == 1 and cache.nbytes == 100
+    cache.clear()
+    assert (len(cache), cache.nbytes) == (0, 0)
+
+
+class _Loader:
+    """Counts the parses the cache asks for."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, source):
+        self.calls += 1
+        return load_track(source)
+
+
+def _never(source):
+    raise AssertionError("parsed again")
+
+
+GPX = [gpx_document(1000, seed=seed) for seed in range(3)]
+
+
+def test_memory_hit_does_not_parse():
+    cache, loader = TrackCache(), _Loader()
+    key, track = cache.get_or_load(GPX[0], loader)
+    assert key == content_key(GPX[0])
+    assert cache.get_or_load(GPX[0], _never) == (key, track)
+    assert loader.calls == 1
+    assert cache.stats() == {"hits": 1, "disk_hits": 0, "misses": 1, "evictions": 0,
+                             "entries": 1, "bytes": track.nbytes}
+
+
+def test_budget_evicts_oldest_track():
+    size = TrackCache().get_or_load(GPX[0])[1].nbytes
+    cache = TrackCache(max_bytes=2 * size)
+    for data in GPX:
+        cache.get_or_load(data)
+    assert len(cache.memory) == 2 and cache.memory.evictions == 1
+    assert content_key(GPX[0]) not in cache.memory and content_key(GPX[2]) in cache.memory
+
+
+def test_memory_miss_is_served_from_disk(tmp_path):
+    cache = TrackCache(disk_dir=str(tmp_path))
+    key, track = cache.get_or_load(GPX[0])
+    assert (tmp_path / f"{key}.trk").exists()
+
+    # A new process, or an eviction, finds the .trk file instead of parsing
+    fresh = TrackCache(disk_dir=str(tmp_path))
+    _, loaded = fresh.get_or_load(GPX[0], _never)
+    for name in ("lat", "lon", "ele", "time", "segment_offsets"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(track, name))
+    assert (fresh.hits, fresh.disk_hits, fresh.misses) == (0, 1, 0)
+    # ...and keeps it in memory from then on
+    fresh.get_or_load(GPX[0], _never)
+    assert (fresh.hits, fresh.disk_hits, fresh.misses) == (1, 1, 0)
+
+    small = TrackCache(max_bytes=track.nbytes, disk_dir=str(tmp_path))
+    small.get_or_load(GPX[0])
+    small.get_or_load(GPX[1])
+    assert content_key(GPX[0]) not in small.memory
+    small.get_or_load(GPX[0], _never)
+    assert small.disk_hits == 2
+
+
+def test_unreadable_disk_copy_is_parsed(tmp_path):
+    key = content_key(GPX[0])
+    (tmp_path / f"{key}.trk").write_bytes(b"not a track")
+    cache, loader = TrackCache(disk_dir=str(tmp_path)), _Loader()
+    cache.get_or_load(GPX[0], loader)
+    assert loader.calls == 1 and cache.misses == 1
+
+
+@pytest.mark.parametrize("env, max_bytes, disk", [
+    ({}, DEFAULT_MAX_MB * 2**20, False),
+    ({"TRAILMNG_TRACK_CACHE_MB": "0.5", "TRAILMNG_CACHE_DIR": ""}, 2**19, False),
+    ({"TRAILMNG_TRACK_CACHE_MB": "8", "TRAILMNG_CACHE_DIR": "tracks"}, 8 * 2**20, True),
+])
+def test_from_env(monkeypatch, tmp_path, env, max_bytes, disk):
+    monkeypatch.delenv("TRAILMNG_TRACK_CACHE_MB", raising=False)
+    monkeypatch.delenv("TRAILMNG_CACHE_DIR", raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(tmp_path / value) if name == "TRAILMNG_CACHE_DIR" and value else value)
+    cache = TrackCache.from_env()
+    assert cache.memory.max_bytes == max_bytes
+    assert (cache.disk_dir is not None) == disk
+    if disk:
+        assert (tmp_path / "tracks").is_dir()
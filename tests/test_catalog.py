@@ -0,0 +1,35 @@
+import json
+
+from benchmarks.generators import trail_documents
+from trailMng.catalog import POOL_MIN_PAIRS, Issue, compile_catalog, validate_document
+
+
+def _write_pairs(directory, count):
+    for i in range(count):
+        for lang, document in zip(("en", "he"), trail_documents(3, 20, seed=i)):
+            document["trailId"] = f"trail{i}"
+            (directory / f"trail{i}_{lang}.json").write_text(json.dumps(document, ensure_ascii=False),
+                                                            encoding="utf-8")
+
+
+def test_pool_matches_serial(tmp_path):
+    _write_pairs(tmp_path, POOL_MIN_PAIRS)
+    serial, _ = compile_catalog(str(tmp_path), jobs=1)
+    pooled, _ = compile_catalog(str(tmp_path), jobs=2)
+    assert len(pooled["trails"]) == POOL_MIN_PAIRS
+    assert pooled == serial
+
+
+def test_media_item_not_an_object(tmp_path):
+    _write_pairs(tmp_path, 1)
+    path = tmp_path / "trail0_he.json"
+    document = json.loads(path.read_text(encoding="utf-8"))
+    document["media"].insert(1, "media1.jpg")
+    path.write_text(json.dumps(document), encoding="utf-8")
+    assert validate_document("trail0", str(path), document) == [
+        Issue("error", "trail0", "Media item 2 is not an object", str(path))]
+
+    bundle, _ = compile_catalog(str(tmp_path), jobs=1)
+    assert [issue["message"] for issue in bundle["issues"]] == ["Media item 2 is not an object"]
+    # The English document is still compiled
+    assert [entry["trailId"] for entry in bundle["trails"]] == ["trail0"]
@@ -0,0 +1,100 @@
+import json
+import random
+import sqlite3
+
+import pytest
+
+from trailMng.drafts import _MIN_GAP, DraftStore, InvalidDocument, new_draft, upload_key
+from trailMng.trails import MediaList, merge_trail_documents, with_media_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DraftStore(str(tmp_path / "drafts.sqlite"))
+
+
+def _positions(store, draft_id):
+    with sqlite3.connect(store.db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT position FROM media WHERE draft_id = ? ORDER BY position",
+                                               (draft_id,))]
+
+
+def _keys(store, draft_id):
+    return list(store.load(draft_id).trail.media_list.keys())
+
+
+def test_insert_at_one_place_renumbers(store):
+    draft_id = store.create(merge_trail_documents({"media": [{"id": "a"}, {"id": "b"}]}, None))
+    first = _keys(store, draft_id)[0]
+    inserted = []
+    # Each insert halves the gap after the first item, until the positions are renumbered
+    for i in range(60):
+        item = with_media_key({"id": f"n{i}"})
+        store.insert_media(draft_id, item, after=first)
+        inserted.append(item["_key"])
+    keys = _keys(store, draft_id)
+    assert keys[1:-1] == inserted[::-1]
+    positions = _positions(store, draft_id)
+    assert len(set(positions)) == len(positions) == 62
+    # Without renumbering the last gaps would be 2**-60
+    assert min(b - a for a, b in zip(positions, positions[1:])) >= _MIN_GAP / 2
+
+
+def test_random_edits_match_media_list(store):
+    rng = random.Random(0)
+    draft_id = store.create(merge_trail_documents({"media": [{"id": str(i)} for i in range(5)]}, None))
+    media = store.load(draft_id).trail.media_list
+    for step in range(500):
+        keys = list(media.keys())
+        action = rng.random()
+        if action < 0.35 or not keys:
+            anchor, item = rng.choice(keys + [None]), with_media_key({"id": f"n{step}"})
+            media.insert_after(anchor, item)
+            store.insert_media(draft_id, item, after=anchor)
+        elif action < 0.5:
+            key = rng.choice(keys)
+            media.remove(key)
+            store.remove_media(draft_id, key)
+        else:
+            key, anchor = rng.choice(keys), rng.choice(keys + [None])
+            media.move_after(key, anchor)
+            store.move_media(draft_id, key, anchor)
+    assert _keys(store, draft_id) == list(media.keys())
+
+
+def test_fields_are_saved_one_at_a_time(store):
+    draft = new_draft()
+    assert not store.exists(draft.id)
+    store.save_field(draft.id, "name_en", "Trail")
+    item = with_media_key({"id": "m1", "url": "https://example.com/1"})
+    store.insert_media(draft.id, item)
+    store.save_media_field(draft.id, item["_key"], "description_he", "תיאור")
+    loaded = store.load(draft.id)
+    assert loaded.trail.name_en == "Trail"
+    assert isinstance(loaded.trail.media_list, MediaList)
+    assert loaded.trail.media_list[item["_key"]]["description_he"] == "תיאור"
+    assert [info.id for info in store.recent()] == [draft.id]
+    with pytest.raises(ValueError):
+        store.save_field(draft.id, "updated", "0")
+    store.delete(draft.id)
+    assert store.load(draft.id) is None
+
+
+def test_upload_is_parsed_once(store):
+    documents = {"en": json.dumps({"trailId": "t", "media": [{"id": "m1"}]}).encode(),
+                 "he": json.dumps({"trailId": "t", "media": [{"id": "m1", "description": "ש"}]}).encode()}
+    draft_id = store.open_upload(documents)
+    assert draft_id == upload_key(documents)
+    store.save_field(draft_id, "name_en", "Edited")
+    # The same files again open the draft with its edits
+    assert store.open_upload(documents) == draft_id
+    draft = store.load(draft_id)
+    assert draft.trail.name_en == "Edited"
+    assert draft.bases["he"]["media"][0]["description"] == "ש"
+    with pytest.raises(InvalidDocument) as error:
+        store.open_upload({"en": b"[1, 2]"})
+    assert error.value.lang == "en"
+    for media in (b"null", b'["a.jpg"]', b'{"id": "a"}'):
+        with pytest.raises(InvalidDocument) as error:
+            store.open_upload({"en": b"{}", "he": b'{"media": ' + media + b"}"})
+        assert (error.value.lang, str(error.value)) == ("he", "'media' is not a list of objects")
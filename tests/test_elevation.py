@@ -0,0 +1,82 @@
+import io
+
+import numpy as np
+import pytest
+
+from benchmarks.generators import gpx_document
+from trailMng import elevation
+from trailMng.elevation import DEFAULT_CACHE_MB, GRADE_BLOCK, ElevationProfile, ProfileCache
+from trailMng.gpx_stream import read_track
+
+
+@pytest.fixture(scope="module")
+def profile():
+    return ElevationProfile(read_track(io.BytesIO(gpx_document(5000, 1, 2, True))))
+
+
+def _steps(profile, first, last):
+    """Distance per grade bin over the steps from point ``first`` to point ``last``, summed directly."""
+    return np.bincount(profile.grade_bins[first:last], weights=np.diff(profile.dist[first:last + 1]),
+                       minlength=len(profile.grade_edges) - 1)
+
+
+def test_histogram_matches_direct_sum(profile):
+    np.testing.assert_allclose(profile.grade_histogram(), _steps(profile, 0, len(profile.dist) - 1))
+    for first, last in ((0, 1), (3, GRADE_BLOCK - 1), (GRADE_BLOCK - 1, GRADE_BLOCK + 1), (100, 4321)):
+        np.testing.assert_allclose(profile.grade_histogram(profile.dist[first], profile.dist[last]),
+                                   _steps(profile, first, last), atol=1e-9)
+
+
+def test_ranges_add_up(profile):
+    splits = profile.splits(750.0)
+    np.testing.assert_allclose(sum(profile.grade_histogram(s.start_m, s.end_m) for s in splits),
+                               profile.grade_histogram())
+    assert sum(s.ascent_m for s in splits) == pytest.approx(profile.summary().ascent_m)
+    assert sum(s.distance_m for s in splits) == pytest.approx(profile.total_m)
+
+
+def test_size_per_point(profile):
+    # dist, ele, ascent, descent and time as float64, plus about a byte per grade step
+    assert profile.nbytes / len(profile.dist) < 44
+
+
+def test_cache_keeps_large_profiles():
+    # A fifth of the default budget holds 200k points, so the default holds a 1M-point profile
+    track = read_track(io.BytesIO(gpx_document(200_000, 1, 1, True)))
+    cache = ProfileCache(max_bytes=DEFAULT_CACHE_MB * 2**20 // 5)
+    first = cache.get_or_build("track", track)
+    assert cache.get_or_build("track", track) is first
+
+
+def test_other_threshold_shares_the_profile():
+    track = read_track(io.BytesIO(gpx_document(5000, 1, 2, True)))
+    base = ElevationProfile(track)
+    coarse = base.with_threshold(10.0)
+    assert base.with_threshold(base.threshold_m) is base
+    assert coarse.dist is base.dist and coarse.grade_blocks is base.grade_blocks and coarse.time is base.time
+    fresh = ElevationProfile(track, base.dist, 10.0)
+    np.testing.assert_array_equal(coarse.ascent, fresh.ascent)
+    np.testing.assert_array_equal(coarse.descent, fresh.descent)
+    assert coarse.summary().ascent_m < base.summary().ascent_m
+    assert base.threshold_m != coarse.threshold_m == 10.0
+
+
+def test_cache_smooths_each_threshold_once(monkeypatch):
+    track = read_track(io.BytesIO(gpx_document(5000, 1, 1, True)))
+    calls = []
+    smooth = elevation.hysteresis
+
+    def counted(values, threshold):
+        calls.append(threshold)
+        return smooth(values, threshold)
+
+    monkeypatch.setattr(elevation, "hysteresis", counted)
+    cache = ProfileCache()
+    profiles = {threshold: cache.get_or_build("track", track, threshold_m=threshold) for threshold in (3.0, 5.0, 8.0)}
+    for threshold in (5.0, 3.0, 8.0):
+        assert cache.get_or_build("track", track, threshold_m=threshold) is profiles[threshold]
+    assert calls == [3.0, 5.0, 8.0]
+    # The base is charged once; every other threshold only for its own prefix sums
+    base = profiles[3.0]
+    assert cache.memory.nbytes == base.nbytes + 2 * base.threshold_nbytes
+    assert profiles[8.0].ele is base.ele
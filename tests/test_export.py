@@ -0,0 +1,140 @@
+import gzip
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.generators import gpx_document, trail_documents
+from trailMng.export import (HASH_CHARS, MANIFEST_NAME, Exporter, compressors, content_name, encode_polyline,
+                             export_catalog, track_levels)
+from trailMng.gpx_stream import read_track
+
+
+def _reference_polyline(lat, lon):
+    """The encoding algorithm as Google documents it, one value at a time."""
+    out = []
+    previous = (0, 0)
+    for point in zip(lat, lon):
+        fixed = tuple(int(round(v * 1e5)) for v in point)
+        for value, before in zip(fixed, previous):
+            value = value - before
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        previous = fixed
+    return "".join(out)
+
+
+def test_polyline_google_example():
+    # https://developers.google.com/maps/documentation/utilities/polylinealgorithm
+    lat, lon = np.array([38.5, 40.7, 43.252]), np.array([-120.2, -120.95, -126.453])
+    assert encode_polyline(lat, lon) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_polyline_matches_reference():
+    rng = np.random.default_rng(0)
+    lat = np.concatenate([[0.0, -89.99999, 89.99999, 0.00001], rng.uniform(-90, 90, 200)])
+    lon = np.concatenate([[0.0, -179.99999, 179.99999, -0.00001], rng.uniform(-180, 180, 200)])
+    assert encode_polyline(lat, lon) == _reference_polyline(lat, lon)
+    assert encode_polyline(np.zeros(0), np.zeros(0)) == ""
+
+
+def test_content_name():
+    name = content_name("en", b"{}", "json")
+    assert name == content_name("en", b"{}", "json") != content_name("en", b"[]", "json")
+    stem, digest, ext = name.split(".")
+    assert (stem, len(digest), ext) == ("en", HASH_CHARS, "json")
+
+
+def test_compression_is_deterministic():
+    data = b"trail " * 1000
+    for _, compress in compressors().values():
+        assert compress(data) == compress(data)
+    compressed = compressors()["gzip"][1](data)
+    # No timestamp in the header
+    assert compressed[4:8] == b"\0\0\0\0" and gzip.decompress(compressed) == data
+
+
+def test_zoom_levels():
+    track = read_track(io.BytesIO(gpx_document(5000, 1, 3, True)))
+    levels = track_levels(track)
+    sizes = [len(levels[zoom][0]) for zoom in sorted(levels)]
+    tolerances = [levels[zoom][1] for zoom in sorted(levels)]
+    # Closer zooms keep more points at a finer tolerance
+    assert sizes == sorted(sizes) and sizes[-1] <= len(track)
+    assert tolerances == sorted(tolerances, reverse=True)
+    for simplified, _ in levels.values():
+        assert len(simplified.segment_offsets) == 3
+        assert (simplified.lat[0], simplified.lat[-1]) == (track.lat[0], track.lat[-1])
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    trails, gpx = tmp_path / "trailjsons", tmp_path / "gpx"
+    trails.mkdir()
+    gpx.mkdir()
+    for seed in range(2):
+        for lang, document in zip(("en", "he"), trail_documents(3, 20, seed=seed)):
+            document["trailId"] = f"trail{seed}"
+            (trails / f"trail{seed}_{lang}.json").write_text(json.dumps(document, ensure_ascii=False),
+                                                             encoding="utf-8")
+        (gpx / f"trail{seed}.gpx").write_bytes(gpx_document(2000, seed=seed))
+    return trails, gpx
+
+
+def _files(directory):
+    return {os.path.relpath(os.path.join(root, name), directory): open(os.path.join(root, name), "rb").read()
+            for root, _, names in os.walk(directory) for name in names}
+
+
+def test_unchanged_export_is_byte_identical(catalog, tmp_path):
+    trails, gpx = catalog
+    dist = tmp_path / "dist"
+    first = export_catalog(str(trails), str(dist), str(gpx), jobs=1)
+    assert (first.trails, first.tracks, first.unchanged) == (2, 2, 0)
+    before = _files(dist)
+    # Into a fresh directory and over the old one: the same bytes under the same names
+    export_catalog(str(trails), str(tmp_path / "again"), str(gpx), jobs=1)
+    assert _files(tmp_path / "again") == before
+    second = export_catalog(str(trails), str(dist), str(gpx), jobs=1)
+    assert second.written == 0 and second.unchanged == first.written
+    assert _files(dist) == before
+
+    manifest = json.loads(before[MANIFEST_NAME])
+    entry = manifest["trails"]["trail0"]["track"]["zooms"]["16"]["polyline"]
+    assert before[entry["path"]].decode("ascii").count("\n") == 0
+    # A compressed variant is only kept where it is smaller
+    assert set(entry["encodings"]) <= set(compressors())
+    for path, data in before.items():
+        if path.endswith(".gz"):
+            assert len(data) < len(before[path[:-3]])
+
+
+def test_changed_track_gets_new_names(catalog, tmp_path):
+    trails, gpx = catalog
+    dist = tmp_path / "dist"
+    export_catalog(str(trails), str(dist), str(gpx), jobs=1)
+    old = json.loads((dist / MANIFEST_NAME).read_bytes())["trails"]
+
+    (gpx / "trail0.gpx").write_bytes(gpx_document(2000, seed=7))
+    exporter = Exporter(str(dist))
+    new = exporter.export(str(trails), str(gpx), jobs=1)["trails"]
+    for zoom, level in new["trail0"]["track"]["zooms"].items():
+        assert level["geojson"]["path"] != old["trail0"]["track"]["zooms"][zoom]["geojson"]["path"]
+    # Only the changed track moved
+    assert new["trail1"] == old["trail1"]
+    assert new["trail0"]["en"] == old["trail0"]["en"]
+    assert exporter.report.pruned == 0
+    stale = old["trail0"]["track"]["zooms"]["10"]["geojson"]["path"]
+    assert (dist / stale).exists()
+
+    report = export_catalog(str(trails), str(dist), str(gpx), jobs=1, prune=True)
+    assert report.written == 0 and report.pruned > 0
+    assert not (dist / stale).exists() and not (dist / (stale + ".gz")).exists()
+    named = {level[kind]["path"] for trail in new.values() for level in trail["track"]["zooms"].values()
+             for kind in ("geojson", "polyline")}
+    assert all((dist / path).exists() for path in named)
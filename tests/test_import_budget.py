@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.import_budget import DEFAULT_BUDGET_MS, forbidden_loaded, modules, probe
+
+
+@pytest.mark.parametrize("module", modules())
+def test_import_stays_light(module):
+    result = probe(module, runs=3)
+    assert forbidden_loaded(result) == []
+    assert result["ms"] < DEFAULT_BUDGET_MS
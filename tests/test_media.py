@@ -0,0 +1,143 @@
+import io
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from trailMng import media
+from trailMng.media import MediaPreviewService
+
+
+def _jpeg(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (30, 120, 60)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+IMAGE = _jpeg(800, 600)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/slow.jpg":
+            time.sleep(1.0)
+        if self.path in ("/image.jpg", "/slow.jpg"):
+            self._send(IMAGE, "image/jpeg")
+        elif self.path == "/video.mp4":
+            self._send(b"\0" * 5000, "video/mp4")
+        elif self.path == "/unsized.jpg":
+            # No Content-Length: the body ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            if "Range" not in self.headers:
+                self.wfile.write(IMAGE)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def _send(self, body, content_type):
+        if self.headers.get("Range") == "bytes=0-0":
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes 0-0/{len(body)}")
+            body = body[:1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def service(tmp_path):
+    return MediaPreviewService(str(tmp_path / "cache"), workers=4, timeout=0.5)
+
+
+def test_image_thumbnail(server, service):
+    info = service.info(f"{server.url}/image.jpg")
+    assert info.ok and info.status == 206
+    assert info.content_type == "image/jpeg"
+    assert (info.width, info.height, info.size) == (800, 600, len(IMAGE))
+    with Image.open(io.BytesIO(service.thumbnail_bytes(info))) as thumbnail:
+        assert thumbnail.size == (320, 240)
+
+
+def test_cached_hit_makes_no_request(server, service, tmp_path):
+    url = f"{server.url}/image.jpg"
+    service.info(url)
+    count = len(server.requests)
+    assert service.info(url).width == 800
+    # A new service over the same directory reads the result from disk
+    assert MediaPreviewService(str(tmp_path / "cache")).info(url).thumbnail is not None
+    assert len(server.requests) == count
+    assert service.fetches == 1
+
+
+def test_video_costs_one_ranged_request(server, service):
+    info = service.info(f"{server.url}/video.mp4")
+    assert info.ok and info.content_type == "video/mp4" and info.size == 5000
+    assert info.thumbnail is None
+    assert server.requests == ["/video.mp4"]
+
+
+def test_not_found(server, service):
+    info = service.info(f"{server.url}/missing.jpg")
+    assert not info.ok
+    assert (info.status, info.error) == (404, "HTTP 404")
+
+
+def test_timeout(server, service):
+    info = service.info(f"{server.url}/slow.jpg")
+    assert not info.ok
+    assert "Timeout" in info.error
+
+
+def test_unsized_body_stops_at_limit(server, service, monkeypatch):
+    monkeypatch.setattr(media, "MAX_IMAGE_BYTES", len(IMAGE) // 2)
+    info = service.info(f"{server.url}/unsized.jpg")
+    assert info.ok and info.size is None
+    assert info.error == "Too large for a thumbnail" and info.thumbnail is None
+
+
+def test_decompression_bomb(server, service, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    info = service.info(f"{server.url}/image.jpg")
+    assert info.ok
+    assert info.error == "Too large for a thumbnail" and info.thumbnail is None
+
+
+def test_fetch_many(server, service):
+    urls = [f"{server.url}/{name}" for name in ("image.jpg", "video.mp4", "missing.jpg")]
+    service.info(urls[0])
+    seen = []
+    results = service.fetch_many(urls + [urls[1], ""], on_result=seen.append)
+    assert set(results) == set(urls) and len(seen) == 3
+    assert [results[url].ok for url in urls] == [True, True, False]
+    # Only the two URLs that were not cached yet were fetched
+    assert service.fetches == 3
+    assert len(service.fetch_many(urls)) == 3 and service.fetches == 3
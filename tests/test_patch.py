@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from trailMng.patch import apply_patch, diff_documents, pointer
+from trailMng.trails import longest_increasing
+
+
+def _document(rng, n):
+    return {
+        "trailId": rng.choice(["a", "b"]),
+        "name": rng.choice(["", "Name", "Name/with~slash"]),
+        "description": "text",
+        "media": [{"id": rng.choice(["", "m1", "m2", f"m{i}"]), "type": rng.choice(["image", "video"]),
+                   "url": f"https://example.com/{i}", "description": rng.choice(["", "d"])} for i in range(n)],
+    }
+
+
+def _edit(rng, document):
+    document = {**document, "media": [dict(item) for item in document["media"]]}
+    media = document["media"]
+    for _ in range(rng.randint(0, 6)):
+        action = rng.random()
+        if action < 0.2 and media:
+            del media[rng.randrange(len(media))]
+        elif action < 0.4:
+            media.insert(rng.randint(0, len(media)), {"id": rng.choice(["", "m1", "new"]), "type": "image",
+                                                      "url": "https://example.com/new"})
+        elif action < 0.6 and media:
+            media.insert(rng.randint(0, len(media) - 1), media.pop(rng.randrange(len(media))))
+        elif action < 0.8 and media:
+            item = rng.choice(media)
+            field = rng.choice(["description", "url", "extra"])
+            if field in item and rng.random() < 0.3:
+                del item[field]
+            else:
+                item[field] = rng.choice(["", "changed"])
+        else:
+            field = rng.choice(["name", "description", "notes"])
+            document[field] = "changed"
+    if rng.random() < 0.1:
+        del document["description"]
+    return document
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_edits_round_trip(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        old = _document(rng, rng.randint(0, 12))
+        new = _edit(rng, old)
+        ops = diff_documents(old, new)
+        assert apply_patch(old, ops) == new
+        assert diff_documents(new, new) == []
+
+
+def test_edited_description_is_one_replace():
+    old = {"trailId": "t", "media": [{"id": f"m{i}", "description": ""} for i in range(50)]}
+    new = {"trailId": "t", "media": [dict(item) for item in old["media"]]}
+    new["media"][10]["description"] = "changed"
+    assert diff_documents(old, new) == [{"op": "replace", "path": "/media/10/description", "value": "changed"}]
+
+
+def test_moved_item_is_one_move():
+    old = {"media": [{"id": f"m{i}"} for i in range(50)]}
+    new = {"media": old["media"][:5] + old["media"][6:40] + [old["media"][5]] + old["media"][40:]}
+    ops = diff_documents(old, new)
+    assert [op["op"] for op in ops] == ["move"]
+    assert apply_patch(old, ops) == new
+
+
+def test_pointer_escapes():
+    assert pointer("media", 3, "a/b~c") == "/media/3/a~1b~0c"
+    assert apply_patch({"a/b": 1}, [{"op": "replace", "path": "/a~1b", "value": 2}]) == {"a/b": 2}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_each_misplaced_item_moves_once(seed):
+    rng = random.Random(seed)
+    old = {"media": [{"id": f"m{i}"} for i in range(40)]}
+    new = {"media": rng.sample(old["media"], len(old["media"]))}
+    ops = diff_documents(old, new)
+    order = [int(item["id"][1:]) for item in new["media"]]
+    assert all(op["op"] == "move" for op in ops)
+    assert len(ops) == len(order) - len(longest_increasing(order))
+    assert apply_patch(old, ops) == new
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from benchmarks.generators import gpx_document
+from trailMng.cache import content_key
+from trailMng.gpx_stream import read_track
+from trailMng.render import FigureCache, RenderedFigure, RenderParams, render_track_map
+
+GPX = gpx_document(5000, seed=1)
+
+
+@pytest.fixture(scope="module")
+def track():
+    return read_track(io.BytesIO(GPX))
+
+
+class _Counter:
+    def __init__(self, render):
+        self.render = render
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.render()
+
+
+def test_changed_parameters_render_again(track):
+    cache = FigureCache()
+    key = content_key(GPX)
+    params = RenderParams(width_in=4, height_in=3)
+    render = _Counter(lambda: render_track_map(track, params))
+    first = cache.get_or_render(key, "map", params, render)
+    assert cache.get_or_render(key, "map", RenderParams(width_in=4, height_in=3), render) is first
+    assert render.calls == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    coarse = RenderParams(width_in=4, height_in=3, tolerance_px=5.0)
+    second = cache.get_or_render(key, "map", coarse, lambda: render_track_map(track, coarse))
+    assert second is not first and second.data != first.data
+    assert second.track_points < first.track_points <= len(track)
+    # Another kind or another track is a different figure too
+    assert cache.get_or_render(key, "overlay", params, lambda: RenderedFigure(b"o", "png", 0)).data == b"o"
+    assert cache.get_or_render("other", "map", params, lambda: RenderedFigure(b"t", "png", 0)).data == b"t"
+    assert render.calls == 1 and cache.misses == 4
+
+
+def test_size_never_exceeds_limit():
+    cache = FigureCache(max_bytes=1000)
+    for i in range(50):
+        size = 100 + 37 * (i % 10)
+        figure = RenderedFigure(bytes(size), "png", 0)
+        assert cache.get_or_render(f"track{i}", "map", RenderParams(), lambda: figure) is figure
+        assert cache.memory.nbytes <= 1000
+    kept = [cache.memory.get((f"track{i}", "map", RenderParams())) for i in range(50)]
+    assert cache.memory.nbytes == sum(len(figure.data) for figure in kept if figure is not None)
+    # The newest figures are the ones kept
+    assert kept[-1] is not None and kept[0] is None
+
+    # A figure larger than the whole cache is returned but not kept
+    big = RenderedFigure(bytes(1001), "png", 0)
+    assert cache.get_or_render("big", "map", RenderParams(), lambda: big) is big
+    assert ("big", "map", RenderParams()) not in cache.memory and cache.memory.nbytes <= 1000
@@ -0,0 +1,111 @@
+import json
+import sqlite3
+
+import pytest
+
+from trailMng.search import TrailSearchIndex, _normalize, _snippet, build_query, index_terms
+
+
+def _write(directory, base, lang, name, description, media=()):
+    document = {"trailId": base, "name": name, "description": description,
+                "media": [{"id": f"m{i}", "type": "image", "url": f"https://example.com/{i}.jpg", "description": d}
+                          for i, d in enumerate(media)]}
+    path = directory / f"{base}_{lang}.json"
+    path.write_text(json.dumps(document, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def trails(tmp_path):
+    directory = tmp_path / "trailjsons"
+    directory.mkdir()
+    _write(directory, "kziv", "en", "Nahal Kziv", "A shaded path down to Ein Tamir spring.")
+    _write(directory, "kziv", "he", "נחל כזיב", "שביל מוצל בנחל אל מעיין עין תמיר.", ["המעיין בקיץ"])
+    _write(directory, "amud", "en", "Nahal Amud", "Pools and the Sechvi spring.")
+    _write(directory, "amud", "he", "נחל עמוד", "בריכות ומעיין סכוי.")
+    return directory
+
+
+@pytest.fixture
+def index(tmp_path, trails):
+    index = TrailSearchIndex(str(tmp_path / "search.sqlite"))
+    index.update(str(trails))
+    return index
+
+
+def test_normalize_hebrew():
+    # Niqqud, geresh and gershayim go, final letters are folded, maqaf splits words
+    assert _normalize("שָׁלוֹם") == "שלומ"
+    assert _normalize("צ׳יפס") == "ציפס"
+    assert _normalize('צה"ל') == "צהל"
+    assert _normalize("בית־הכרם") == "בית הכרמ"
+    assert _normalize("Ein KEREM") == "ein kerem"
+
+
+def test_prefixes_are_indexed_and_stripped_from_queries():
+    terms = index_terms("ובנחל עין")
+    assert terms.split() == ["ובנחל", "עינ", "בנחל", "נחל"]
+    # Three letters are the shortest stem
+    assert index_terms("בית") == "בית"
+    # Up to three prefix letters, and every form may be a prefix of a longer word
+    assert build_query("והמעיין") == '("והמעיינ"* OR "המעיינ"* OR "מעיינ"* OR "עיינ"*)'
+
+
+@pytest.mark.parametrize("text", ['"', "*", "a OR", "NEAR(a b", 'Kziv" OR "x', "-spring", "^a", "a:b", "(", "AND"])
+def test_query_syntax_is_escaped(index, text):
+    query = build_query(text)
+    assert query is None or all(clause.startswith('("') for clause in query.split(" AND "))
+    # Nothing the user types is read as FTS5 syntax
+    index.search(text)
+
+
+def test_build_query():
+    assert build_query("") is None and build_query('"*') is None
+    assert build_query("Nahal kz") == '("nahal") AND ("kz"*)'
+
+
+def test_search(index):
+    assert {hit.pair_key for hit in index.search("spring")} == {"kziv", "amud"}
+    assert {hit.pair_key for hit in index.search("kzi")} == {"kziv"}
+    # "נחל" finds "בנחל"; a prefixed query finds the plain word
+    assert {(h.pair_key, h.field) for h in index.search("נחל", lang="he")} >= {("kziv", "description")}
+    assert {(h.pair_key, h.field, h.media_id) for h in index.search("ומעיין")} >= {("kziv", "media", "m0"),
+                                                                                  ("amud", "description", None)}
+    assert index.search("spring", lang="he") == []
+
+
+def test_snippet_on_pointed_text():
+    # Every letter carries niqqud, so the normalized text is much shorter than the original
+    content = "שָׁלוֹם עֲלֵיכֶם " * 20 + "בְּנַחַל כְּזִיב" + " מַעְיָן טוֹב" * 20
+    snippet = _snippet(content, "כזיב", width=40)
+    assert "כְּזִיב" in snippet and snippet.startswith("…") and snippet.endswith("…")
+    # A final letter in the query matches the final form in the text
+    assert "מַעְיָן" in _snippet(content, "מעין", width=20)
+    assert _snippet("Ein Tamir spring", "spring") == "Ein Tamir spring"
+
+
+def test_update_reindexes_only_changed_files(index, trails):
+    assert index.update(str(trails)) == {"indexed": 0, "removed": 0, "unchanged": 4}
+    _write(trails, "kziv", "en", "Nahal Kziv", "A steep path to Montfort castle.")
+    assert index.update(str(trails)) == {"indexed": 1, "removed": 0, "unchanged": 3}
+    assert {hit.pair_key for hit in index.search("spring")} == {"amud"}
+    assert [hit.pair_key for hit in index.search("montfort")] == ["kziv"]
+
+    (trails / "amud_he.json").unlink()
+    assert index.update(str(trails)) == {"indexed": 0, "removed": 1, "unchanged": 3}
+    assert index.search("סכוי") == []
+    # Only the entries of the current files are left, in the table and in the FTS index
+    with sqlite3.connect(index.db_path) as conn:
+        entries, fts = (conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("entries", "entries_fts"))
+    assert entries == fts == 7
+
+
+def test_update_file(index, trails):
+    path = _write(trails, "amud", "he", "נחל עמוד", "מערת עמוד")
+    index.update_file(str(path))
+    assert [hit.pair_key for hit in index.search("מערה")] == []
+    assert [hit.pair_key for hit in index.search("מערת")] == ["amud"]
+    path.unlink()
+    index.update_file(str(path))
+    assert index.search("מערת") == []
+    assert index.update(str(trails)) == {"indexed": 0, "removed": 0, "unchanged": 3}
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from trailMng.simplify import douglas_peucker, lttb, simplify_to_pixels
+
+
+def _walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(size=n)), np.cumsum(rng.normal(size=n))
+
+
+def _distance(x, y, i, start, end):
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else min(1.0, max(0.0, ((x[i] - x[start]) * dx + (y[i] - y[start]) * dy) / length2))
+    return float(np.hypot(x[i] - x[start] - t * dx, y[i] - y[start] - t * dy))
+
+
+def _reference_dp(x, y, tolerance):
+    """Recursive Douglas-Peucker, one range at a time."""
+    keep = {0, len(x) - 1}
+
+    def split(start, end):
+        if end - start < 2:
+            return
+        dists = [_distance(x, y, i, start, end) for i in range(start + 1, end)]
+        mid = start + 1 + int(np.argmax(dists))
+        if dists[mid - start - 1] > tolerance:
+            keep.add(mid)
+            split(start, mid)
+            split(mid, end)
+
+    split(0, len(x) - 1)
+    return sorted(keep)
+
+
+def _reference_lttb(x, y, points):
+    n = len(x)
+    edges = [1 + (i * (n - 2)) // (points - 2) for i in range(points - 1)]
+    kept = [0]
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nx, ny = np.mean(x[hi:edges[i + 2]]), np.mean(y[hi:edges[i + 2]])
+        else:
+            nx, ny = x[-1], y[-1]
+        a = kept[-1]
+        areas = [abs((x[a] - nx) * (y[j] - y[a]) - (x[a] - x[j]) * (ny - y[a])) for j in range(lo, hi)]
+        kept.append(lo + int(np.argmax(areas)))
+    return kept + [n - 1]
+
+
+@pytest.mark.parametrize("tolerance", [0.0, 0.5, 3.0, 50.0])
+def test_douglas_peucker_matches_reference(tolerance):
+    x, y = _walk(2000)
+    kept = douglas_peucker(x, y, tolerance)
+    assert kept.tolist() == _reference_dp(x, y, tolerance)
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    # Every dropped point lies within the tolerance of the kept line
+    for start, end in zip(kept[:-1], kept[1:]):
+        assert all(_distance(x, y, i, start, end) <= tolerance for i in range(start + 1, end))
+
+
+def test_douglas_peucker_special_lines():
+    for n in (0, 1, 2):
+        assert douglas_peucker(np.arange(n, dtype=float), np.zeros(n), 1.0).tolist() == list(range(n))
+    # A straight line keeps only its ends, a closed loop its start, end and far side
+    assert douglas_peucker(np.arange(100.0), np.arange(100.0) * 2, 0.1).tolist() == [0, 99]
+    angle = np.linspace(0, 2 * np.pi, 101)
+    loop = douglas_peucker(np.cos(angle), np.sin(angle), 0.5)
+    assert loop[0] == 0 and loop[-1] == 100 and 50 in loop
+
+
+@pytest.mark.parametrize("points", [3, 4, 17, 560, 1999])
+def test_lttb_returns_exactly_points(points):
+    x, y = np.arange(2000.0), _walk(2000, seed=1)[1]
+    kept = lttb(x, y, points)
+    assert len(kept) == points
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert np.all(np.diff(kept) > 0)
+    assert kept.tolist() == _reference_lttb(x, y, points)
+
+
+def test_lttb_keeps_peaks():
+    x = np.arange(10_000.0)
+    y = np.sin(x / 500)
+    y[3333] = 10
+    y[7777] = -10
+    kept = lttb(x, y, 100)
+    assert 3333 in kept and 7777 in kept
+
+
+def test_lttb_short_inputs():
+    for n in (0, 1, 2, 5):
+        x, y = np.arange(float(n)), np.ones(n)
+        # Asking for as many points as there are, or more, returns them all
+        assert lttb(x, y, n).tolist() == list(range(n))
+        assert lttb(x, y, n + 10).tolist() == list(range(n))
+    x, y = np.arange(10.0), np.ones(10)
+    assert lttb(x, y, 2).tolist() == [0, 9]
+    assert lttb(x, y, 1).tolist() == [0]
+    assert lttb(x, y, 0).tolist() == []
+
+
+def test_simplify_to_pixels():
+    x, y = _walk(5000, seed=2)
+    simplified = simplify_to_pixels(x, y, 400, 300)
+    assert simplified.original == 5000 and 2 < simplified.kept < 5000
+    assert simplified.indices[0] == 0 and simplified.indices[-1] == 4999
+    # A larger figure shows more detail
+    assert simplify_to_pixels(x, y, 1600, 1200).kept > simplified.kept
+
+    x[[0, 10, 4999]] = np.nan
+    simplified = simplify_to_pixels(x, y, 400, 300)
+    assert simplified.indices[0] == 1 and simplified.indices[-1] == 4998
+    assert not np.isin([0, 10, 4999], simplified.indices).any()
+
+
+def test_simplify_to_pixels_short_and_flat_lines():
+    for n in (0, 1, 2):
+        simplified = simplify_to_pixels(np.arange(float(n)), np.ones(n), 400, 300)
+        assert simplified.indices.tolist() == list(range(n)) and simplified.original == n
+    # No extent on one axis: nothing to divide by, and a flat line keeps its ends
+    assert simplify_to_pixels(np.arange(50.0), np.zeros(50), 400, 300).indices.tolist() == [0, 49]
+    assert simplify_to_pixels(np.ones(50), np.ones(50), 400, 300).indices.tolist() == [0, 49]
@@ -0,0 +1,123 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+from trailMng.spatial import CELL_DEG, SpatialIndex, lines_in_bbox
+from trailMng.track import EARTH_RADIUS, Track
+
+# Degrees of latitude per metre
+LAT_PER_M = math.degrees(1 / EARTH_RADIUS)
+# A row of tiles (and of 16-tile blocks) starts exactly here
+EDGE_LAT = 32.0
+
+
+def _track(lat, lon, offsets=(0,)):
+    lat, lon = np.broadcast_arrays(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+    n = len(lat)
+    return Track(lat.copy(), lon.copy(), np.full(n, np.nan), np.full(n, np.nan), np.array(offsets, dtype=np.int64))
+
+
+def _east(lat, lon0, lon1, points=41):
+    """A straight track along ``lat`` from ``lon0`` to ``lon1``."""
+    return _track(lat, np.linspace(lon0, lon1, points))
+
+
+def _gpx(track):
+    points = "".join(f'<trkpt lat="{a:.7f}" lon="{o:.7f}"></trkpt>' for a, o in zip(track.lat, track.lon))
+    return f'<gpx version="1.1"><trk><trkseg>{points}</trkseg></trk></gpx>'.encode()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SpatialIndex(str(tmp_path / "spatial.sqlite"))
+
+
+def test_near_across_a_tile_edge(index):
+    assert (EDGE_LAT + 90) / CELL_DEG % 16 == 0
+    index.add_track("edge", _east(EDGE_LAT, 35.0, 35.02))
+    # The point lies in the row of tiles and blocks just south of the track
+    lat = EDGE_LAT - 100 * LAT_PER_M
+    (hit,) = index.near(lat, 35.01, radius_m=150)
+    assert hit.trail_id == "edge" and hit.distance_m == pytest.approx(100, abs=0.5)
+    assert index.near(lat, 35.01, radius_m=90) == []
+    # Past the end of the track the distance is to its last point
+    assert [h.trail_id for h in index.near(EDGE_LAT, 35.02 + 0.001, radius_m=150)] == ["edge"]
+    assert index.near(EDGE_LAT, 35.02 + 0.002, radius_m=150) == []
+
+
+def test_near_orders_by_distance(index):
+    index.add_track("far", _east(EDGE_LAT + 300 * LAT_PER_M, 35.0, 35.02))
+    index.add_track("close", _east(EDGE_LAT + 50 * LAT_PER_M, 35.0, 35.02))
+    assert [h.trail_id for h in index.near(EDGE_LAT, 35.01)] == ["close", "far"]
+
+
+def test_bbox_crossed_without_a_vertex_inside(index):
+    # One long step: neither point is in the box, but the line runs through it
+    track = _track([32.01, 32.03], [35.0, 35.05])
+    index.add_track("diagonal", track)
+    assert index.in_bbox(32.015, 35.02, 32.025, 35.03) == ["diagonal"]
+    # A box beside the line, inside the bounds of the step
+    assert index.in_bbox(32.025, 35.005, 32.029, 35.01) == []
+
+    line = (track.lat, track.lon, track.segment_offsets)
+    assert lines_in_bbox([line], (32.015, 35.02, 32.025, 35.03)).tolist() == [True]
+    # The gap between two segments is not part of the line
+    split = (np.array([32.01, 32.011, 32.029, 32.03]), np.array([35.0, 35.001, 35.049, 35.05]), np.array([0, 2]))
+    assert lines_in_bbox([split, line], (32.015, 35.02, 32.025, 35.03)).tolist() == [False, True]
+
+
+def test_overlap_of_partly_shared_tracks(index):
+    lat = EDGE_LAT + 0.0003
+    index.add_track("west", _east(lat, 35.0, 35.02))
+    index.add_track("elsewhere", _east(lat + 0.05, 35.0, 35.02))
+    # Runs along the eastern half of "west", then as far again on its own
+    track = _east(lat, 35.01, 35.03)
+    (overlap,) = index.overlaps(track)
+    assert overlap.trail_id == "west"
+    assert overlap.share == pytest.approx(0.5, abs=0.05)
+    assert overlap.covered == pytest.approx(0.5, abs=0.05)
+    assert index.overlaps(track, exclude="west") == []
+    assert index.overlaps(track, min_share=0.6) == []
+
+
+def test_update_reindexes_changed_and_drops_removed_tracks(index, tmp_path):
+    directory = tmp_path / "gpx"
+    directory.mkdir()
+    (directory / "a.gpx").write_bytes(_gpx(_east(32.1, 35.0, 35.01)))
+    (directory / "b.gpx").write_bytes(_gpx(_east(32.2, 35.0, 35.01)))
+    (directory / "notes.txt").write_text("not a track")
+    assert index.update(str(directory)) == {"indexed": 2, "removed": 0, "unchanged": 0, "failed": 0}
+    assert index.update(str(directory)) == {"indexed": 0, "removed": 0, "unchanged": 2, "failed": 0}
+
+    # Same bytes with a new mtime are hashed but not parsed again
+    os.utime(directory / "b.gpx", ns=(0, 0))
+    assert index.update(str(directory))["unchanged"] == 2
+
+    (directory / "a.gpx").write_bytes(_gpx(_east(32.3, 35.0, 35.01)))
+    assert index.update(str(directory)) == {"indexed": 1, "removed": 0, "unchanged": 1, "failed": 0}
+    assert index.near(32.1, 35.005) == []
+    assert [h.trail_id for h in index.near(32.3, 35.005)] == ["a"]
+
+    (directory / "b.gpx").unlink()
+    assert index.update(str(directory)) == {"indexed": 0, "removed": 1, "unchanged": 1, "failed": 0}
+    assert len(index) == 1 and index.near(32.2, 35.005) == []
+
+    (directory / "a.gpx").write_bytes(b"<gpx><trk>")
+    assert index.update(str(directory))["failed"] == 1
+    assert len(index) == 0
+
+
+def test_remove_and_add_track(index, tmp_path):
+    directory = tmp_path / "gpx"
+    directory.mkdir()
+    (directory / "a.gpx").write_bytes(_gpx(_east(32.1, 35.0, 35.01)))
+    index.update(str(directory))
+    index.add_track("uploaded", _east(32.4, 35.0, 35.01))
+
+    index.remove("a")
+    assert index.near(32.1, 35.005) == [] and len(index) == 1
+    # The file is still there, so the next update indexes it again; add_track tracks are kept
+    assert index.update(str(directory))["indexed"] == 1
+    assert sorted(h.trail_id for h in index.near(32.25, 35.005, radius_m=20_000)) == ["a", "uploaded"]
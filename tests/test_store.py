@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+import pytest
+
+from benchmarks.generators import gpx_document
+from trailMng.gpx_stream import load_track, read_track
+from trailMng.store import StoredTrack, encode_track, open_track, save_track
+from trailMng.track import Track
+
+FIELDS = ("lat", "lon", "ele", "time", "segment_offsets")
+
+
+def _assert_same(decoded, track):
+    for name in FIELDS:
+        # NaN compares equal here, so missing values must stay missing
+        np.testing.assert_array_equal(getattr(decoded, name), getattr(track, name), err_msg=name)
+
+
+@pytest.mark.parametrize("elevation", [True, False])
+@pytest.mark.parametrize("tracks, segments", [(1, 1), (2, 3)])
+def test_decodes_exactly_the_parsed_values(elevation, tracks, segments):
+    track = read_track(io.BytesIO(gpx_document(20000, tracks, segments, elevation)))
+    stored = StoredTrack(encode_track(track))
+    _assert_same(stored.to_track(), track)
+    assert ("ele" in stored.columns) == elevation
+    # Steps of a few metres fit two bytes per coordinate
+    assert stored.columns["lat"].dtype == np.dtype("<i2")
+
+
+def test_missing_values_and_large_steps():
+    track = Track(lat=np.array([32.1234567, -33.8688197, 51.5072178, 0.0]),
+                  lon=np.array([34.7654321, 151.2092955, -0.1275862, 179.9999999]),
+                  ele=np.array([np.nan, -430.5, 8848.9, np.nan]),
+                  time=np.array([1700000000.0, np.nan, 1700000000.123, 1800000000.999]),
+                  segment_offsets=np.array([0, 2], dtype=np.int64))
+    stored = StoredTrack(encode_track(track))
+    _assert_same(stored.to_track(), track)
+    assert stored.columns["lat"].dtype == np.dtype("<i4")
+
+
+def test_without_elevation_or_time():
+    track = Track(lat=np.array([32.0, 32.0001]), lon=np.array([34.0, 34.0001]), ele=np.full(2, np.nan),
+                  time=np.full(2, np.nan), segment_offsets=np.array([0], dtype=np.int64))
+    stored = StoredTrack(encode_track(track))
+    assert set(stored.columns) == {"lat", "lon", "segments"}
+    _assert_same(stored.to_track(), track)
+
+
+def test_file_round_trip(tmp_path):
+    track = read_track(io.BytesIO(gpx_document(5000, 1, 2, True)))
+    path = str(tmp_path / "track.trk")
+    assert save_track(track, path) == len(encode_track(track))
+    _assert_same(open_track(path).to_track(), track)
+    # load_track recognises track files by their header, from a path or a stream
+    _assert_same(load_track(path), track)
+    with open(path, "rb") as f:
+        _assert_same(load_track(f), track)
+
+
+def test_rejects_other_files():
+    data = encode_track(read_track(io.BytesIO(gpx_document(100))))
+    with pytest.raises(ValueError, match="Not a track file"):
+        StoredTrack(b"<gpx></gpx>")
+    with pytest.raises(ValueError, match="Truncated"):
+        StoredTrack(data[:len(data) // 2])
@@ -0,0 +1,62 @@
+import io
+import time
+
+import gpxpy
+import numpy as np
+import pytest
+
+from benchmarks.generators import gpx_document
+from trailMng.gpx_stream import read_track
+from trailMng.track import track_from_gpx, track_stats
+
+
+@pytest.mark.parametrize("tracks, segments", [(1, 1), (2, 3)])
+@pytest.mark.parametrize("elevation", [True, False])
+def test_stats_match_gpxpy(tracks, segments, elevation):
+    data = gpx_document(20000, tracks, segments, elevation)
+    gpx = gpxpy.parse(data.decode("utf-8"))
+    stats = track_stats(track_from_gpx(gpx))
+
+    # gpxpy sums each segment on its own, the GPX tab joins consecutive segments
+    runs = [segment.points for track in gpx.tracks for segment in track.segments]
+    gaps = sum(before[-1].distance_2d(after[0]) for before, after in zip(runs, runs[1:]))
+    assert stats.distance_m == pytest.approx(gpx.length_2d() + gaps, rel=1e-6)
+
+    extremes = gpx.get_elevation_extremes()
+    assert (stats.min_ele, stats.max_ele) == ((extremes.minimum, extremes.maximum) if elevation else (None, None))
+    bounds = gpx.get_bounds()
+    assert stats.bbox == (bounds.min_latitude, bounds.min_longitude, bounds.max_latitude, bounds.max_longitude)
+    assert stats.points == gpx.get_track_points_no() == 20000
+    # First to last timestamp, where gpxpy's get_duration() leaves out the gaps between segments
+    start, end = gpx.get_time_bounds()
+    assert stats.duration_s == (end - start).total_seconds()
+
+
+def test_stream_reader_matches_gpxpy():
+    data = gpx_document(5000, 2, 2, True)
+    streamed = read_track(io.BytesIO(data))
+    parsed = track_from_gpx(gpxpy.parse(data.decode("utf-8")))
+    for name in ("lat", "lon", "ele", "time", "segment_offsets"):
+        np.testing.assert_array_equal(getattr(streamed, name), getattr(parsed, name))
+    assert track_stats(streamed) == track_stats(parsed)
+
+
+@pytest.fixture
+def local_time_not_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Jerusalem")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_times_are_utc(local_time_not_utc):
+    data = gpx_document(1000, 1, 2, True)
+    utc = read_track(io.BytesIO(data)).time
+    naive = data.replace(b"Z</time>", b"</time>")
+    # The last point with an offset sends the stream reader through datetime.fromisoformat
+    head, end, tail = naive.rpartition(b"</time>")
+    mixed = head + b"+00:00" + end + tail
+    for document in (naive, mixed):
+        np.testing.assert_array_equal(read_track(io.BytesIO(document)).time, utc)
+        np.testing.assert_array_equal(track_from_gpx(gpxpy.parse(document.decode("utf-8"))).time, utc)
@@ -0,0 +1,76 @@
+"""
+Core trail management logic shared by the admin apps.
+
+The package is UI-free: importing it, or any of its modules, never loads streamlit,
+and matplotlib, gpxpy, Pillow and requests are only imported by the functions that
+need them. The main functions can be imported from the package itself; their module
+is loaded on first access::
+
+    from trailMng import load_track, track_stats
+
+``python -m benchmarks.import_budget`` checks that this stays true.
+"""
+import importlib
+from typing import Any, List
+
+_EXPORTS = {
+    "Track": "track",
+    "TrackStats": "track",
+    "cumulative_distance": "track",
+    "track_from_gpx": "track",
+    "track_stats": "track",
+    "UnsupportedGPX": "gpx_stream",
+    "load_track": "gpx_stream",
+    "read_track": "gpx_stream",
+    "douglas_peucker": "simplify",
+    "simplify_to_pixels": "simplify",
+    "lttb": "simplify",
+    "LRUCache": "cache",
+    "TrackCache": "cache",
+    "content_key": "cache",
+    "parse_uploads": "batch",
+    "ElevationProfile": "elevation",
+    "ProfileCache": "elevation",
+    "FigureCache": "render",
+    "RenderParams": "render",
+    "render_track_map": "render",
+    "profile_chart": "render",
+    "LANGUAGES": "trails",
+    "MEDIA_TYPES": "trails",
+    "MediaList": "trails",
+    "MergedTrail": "trails",
+    "build_trail_documents": "trails",
+    "build_trail_json": "trails",
+    "find_mismatches": "trails",
+    "merge_trail_documents": "trails",
+    "apply_patch": "patch",
+    "diff_documents": "patch",
+    "compile_catalog": "catalog",
+    "discover_pairs": "catalog",
+    "IncrementalBuilder": "build",
+    "encode_polyline": "export",
+    "export_catalog": "export",
+    "DraftStore": "drafts",
+    "StoredTrack": "store",
+    "load_stored_track": "store",
+    "save_track": "store",
+    "TrailSearchIndex": "search",
+    "SpatialIndex": "spatial",
+    "MediaPreviewService": "media",
+    "Profiler": "profiling",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
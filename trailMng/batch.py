@@ -0,0 +1,121 @@
+"""
+Parsing many GPX uploads at once.
+
+Uploads that are already in the track cache are served first. The rest are parsed and
+summarized on a process pool, and results are yielded as each file finishes, so the
+caller can show progress while slower files are still running.
+"""
+from concurrent.futures import BrokenExecutor, Executor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+import io
+import os
+import sys
+import types
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from trailMng.cache import TrackCache, content_key
+from trailMng.gpx_stream import load_track
+from trailMng.track import Track, TrackStats, track_stats
+
+
+@dataclass
+class UploadResult:
+    index: int  # position in the uploads, which tells apart files with the same name
+    name: str
+    key: str
+    track: Optional[Track] = None
+    stats: Optional[TrackStats] = None  # None for a track without points
+    error: Optional[str] = None
+
+
+def summarize_gpx(data: bytes) -> Tuple[Track, Optional[TrackStats]]:
+    """Parse GPX bytes and compute their statistics. Runs in a worker process."""
+    try:
+        track = load_track(io.BytesIO(data))
+    except Exception as e:
+        # Some parser exceptions (gpxpy's among them) cannot be unpickled in the parent,
+        # which would take the whole pool down; pass on the message only
+        raise ValueError(str(e) or type(e).__name__) from None
+    return track, track_stats(track) if len(track) else None
+
+
+def pool_context():
+    """Start method for worker processes: ``forkserver`` where available, else ``spawn``.
+
+    The pools are created inside the multi-threaded Streamlit server, where forking could
+    copy a lock held by another thread into a worker and leave it waiting forever.
+    """
+    import multiprocessing
+
+    return multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                                       else "spawn")
+
+
+@contextmanager
+def plain_main():
+    """Give worker processes started inside the block an empty ``__main__``.
+
+    A ``forkserver`` or ``spawn`` worker runs the parent's main script again before it takes
+    work. Streamlit runs the app as ``__main__``, so that would be the whole app; the workers
+    only need trailMng. ProcessPoolExecutor starts them on ``submit``, so submit in here.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def make_pool(jobs: int = os.cpu_count() or 1) -> Executor:
+    """A process pool for ``parse_uploads``; meant to be created once and reused."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=pool_context())
+
+
+def parse_uploads(uploads: Sequence[Tuple[str, bytes]], cache: TrackCache,
+                  pool: Optional[Executor] = None) -> Iterator[UploadResult]:
+    """Yield an UploadResult per ``(name, data)`` upload, in completion order.
+
+    Cached tracks come first. Without a usable pool, or with a single file left to parse,
+    the files are parsed in this process. Parsed tracks are added to ``cache``; identical
+    uploads are parsed once. ``UploadResult.index`` is the position of the upload in
+    ``uploads``, so files with the same name stay apart.
+    """
+    todo: Dict[str, List[Tuple[int, str]]] = {}
+    payloads: Dict[str, bytes] = {}
+    for index, (name, data) in enumerate(uploads):
+        key = content_key(data)
+        track = cache.get(key)
+        if track is not None:
+            yield UploadResult(index, name, key, track, track_stats(track) if len(track) else None)
+        else:
+            todo.setdefault(key, []).append((index, name))
+            payloads[key] = data
+
+    def results(key: str, parse: Callable[[], Tuple[Track, Optional[TrackStats]]]) -> Iterator[UploadResult]:
+        try:
+            track, stats = parse()
+        except Exception as e:
+            for index, name in todo[key]:
+                yield UploadResult(index, name, key, error=str(e) or type(e).__name__)
+            return
+        cache.put(key, track)
+        for index, name in todo[key]:
+            yield UploadResult(index, name, key, track, stats)
+
+    futures = {}
+    if pool is not None and len(todo) > 1:
+        try:
+            with plain_main():
+                futures = {pool.submit(summarize_gpx, payloads[key]): key for key in todo}
+        except BrokenExecutor:
+            futures = {}  # a worker died earlier; this pool cannot take work any more
+    if not futures:
+        for key in todo:
+            yield from results(key, lambda: summarize_gpx(payloads[key]))
+        return
+    for future in as_completed(futures):
+        yield from results(futures[future], future.result)
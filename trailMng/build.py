@@ -0,0 +1,237 @@
+"""
+Incremental catalog builds.
+
+Keeps a manifest of every input file (size, mtime and SHA-256) and of the per-trail
+output derived from each EN/HE pair, so a rebuild only re-merges the pairs whose
+files changed::
+
+    python -m trailMng.build trailjsons -d build            # one incremental build
+    python -m trailMng.build trailjsons -d build --watch    # rebuild on every save
+
+The consolidated bundle (``catalog.json`` in the build directory) is reassembled
+from the per-trail outputs after each build.
+"""
+import argparse
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from trailMng.catalog import Issue, TrailPair, check_catalog, compile_pairs, discover_pairs
+
+MANIFEST_NAME = "manifest.json"
+BUNDLE_NAME = "catalog.json"
+MANIFEST_VERSION = 1
+WATCH_INTERVAL = 0.5
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot(directory: str) -> Dict[str, Tuple[int, int]]:
+    """``{path: (size, mtime_ns)}`` of the JSON files in ``directory``."""
+    result = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                st = entry.stat()
+                result[entry.path] = (st.st_size, st.st_mtime_ns)
+    return result
+
+
+@dataclass
+class BuildReport:
+    compiled: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        stages = "  ".join(f"{stage} {ms:.1f} ms" for stage, ms in self.timings.items())
+        return (f"{len(self.compiled)} compiled, {len(self.removed)} removed, "
+                f"{self.unchanged} unchanged  ({stages})")
+
+
+class IncrementalBuilder:
+    """Builds ``directory`` into ``build_dir``, recompiling only changed pairs."""
+
+    def __init__(self, directory: str, build_dir: str, jobs: int = os.cpu_count() or 1):
+        # Absolute paths keep the manifest valid whatever directory the build runs from
+        self.directory = os.path.abspath(directory)
+        self.build_dir = os.path.abspath(build_dir)
+        self.jobs = jobs
+        self.manifest_path = os.path.join(self.build_dir, MANIFEST_NAME)
+        self.bundle_path = os.path.join(self.build_dir, BUNDLE_NAME)
+        os.makedirs(os.path.join(self.build_dir, "trails"), exist_ok=True)
+        self.manifest = self._load_manifest()
+        # Serialized per-pair outputs already read, so watch-mode rebuilds skip the disk
+        self._entries: Dict[str, str] = {}
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION and manifest.get("source") == self.directory:
+                return manifest
+        except (OSError, json.JSONDecodeError):
+            pass
+        return {"version": MANIFEST_VERSION, "source": self.directory, "inputs": {}, "pairs": {}}
+
+    def _save_manifest(self) -> None:
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp, self.manifest_path)
+
+    def _output_path(self, key: str) -> str:
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.build_dir, "trails", f"{name}.json")
+
+    def _changed_inputs(self, current: Dict[str, Tuple[int, int]]) -> set:
+        """Paths whose content changed since the last build (hashing only on a stat change)."""
+        inputs = self.manifest["inputs"]
+        changed = set()
+        for path, (size, mtime_ns) in current.items():
+            known = inputs.get(path)
+            if known and known["size"] == size and known["mtime_ns"] == mtime_ns:
+                continue
+            digest = sha256_file(path)
+            if not known or known["sha256"] != digest:
+                changed.add(path)
+            inputs[path] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest}
+        for path in set(inputs) - set(current):
+            del inputs[path]
+        return changed
+
+    def _read_entry(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        output = self.manifest["pairs"][key].get("output")
+        if entry is None and output:
+            with open(output, encoding="utf-8") as f:
+                entry = self._entries[key] = f.read()
+        return entry
+
+    def build(self) -> BuildReport:
+        report = BuildReport()
+
+        start = time.perf_counter()
+        pairs, issues = discover_pairs(self.directory)
+        changed = self._changed_inputs(snapshot(self.directory))
+        known_pairs = self.manifest["pairs"]
+        dirty: List[TrailPair] = []
+        for pair in pairs:
+            known = known_pairs.get(pair.key)
+            if (known is None or known["files"] != pair.files
+                    or changed.intersection(pair.files.values())
+                    or (known.get("output") and not os.path.exists(known["output"]))):
+                dirty.append(pair)
+            else:
+                report.unchanged += 1
+        current_keys = {pair.key for pair in pairs}
+        report.removed = sorted(set(known_pairs) - current_keys)
+        report.timings["scan"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        results = compile_pairs(dirty, self.jobs)
+        report.timings["merge_validate"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for pair, (entry, pair_issues) in zip(dirty, results):
+            output = None
+            if entry is not None:
+                output = self._output_path(pair.key)
+                text = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(text)
+                self._entries[pair.key] = text
+            else:
+                self._entries.pop(pair.key, None)
+            known_pairs[pair.key] = {"files": pair.files, "output": output,
+                                     "trailId": entry["trailId"] if entry else None,
+                                     "issues": [asdict(issue) for issue in pair_issues]}
+            report.compiled.append(pair.key)
+        for key in report.removed:
+            output = known_pairs.pop(key).get("output")
+            self._entries.pop(key, None)
+            if output and os.path.exists(output):
+                os.remove(output)
+        report.timings["write_outputs"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        if report.compiled or report.removed or not os.path.exists(self.bundle_path):
+            self._write_bundle(pairs, issues)
+        self._save_manifest()
+        report.timings["bundle"] = (time.perf_counter() - start) * 1000
+        return report
+
+    def _write_bundle(self, pairs: List[TrailPair], issues: List[Issue]) -> None:
+        """Splice the serialized per-pair outputs into one bundle without re-parsing them."""
+        texts = []
+        owners = []
+        for pair in pairs:
+            known = self.manifest["pairs"][pair.key]
+            issues.extend(Issue(**issue) for issue in known["issues"])
+            entry = self._read_entry(pair.key)
+            if entry is not None:
+                texts.append(entry)
+                owners.append({"key": pair.key, "trailId": known["trailId"]})
+        issues.extend(check_catalog(owners))
+        tmp = f"{self.bundle_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write('{"source":' + json.dumps(self.directory, ensure_ascii=False) + ',"trails":[')
+            f.write(",".join(texts))
+            f.write('],"issues":' + json.dumps([asdict(issue) for issue in issues], ensure_ascii=False,
+                                               separators=(",", ":")) + "}")
+        os.replace(tmp, self.bundle_path)
+
+    def watch(self, interval: float = WATCH_INTERVAL,
+              on_build: Optional[Callable[[BuildReport], None]] = None) -> None:
+        """Poll the source directory and rebuild whenever a JSON file changes."""
+        last = snapshot(self.directory)
+        while True:
+            time.sleep(interval)
+            current = snapshot(self.directory)
+            if current == last:
+                continue
+            last = current
+            report = self.build()
+            if on_build is not None:
+                on_build(report)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Incrementally build the trail catalog.")
+    parser.add_argument("directory", nargs="?", default="trailjsons", help="Directory of *_en/*_he JSON files")
+    parser.add_argument("-d", "--build-dir", default="build", help="Where the manifest and outputs live")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--watch", action="store_true", help="Keep polling and rebuild changed pairs")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="Watch poll interval in seconds")
+    args = parser.parse_args(argv)
+
+    def report(result: BuildReport) -> None:
+        print(result.summary(), file=sys.stderr)
+        for key in result.compiled:
+            print(f"  compiled {key}", file=sys.stderr)
+        for key in result.removed:
+            print(f"  removed  {key}", file=sys.stderr)
+
+    builder = IncrementalBuilder(args.directory, args.build_dir, args.jobs)
+    report(builder.build())
+    if args.watch:
+        try:
+            builder.watch(args.interval, report)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
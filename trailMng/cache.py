@@ -0,0 +1,145 @@
+"""
+Caches for parsed GPX tracks.
+
+Tracks are keyed by the SHA-256 of the uploaded bytes, so a Streamlit rerun (or a
+second upload of the same file) reuses the arrays instead of parsing again. The
+memory tier is bounded by a byte budget with LRU eviction; the optional disk tier
+keeps compact ``.trk`` copies (see ``trailMng.store``) that survive restarts, are
+shared between sessions and load without parsing any XML.
+"""
+from collections import OrderedDict
+import hashlib
+import io
+import os
+import threading
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from trailMng.gpx_stream import load_track
+from trailMng.store import SUFFIX, load_stored_track, save_track
+from trailMng.track import Track
+
+DEFAULT_MAX_MB = 256
+
+
+def content_key(data: bytes) -> str:
+    """Cache key for an upload: the hex SHA-256 of its bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe mapping bounded by the total size of its values, in bytes.
+
+    Values larger than the whole budget are not stored.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._items[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+
+class TrackCache:
+    """Two-tier cache of parsed tracks keyed by upload content hash."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 2**20, disk_dir: Optional[str] = None):
+        self.memory = LRUCache(max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "TrackCache":
+        """Build a cache from ``TRAILMNG_TRACK_CACHE_MB`` and ``TRAILMNG_CACHE_DIR``."""
+        max_mb = float(os.environ.get("TRAILMNG_TRACK_CACHE_MB", DEFAULT_MAX_MB))
+        return cls(max_bytes=int(max_mb * 2**20), disk_dir=os.environ.get("TRAILMNG_CACHE_DIR") or None)
+
+    @property
+    def hits(self) -> int:
+        return self.memory.hits
+
+    @property
+    def misses(self) -> int:
+        """Lookups that had to parse, i.e. missed both tiers."""
+        return self.memory.misses - self.disk_hits
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "entries": len(self.memory),
+            "bytes": self.memory.nbytes,
+        }
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}{SUFFIX}")
+
+    def get(self, key: str) -> Optional[Track]:
+        track = self.memory.get(key)
+        if track is not None or not self.disk_dir:
+            return track
+        try:
+            track = load_stored_track(self._disk_path(key))
+        except (OSError, ValueError):
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, track, track.nbytes)
+        return track
+
+    def put(self, key: str, track: Track) -> None:
+        self.memory.put(key, track, track.nbytes)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            if not os.path.exists(path):
+                save_track(track, path)
+
+    def get_or_load(self, data: bytes,
+                    loader: Callable[[io.BytesIO], Track] = load_track) -> Tuple[str, Track]:
+        """Return ``(key, track)`` for GPX bytes, parsing them only on a miss."""
+        key = content_key(data)
+        track = self.get(key)
+        if track is None:
+            track = loader(io.BytesIO(data))
+            self.put(key, track)
+        return key, track
@@ -0,0 +1,268 @@
+"""
+Headless catalog compiler for a directory of trail JSON files.
+
+Discovers the English/Hebrew file pairs, merges each pair with the same logic the
+editor uses, validates the result and writes one consolidated catalog bundle::
+
+    python -m trailMng.catalog trailjsons -o catalog.json
+
+Pairs are compiled on a process pool; the time spent in every stage is reported.
+"""
+import argparse
+from dataclasses import asdict, dataclass, field
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from trailMng.trails import (LANGUAGES, MEDIA_TYPES, build_trail_documents, find_mismatches,
+                             merge_trail_documents)
+
+# Pairs below this count are compiled inline: the pool start-up costs more than it saves
+POOL_MIN_PAIRS = 32
+
+_SUFFIX_RE = re.compile(r"^(?P<base>.*?)_+(?P<lang>en|he)$")
+_INFIX_RE = re.compile(r"^(?P<base>.*?)(?P<lang>Eng|Heb)(?P<rest>(?:Ver\d+)?)$")
+_INFIX_LANGS = {"Eng": "en", "Heb": "he"}
+_DASHES = "‐‑‒–—―-"
+
+
+@dataclass
+class Issue:
+    level: str  # "error" or "warning"
+    key: str
+    message: str
+    file: Optional[str] = None
+
+
+@dataclass
+class TrailPair:
+    """The files of one trail; either language may be missing."""
+    key: str
+    files: Dict[str, str] = field(default_factory=dict)
+
+
+def split_language(filename: str) -> Tuple[Optional[str], Optional[str]]:
+    """``(base name, language)`` of a trail JSON file name, or ``(None, None)``.
+
+    Understands ``Name_en.json``, ``Name__he.json`` and ``4Eng.json`` / ``4HebVer1.json``.
+    """
+    stem = filename[:-len(".json")] if filename.endswith(".json") else filename
+    match = _SUFFIX_RE.match(stem)
+    if match:
+        return match.group("base"), match.group("lang")
+    match = _INFIX_RE.match(stem)
+    if match:
+        return match.group("base") + match.group("rest"), _INFIX_LANGS[match.group("lang")]
+    return None, None
+
+
+def pair_key(base: str) -> str:
+    """Normalize a base name so spacing and dash variants of one trail pair up."""
+    text = unicodedata.normalize("NFKC", base)
+    text = re.sub(rf"\s*([{_DASHES}])\s*", "-", text)
+    text = re.sub(r"[\s_]+", " ", text).strip()
+    return text.casefold()
+
+
+def discover_pairs(directory: str) -> Tuple[List[TrailPair], List[Issue]]:
+    """Group the ``*.json`` files in ``directory`` into per-trail language pairs."""
+    pairs: Dict[str, TrailPair] = {}
+    issues = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(directory, filename)
+        base, lang = split_language(filename)
+        if lang is None:
+            issues.append(Issue("warning", filename, "Cannot tell the language from the file name", path))
+            continue
+        key = pair_key(base)
+        pair = pairs.setdefault(key, TrailPair(key=key))
+        if lang in pair.files:
+            issues.append(Issue("error", key, f"Duplicate {lang} file for this trail", path))
+            continue
+        pair.files[lang] = path
+    return list(pairs.values()), issues
+
+
+def load_document(path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """``(document, None)`` or ``(None, reason)`` for a trail JSON file."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except OSError as e:
+        return None, f"Cannot read file: {e}"
+    if not text.strip():
+        return None, "File is empty"
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON: {e}"
+    if not isinstance(data, dict):
+        return None, "Top-level value is not an object"
+    return data, None
+
+
+def _media_objects(data: Dict[str, Any]) -> bool:
+    """Whether ``media`` is a list of objects, the shape the merge needs."""
+    media = data.get("media", [])
+    return isinstance(media, list) and all(isinstance(item, dict) for item in media)
+
+
+def validate_document(key: str, path: str, data: Dict[str, Any]) -> List[Issue]:
+    """Structural checks on one language document."""
+    issues = []
+    for name in ("trailId", "name", "description"):
+        if not str(data.get(name) or "").strip():
+            issues.append(Issue("error" if name == "trailId" else "warning", key,
+                                f"Missing or empty '{name}'", path))
+    media = data.get("media", [])
+    if not isinstance(media, list):
+        return issues + [Issue("error", key, "'media' is not a list", path)]
+
+    seen = set()
+    for i, item in enumerate(media, start=1):
+        if not isinstance(item, dict):
+            issues.append(Issue("error", key, f"Media item {i} is not an object", path))
+            continue
+        media_id = item.get("id", "")
+        label = f"Media item {i}" + (f" ({media_id})" if media_id else "")
+        if not media_id:
+            issues.append(Issue("error", key, f"{label} has no id", path))
+        elif media_id in seen:
+            issues.append(Issue("error", key, f"{label} repeats an id", path))
+        seen.add(media_id)
+        if item.get("type") not in MEDIA_TYPES:
+            issues.append(Issue("error", key, f"{label} has unknown type {item.get('type')!r}", path))
+        if not item.get("url"):
+            issues.append(Issue("error", key, f"{label} has no url", path))
+    return issues
+
+
+def validate_pair(key: str, documents: Dict[str, Dict[str, Any]], files: Dict[str, str]) -> List[Issue]:
+    """Checks that need both languages."""
+    issues = []
+    if len(documents) < len(LANGUAGES):
+        for lang in LANGUAGES:
+            if lang not in files:
+                issues.append(Issue("warning", key, f"No {lang} file"))
+        return issues
+
+    # Items without an id are already reported per file
+    return [Issue("warning", key, mismatch.message, files[mismatch.lang] if mismatch.lang else None)
+            for mismatch in find_mismatches(documents["en"], documents["he"]) if mismatch.kind != "no_id"]
+
+
+def compile_pair(pair: TrailPair) -> Tuple[Optional[Dict[str, Any]], List[Issue]]:
+    """Load, merge and validate one pair. Runs in a worker process."""
+    documents = {}
+    issues = []
+    for lang, path in pair.files.items():
+        data, error = load_document(path)
+        if error:
+            issues.append(Issue("error", pair.key, error, path))
+            continue
+        issues.extend(validate_document(pair.key, path, data))
+        if _media_objects(data):
+            documents[lang] = data
+    issues.extend(validate_pair(pair.key, documents, pair.files))
+    if not documents:
+        return None, issues
+
+    merged = merge_trail_documents(documents.get("en"), documents.get("he"))
+    entry = {"key": pair.key, "trailId": merged.trail_id, "files": pair.files}
+    entry.update(build_trail_documents(merged))
+    return entry, issues
+
+
+def compile_pairs(pairs: List[TrailPair], jobs: int) -> List[Tuple[Optional[Dict[str, Any]], List[Issue]]]:
+    if jobs <= 1 or len(pairs) < POOL_MIN_PAIRS:
+        return [compile_pair(p) for p in pairs]
+    from concurrent.futures import ProcessPoolExecutor
+
+    from trailMng.batch import plain_main, pool_context
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=pool_context()) as pool:
+        with plain_main():
+            # map submits every chunk at once, so all workers start in here
+            chunks = pool.map(compile_pair, pairs, chunksize=max(1, len(pairs) // (jobs * 4)))
+        return list(chunks)
+
+
+def check_catalog(trails: List[Dict[str, Any]]) -> List[Issue]:
+    """Checks across trails: every trailId must belong to exactly one pair."""
+    owners: Dict[str, List[str]] = {}
+    for entry in trails:
+        owners.setdefault(entry["trailId"], []).append(entry["key"])
+    return [Issue("warning", trail_id, f"trailId is used by {len(keys)} trails: {', '.join(keys)}")
+            for trail_id, keys in owners.items() if len(keys) > 1]
+
+
+def compile_catalog(directory: str, jobs: int = os.cpu_count() or 1) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Compile ``directory`` into a catalog bundle. Returns ``(bundle, stage timings in ms)``."""
+    timings = {}
+
+    start = time.perf_counter()
+    pairs, issues = discover_pairs(directory)
+    timings["discover"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    results = compile_pairs(pairs, jobs)
+    timings["merge_validate"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    trails = []
+    for entry, pair_issues in results:
+        issues.extend(pair_issues)
+        if entry is not None:
+            trails.append(entry)
+    issues.extend(check_catalog(trails))
+    timings["cross_check"] = (time.perf_counter() - start) * 1000
+
+    bundle = {
+        "source": os.path.abspath(directory),
+        "trails": trails,
+        "issues": [asdict(issue) for issue in issues],
+    }
+    return bundle, timings
+
+
+def write_bundle(bundle: Dict[str, Any], output: str) -> None:
+    tmp = f"{output}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(bundle, ensure_ascii=False, separators=(",", ":")))
+    os.replace(tmp, output)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile trail JSON pairs into one catalog bundle.")
+    parser.add_argument("directory", nargs="?", default="trailjsons", help="Directory of *_en/*_he JSON files")
+    parser.add_argument("-o", "--output", default="catalog.json", help="Bundle to write")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--strict", action="store_true", help="Exit with status 1 if any error is found")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List warnings as well as errors")
+    args = parser.parse_args(argv)
+
+    bundle, timings = compile_catalog(args.directory, args.jobs)
+    start = time.perf_counter()
+    write_bundle(bundle, args.output)
+    timings["write"] = (time.perf_counter() - start) * 1000
+
+    errors = [i for i in bundle["issues"] if i["level"] == "error"]
+    for issue in bundle["issues"]:
+        if issue["level"] != "error" and not args.verbose:
+            continue
+        where = f" [{os.path.basename(issue['file'])}]" if issue["file"] else ""
+        print(f"{issue['level'].upper():7} {issue['key']}{where}: {issue['message']}", file=sys.stderr)
+    print(f"{len(bundle['trails'])} trails, {len(errors)} errors, "
+          f"{len(bundle['issues']) - len(errors)} warnings -> {args.output}", file=sys.stderr)
+    print("  ".join(f"{stage} {ms:.1f} ms" for stage, ms in timings.items()), file=sys.stderr)
+    return 1 if args.strict and errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Server-side drafts of the trail editor.
+
+An upload of English/Hebrew trail JSON files is parsed and merged once, and the merged
+draft is kept in a local SQLite database keyed by the hash of the uploaded bytes, so
+later reruns, a page refresh or a second upload of the same files read the draft back
+instead of parsing again. The uploaded documents are kept with the draft, so an export
+can show its changes against them as a JSON Patch (``trailMng.patch``).
+
+Edits are saved one field at a time: a trail field, one field of one media item, or
+the insertion, move or removal of a single media item. Media items are addressed by
+their ``MEDIA_KEY``, as in the editor's MediaList, and keep fractional positions, so
+placing one between two others writes one row.
+
+The database runs in WAL mode with one short transaction per write, so admins editing
+different trails at the same time do not wait for each other::
+
+    python -m trailMng.drafts list
+    python -m trailMng.drafts export DRAFT_ID -o out/   # also writes *.patch.json
+"""
+import argparse
+from contextlib import closing
+from dataclasses import dataclass, field
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from trailMng.patch import diff_documents
+from trailMng.trails import MEDIA_KEY, MediaList, MergedTrail, build_trail_documents, merge_trail_documents
+
+DEFAULT_DB = "traildrafts.sqlite"
+TRAIL_FIELDS = ("trail_id", "name_en", "description_en", "name_he", "description_he")
+MEDIA_FIELDS = ("id", "type", "url", "description_en", "description_he")
+# Below this gap between neighbours, positions are renumbered before an insert
+_MIN_GAP = 1e-6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    trail_id TEXT NOT NULL DEFAULT '',
+    name_en TEXT NOT NULL DEFAULT '',
+    description_en TEXT NOT NULL DEFAULT '',
+    name_he TEXT NOT NULL DEFAULT '',
+    description_he TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS media (
+    draft_id TEXT NOT NULL REFERENCES drafts(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    position REAL NOT NULL,
+    id TEXT NOT NULL DEFAULT '',
+    type TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    description_en TEXT NOT NULL DEFAULT '',
+    description_he TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (draft_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS media_order ON media(draft_id, position);
+CREATE TABLE IF NOT EXISTS bases (
+    draft_id TEXT NOT NULL REFERENCES drafts(id) ON DELETE CASCADE,
+    lang TEXT NOT NULL,
+    document TEXT NOT NULL,
+    PRIMARY KEY (draft_id, lang)
+) WITHOUT ROWID;
+"""
+
+
+class InvalidDocument(ValueError):
+    """Raised when an uploaded trail JSON file cannot be parsed."""
+
+    def __init__(self, lang: str, message: str):
+        super().__init__(message)
+        self.lang = lang
+
+
+@dataclass
+class Draft:
+    id: str
+    trail: MergedTrail  # media items carry their MEDIA_KEY
+    updated: float
+    # The uploaded documents the draft started from, by language
+    bases: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class DraftInfo:
+    id: str
+    trail_id: str
+    name: str
+    media: int
+    updated: float
+
+
+def upload_key(documents: Dict[str, bytes]) -> str:
+    """Draft id of an upload: a hash over the language and bytes of every file."""
+    digest = hashlib.sha256()
+    for lang in sorted(documents):
+        digest.update(f"{lang}:{hashlib.sha256(documents[lang]).hexdigest()}\n".encode("ascii"))
+    return digest.hexdigest()
+
+
+def parse_documents(documents: Dict[str, bytes]) -> Dict[str, Dict[str, Any]]:
+    """Parse uploaded English/Hebrew trail JSON bytes."""
+    parsed = {}
+    for lang, data in documents.items():
+        try:
+            parsed[lang] = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise InvalidDocument(lang, f"Invalid JSON: {e}") from e
+        if not isinstance(parsed[lang], dict):
+            raise InvalidDocument(lang, "Top-level value is not an object")
+        media = parsed[lang].get("media", [])
+        if not isinstance(media, list) or not all(isinstance(item, dict) for item in media):
+            raise InvalidDocument(lang, "'media' is not a list of objects")
+    return parsed
+
+
+def new_draft() -> Draft:
+    """An empty draft with a fresh id; it is stored on its first edit."""
+    return Draft(uuid.uuid4().hex, MergedTrail(), time.time())
+
+
+def _check(field: str, allowed) -> str:
+    # Field names go into SQL, so only known columns are accepted
+    if field not in allowed:
+        raise ValueError(f"Unknown field {field!r}")
+    return field
+
+
+class DraftStore:
+    """SQLite store of editor drafts with per-field saves."""
+
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "DraftStore":
+        """Open the store named by ``TRAILMNG_DRAFTS_DB`` (default ``traildrafts.sqlite``)."""
+        return cls(os.environ.get("TRAILMNG_DRAFTS_DB") or DEFAULT_DB)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: Streamlit serves sessions from several threads
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def create(self, trail: Optional[MergedTrail] = None, draft_id: Optional[str] = None,
+               bases: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """Store a new draft (empty by default) and return its id; an existing id is left as it is."""
+        trail = trail or MergedTrail()
+        draft_id = draft_id or uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            cur = conn.execute(
+                f"INSERT OR IGNORE INTO drafts (id, created, updated, {', '.join(TRAIL_FIELDS)}) "
+                f"VALUES (?, ?, ?{', ?' * len(TRAIL_FIELDS)})",
+                (draft_id, now, now, *(getattr(trail, field) or "" for field in TRAIL_FIELDS)))
+            if cur.rowcount:
+                conn.executemany(
+                    f"INSERT INTO media (draft_id, key, position, {', '.join(MEDIA_FIELDS)}) "
+                    f"VALUES (?, ?, ?{', ?' * len(MEDIA_FIELDS)})",
+                    ((draft_id, item.get(MEDIA_KEY) or uuid.uuid4().hex, float(position),
+                      *(str(item.get(field) or "") for field in MEDIA_FIELDS))
+                     for position, item in enumerate(trail.media_list)))
+                conn.executemany("INSERT INTO bases (draft_id, lang, document) VALUES (?, ?, ?)",
+                                 ((draft_id, lang, json.dumps(document, ensure_ascii=False))
+                                  for lang, document in (bases or {}).items()))
+        return draft_id
+
+    def open_upload(self, documents: Dict[str, bytes]) -> str:
+        """Id of the draft for uploaded ``{lang: bytes}``, parsing them only the first time.
+
+        Raises InvalidDocument for a file that is not a JSON object or whose media is not a list of objects.
+        """
+        draft_id = upload_key(documents)
+        if not self.exists(draft_id):
+            parsed = parse_documents(documents)
+            self.create(merge_trail_documents(parsed.get("en"), parsed.get("he")), draft_id, parsed)
+        return draft_id
+
+    def exists(self, draft_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM drafts WHERE id = ?", (draft_id,)).fetchone() is not None
+
+    def load(self, draft_id: str) -> Optional[Draft]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(f"SELECT updated, {', '.join(TRAIL_FIELDS)} FROM drafts WHERE id = ?",
+                               (draft_id,)).fetchone()
+            if row is None:
+                return None
+            media = conn.execute(f"SELECT key, {', '.join(MEDIA_FIELDS)} FROM media "
+                                 "WHERE draft_id = ? ORDER BY position", (draft_id,)).fetchall()
+            bases = conn.execute("SELECT lang, document FROM bases WHERE draft_id = ?", (draft_id,)).fetchall()
+        trail = MergedTrail(**dict(zip(TRAIL_FIELDS, row[1:])))
+        trail.media_list = MediaList({MEDIA_KEY: key, **dict(zip(MEDIA_FIELDS, values))} for key, *values in media)
+        return Draft(draft_id, trail, row[0], {lang: json.loads(document) for lang, document in bases})
+
+    def recent(self, limit: int = 20) -> List[DraftInfo]:
+        """Most recently edited drafts first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT d.id, d.trail_id, CASE WHEN d.name_en != '' THEN d.name_en ELSE d.name_he END, "
+                "(SELECT COUNT(*) FROM media m WHERE m.draft_id = d.id), d.updated "
+                "FROM drafts d ORDER BY d.updated DESC LIMIT ?", (limit,)).fetchall()
+        return [DraftInfo(*row) for row in rows]
+
+    def _touch(self, conn: sqlite3.Connection, draft_id: str) -> None:
+        # A new draft is only stored on its first edit, so opening the editor writes nothing
+        now = time.time()
+        conn.execute("INSERT INTO drafts (id, created, updated) VALUES (?, ?, ?) "
+                     "ON CONFLICT(id) DO UPDATE SET updated = excluded.updated", (draft_id, now, now))
+
+    def save_field(self, draft_id: str, field: str, value: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            self._touch(conn, draft_id)
+            conn.execute(f"UPDATE drafts SET {_check(field, TRAIL_FIELDS)} = ? WHERE id = ?", (value or "", draft_id))
+
+    def save_media_field(self, draft_id: str, key: str, field: str, value: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            self._touch(conn, draft_id)
+            conn.execute(f"UPDATE media SET {_check(field, MEDIA_FIELDS)} = ? WHERE draft_id = ? AND key = ?",
+                         (value or "", draft_id, key))
+
+    def _renumber(self, conn: sqlite3.Connection, draft_id: str) -> None:
+        keys = [row[0] for row in conn.execute("SELECT key FROM media WHERE draft_id = ? ORDER BY position",
+                                               (draft_id,))]
+        conn.executemany("UPDATE media SET position = ? WHERE draft_id = ? AND key = ?",
+                         ((float(i), draft_id, key) for i, key in enumerate(keys)))
+
+    def _position(self, conn: sqlite3.Connection, draft_id: str, key: str, after: Optional[str]) -> Optional[float]:
+        """Position right after the item keyed ``after`` (first for None), ignoring ``key`` itself.
+
+        None when the neighbours are too close to fit another position between them.
+        """
+        before = None
+        if after is not None:
+            row = conn.execute("SELECT position FROM media WHERE draft_id = ? AND key = ?",
+                               (draft_id, after)).fetchone()
+            if row is None:
+                raise KeyError(after)
+            before = row[0]
+        lower = -math.inf if before is None else before
+        (following,) = conn.execute("SELECT MIN(position) FROM media WHERE draft_id = ? AND key != ? AND position > ?",
+                                    (draft_id, key, lower)).fetchone()
+        if before is None and following is None:
+            return 0.0
+        if before is None:
+            return following - 1.0
+        if following is None:
+            return before + 1.0
+        if following - before < _MIN_GAP:
+            return None
+        return (before + following) / 2
+
+    def _place(self, conn: sqlite3.Connection, draft_id: str, key: str, after: Optional[str]) -> float:
+        position = self._position(conn, draft_id, key, after)
+        if position is None:
+            self._renumber(conn, draft_id)
+            position = self._position(conn, draft_id, key, after)
+        return position
+
+    def insert_media(self, draft_id: str, item: Dict[str, str], after: Optional[str] = None) -> None:
+        """Insert a media item right after the item keyed ``after`` (first for None)."""
+        with closing(self._connect()) as conn, conn:
+            self._touch(conn, draft_id)
+            position = self._place(conn, draft_id, item[MEDIA_KEY], after)
+            conn.execute(f"INSERT OR REPLACE INTO media (draft_id, key, position, {', '.join(MEDIA_FIELDS)}) "
+                         f"VALUES (?, ?, ?{', ?' * len(MEDIA_FIELDS)})",
+                         (draft_id, item[MEDIA_KEY], position, *(str(item.get(f) or "") for f in MEDIA_FIELDS)))
+
+    def move_media(self, draft_id: str, key: str, after: Optional[str] = None) -> None:
+        """Move the media item keyed ``key`` right after the item keyed ``after`` (first for None)."""
+        with closing(self._connect()) as conn, conn:
+            self._touch(conn, draft_id)
+            conn.execute("UPDATE media SET position = ? WHERE draft_id = ? AND key = ?",
+                         (self._place(conn, draft_id, key, after), draft_id, key))
+
+    def remove_media(self, draft_id: str, key: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            self._touch(conn, draft_id)
+            conn.execute("DELETE FROM media WHERE draft_id = ? AND key = ?", (draft_id, key))
+
+    def delete(self, draft_id: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM drafts WHERE id = ?", (draft_id,))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="List and export editor drafts.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite draft store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing = sub.add_parser("list", help="Most recently edited drafts")
+    listing.add_argument("--limit", type=int, default=20)
+    export = sub.add_parser("export", help="Write a draft as English and Hebrew trail JSON files, "
+                                           "with its changes to the uploaded files as JSON Patches")
+    export.add_argument("draft_id")
+    export.add_argument("-o", "--output", default=".", help="Directory to write to")
+    args = parser.parse_args(argv)
+
+    store = DraftStore(args.db)
+    if args.command == "list":
+        for info in store.recent(args.limit):
+            stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.updated))
+            print(f"{info.id}  {stamp}  {info.trail_id or '-'}  {info.name}  ({info.media} media)")
+        return 0
+
+    draft = store.load(args.draft_id)
+    if draft is None:
+        print(f"No draft {args.draft_id}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    for lang, document in build_trail_documents(draft.trail).items():
+        outputs = {"json": document}
+        if lang in draft.bases:
+            outputs["patch.json"] = diff_documents(draft.bases[lang], document)
+        for ext, data in outputs.items():
+            path = os.path.join(args.output, f"{draft.trail.trail_id or draft.id}_{lang}.{ext}")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            print(path, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
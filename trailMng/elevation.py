@@ -0,0 +1,270 @@
+"""
+Elevation analytics over distance ranges.
+
+An ElevationProfile is built once per track. It fills missing elevations and
+smooths out GPS noise with a hysteresis threshold, then keeps prefix sums of
+ascent, descent and elapsed time, and the grade bin of every step. Only ascent and
+descent depend on the threshold: another threshold reuses everything else, and
+ProfileCache keeps each threshold's prefix sums so a slider never smooths twice. Any distance
+range, such as a slider over the profile or a one-kilometre split, is then answered
+with a binary search and a subtraction per boundary, without rescanning the points.
+Distance per grade bin is summed every GRADE_BLOCK points only, which keeps the
+profile at about 42 bytes per point; a query adds up at most one block of steps.
+Boundaries that fall between two points are interpolated inside that step, so
+consecutive ranges add up exactly to the whole. The plotted profile of any range is
+downsampled the same way, so a chart never receives more points than it can show.
+"""
+import copy
+from dataclasses import dataclass
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from trailMng.cache import LRUCache
+from trailMng.simplify import lttb
+from trailMng.track import Track, cumulative_distance
+
+DEFAULT_CACHE_MB = 64
+# Elevation changes smaller than this are treated as GPS/barometer noise
+DEFAULT_THRESHOLD_M = 3.0
+# Grades are measured over this much distance, so single noisy points do not dominate
+GRADE_WINDOW_M = 50.0
+# Bin edges of the grade histogram, in percent
+GRADE_EDGES = (-math.inf, -20.0, -10.0, -5.0, -2.0, 2.0, 5.0, 10.0, 20.0, math.inf)
+# Per-bin distance totals are kept at every GRADE_BLOCK-th point
+GRADE_BLOCK = 64
+
+
+def grade_labels(edges: Tuple[float, ...] = GRADE_EDGES) -> List[str]:
+    """Readable labels of the grade bins, e.g. ``"5–10%"``."""
+    labels = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        if math.isinf(low):
+            labels.append(f"< {high:g}%")
+        elif math.isinf(high):
+            labels.append(f"> {low:g}%")
+        else:
+            labels.append(f"{low:g}–{high:g}%")
+    return labels
+
+
+def fill_missing(values: np.ndarray, dist: np.ndarray) -> np.ndarray:
+    """Linearly interpolate NaNs over distance; leading and trailing NaNs take the nearest value.
+
+    Returns the input unchanged when it has no NaN, and all NaN when it has no value at all.
+    """
+    missing = np.isnan(values)
+    if not missing.any() or missing.all():
+        return values
+    filled = values.copy()
+    filled[missing] = np.interp(dist[missing], dist[~missing], values[~missing])
+    return filled
+
+
+def hysteresis(values: np.ndarray, threshold: float) -> np.ndarray:
+    """Hold each value until the signal has moved at least ``threshold`` away from it.
+
+    Each hold depends on the one before it, so this is a Python loop over the points
+    (about 130 ms per million). It runs once per threshold: ElevationProfile.with_threshold
+    and ProfileCache memoize the result rather than smoothing again on every query.
+    """
+    if threshold <= 0 or len(values) == 0:
+        return values
+    changes = [0]
+    ref = values[0]
+    for i, value in enumerate(values.tolist()):
+        if abs(value - ref) >= threshold:
+            ref = value
+            changes.append(i)
+    held = np.zeros(len(values), dtype=np.int64)
+    held[changes] = 1
+    return values[np.asarray(changes)[np.cumsum(held) - 1]]
+
+
+def _prefix(steps: np.ndarray) -> np.ndarray:
+    """Prefix sums aligned with the points: ``out[i]`` is the total of steps 1..i."""
+    out = np.zeros((len(steps) + 1,) + steps.shape[1:], dtype=np.float64)
+    np.cumsum(steps, axis=0, out=out[1:])
+    return out
+
+
+@dataclass
+class RangeSummary:
+    start_m: float
+    end_m: float
+    ascent_m: float
+    descent_m: float
+    seconds: Optional[float]  # None without timestamps
+
+    @property
+    def distance_m(self) -> float:
+        return self.end_m - self.start_m
+
+    @property
+    def pace_s_per_km(self) -> Optional[float]:
+        if self.seconds is None or self.distance_m <= 0:
+            return None
+        return self.seconds / (self.distance_m / 1000)
+
+
+class ElevationProfile:
+    """Prefix arrays over a track for distance-range queries in O(log n) (a binary search per boundary)."""
+
+    def __init__(self, track: Track, dist: Optional[np.ndarray] = None,
+                 threshold_m: float = DEFAULT_THRESHOLD_M, grade_edges: Tuple[float, ...] = GRADE_EDGES):
+        if len(track) == 0:
+            raise ValueError("Track has no points")
+        self.dist = cumulative_distance(track.lat, track.lon) if dist is None else dist
+        self.grade_edges = grade_edges
+        self.has_elevation = track.has_elevation
+        self.has_time = track.has_time
+
+        self.ele = fill_missing(track.ele, self.dist)
+        self._smooth(threshold_m)
+
+        # The grade bin of every step, and the distance per bin up to every GRADE_BLOCK-th point
+        step = np.diff(self.dist)
+        bins = len(grade_edges) - 1
+        self.grade_bins = np.zeros(len(step), dtype=np.uint8)
+        if self.has_elevation and len(step):
+            half = GRADE_WINDOW_M / 2
+            mid = (self.dist[:-1] + self.dist[1:]) / 2
+            ahead = np.minimum(mid + half, self.dist[-1])
+            behind = np.maximum(mid - half, 0.0)
+            span = np.maximum(ahead - behind, 1e-9)
+            grade = 100 * (np.interp(ahead, self.dist, self.ele) - np.interp(behind, self.dist, self.ele)) / span
+            self.grade_bins[:] = np.clip(np.searchsorted(grade_edges, grade, side="right") - 1, 0, bins - 1)
+        else:
+            step = np.zeros_like(step)
+        blocks = -(-len(step) // GRADE_BLOCK)
+        totals = np.bincount(np.arange(len(step)) // GRADE_BLOCK * bins + self.grade_bins, weights=step,
+                             minlength=blocks * bins).reshape(blocks, bins)
+        self.grade_blocks = _prefix(totals)
+
+        self.time = fill_missing(track.time, self.dist) if self.has_time else None
+
+    def _smooth(self, threshold_m: float):
+        """Ascent and descent prefix sums of the elevations smoothed with ``threshold_m``."""
+        self.threshold_m = threshold_m
+        if self.has_elevation:
+            climb = np.diff(hysteresis(self.ele, threshold_m))
+        else:
+            climb = np.zeros(len(self.dist) - 1)
+        self.ascent = _prefix(np.maximum(climb, 0))
+        self.descent = _prefix(np.maximum(-climb, 0))
+
+    def with_threshold(self, threshold_m: float) -> "ElevationProfile":
+        """The same profile smoothed with another threshold.
+
+        Distances, elevations, grades and times are shared with this profile; only the
+        ascent and descent prefix sums are computed again.
+        """
+        if threshold_m == self.threshold_m:
+            return self
+        profile = copy.copy(self)
+        profile._smooth(threshold_m)
+        return profile
+
+    @property
+    def total_m(self) -> float:
+        return float(self.dist[-1])
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.dist, self.ele, self.grade_bins, self.grade_blocks)
+        shared = sum(a.nbytes for a in arrays) + (self.time.nbytes if self.time is not None else 0)
+        return shared + self.threshold_nbytes
+
+    @property
+    def threshold_nbytes(self) -> int:
+        """The part of ``nbytes`` that belongs to the threshold and is not shared by with_threshold."""
+        return self.ascent.nbytes + self.descent.nbytes
+
+    def _locate(self, distance_m: float) -> Tuple[int, float]:
+        """The step ``k`` that contains a distance, and how far into it the distance lies (0 to 1)."""
+        k = int(np.searchsorted(self.dist, distance_m, side="right")) - 1
+        k = min(max(k, 0), len(self.dist) - 2)
+        step = self.dist[k + 1] - self.dist[k]
+        return k, min(max((distance_m - self.dist[k]) / step, 0.0), 1.0) if step > 0 else 1.0
+
+    def _at(self, prefix: np.ndarray, distance_m: float) -> np.ndarray:
+        """A prefix array read at an exact distance, interpolating inside the step that contains it."""
+        if len(self.dist) < 2:
+            return prefix[0]
+        k, frac = self._locate(distance_m)
+        return prefix[k] + (prefix[k + 1] - prefix[k]) * frac
+
+    def _grades_at(self, distance_m: float) -> np.ndarray:
+        """Distance per grade bin up to an exact distance."""
+        bins = self.grade_blocks.shape[1]
+        if len(self.dist) < 2 or not self.has_elevation:
+            return np.zeros(bins)
+        k, frac = self._locate(distance_m)
+        # The total at the start of the block that holds step k, plus the steps since then
+        block = k // GRADE_BLOCK
+        first = block * GRADE_BLOCK
+        step = np.diff(self.dist[first:k + 2])
+        step[-1] *= frac
+        return self.grade_blocks[block] + np.bincount(self.grade_bins[first:k + 1], weights=step, minlength=bins)
+
+    def summary(self, start_m: float = 0.0, end_m: float = math.inf) -> RangeSummary:
+        """Ascent, descent and elapsed time between two distances along the track."""
+        end_m = min(end_m, self.total_m)
+        start_m = max(0.0, min(start_m, end_m))
+        seconds = None
+        if self.time is not None:
+            seconds = float(self._at(self.time, end_m) - self._at(self.time, start_m))
+        return RangeSummary(start_m, end_m,
+                            float(self._at(self.ascent, end_m) - self._at(self.ascent, start_m)),
+                            float(self._at(self.descent, end_m) - self._at(self.descent, start_m)),
+                            seconds)
+
+    def grade_histogram(self, start_m: float = 0.0, end_m: float = math.inf) -> np.ndarray:
+        """Metres travelled in each grade bin between two distances."""
+        end_m = min(end_m, self.total_m)
+        start_m = max(0.0, min(start_m, end_m))
+        return self._grades_at(end_m) - self._grades_at(start_m)
+
+    def downsample(self, points: int, start_m: float = 0.0, end_m: float = math.inf) -> np.ndarray:
+        """Indices of at most ``points`` elevation points between two distances, picked by LTTB.
+
+        The points just outside the range are included, so the line reaches both edges.
+        """
+        lo = max(int(np.searchsorted(self.dist, start_m, side="right")) - 1, 0)
+        hi = min(int(np.searchsorted(self.dist, end_m, side="left")) + 1, len(self.dist))
+        return lo + lttb(self.dist[lo:hi], self.ele[lo:hi], points)
+
+    def splits(self, length_m: float = 1000.0) -> List[RangeSummary]:
+        """Consecutive ``length_m`` splits; the last one is usually shorter."""
+        bounds = np.arange(0.0, self.total_m, length_m).tolist() + [self.total_m]
+        return [self.summary(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class ProfileCache:
+    """Bounded LRU cache of elevation profiles keyed by track hash and threshold.
+
+    The first profile of a track is kept under the track hash and answers its own
+    threshold. Every other threshold is built from it, kept under (hash, threshold) and
+    charged only for its own prefix sums, so moving the threshold slider back and forth
+    reuses earlier results.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MB * 2**20):
+        self.memory = LRUCache(max_bytes)
+
+    def get_or_build(self, track_key: str, track: Track, dist: Optional[np.ndarray] = None,
+                     threshold_m: float = DEFAULT_THRESHOLD_M) -> ElevationProfile:
+        key = (track_key, threshold_m)
+        base = self.memory.get(track_key)
+        if base is None:
+            # Any threshold of the track can serve as the base of the others
+            base = self.memory.get(key) or ElevationProfile(track, dist, threshold_m)
+            self.memory.put(track_key, base, base.nbytes)
+        if threshold_m == base.threshold_m:
+            return base
+        profile = self.memory.get(key)
+        if profile is None:
+            profile = base.with_threshold(threshold_m)
+            self.memory.put(key, profile, profile.threshold_nbytes)
+        return profile
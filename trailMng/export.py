@@ -0,0 +1,310 @@
+"""
+Distribution artifacts for the mobile clients.
+
+Every trail is exported per language as minified UTF-8 JSON, and its track (the
+``<trailId>.gpx`` or ``.trk`` file, as in ``trailMng.spatial``) as simplified GeoJSON
+and Google encoded polylines at a few zoom levels, so a client fetches only the detail
+its map shows::
+
+    python -m trailMng.export trailjsons --gpx gpx -o dist
+    python -m trailMng.export trailjsons --gpx gpx -o dist --prune   # also delete stale files
+
+File names carry a hash of their content (``en.3f2a9c01b7de.json``), so they can be
+served with a long cache lifetime; ``manifest.json`` maps every trail to its current
+files and is the only file that changes name-for-name. Next to every file that
+compresses, a gzip (``.gz``) and, when the ``brotli`` module is installed, a brotli
+(``.br``) variant is written for servers that serve precompressed files. Output is
+deterministic, so an unchanged trail produces the same names and is not rewritten.
+"""
+import argparse
+from dataclasses import dataclass, field
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from trailMng.catalog import compile_pairs, discover_pairs
+from trailMng.gpx_stream import load_track
+from trailMng.simplify import DEFAULT_TOLERANCE_PX
+from trailMng.spatial import simplify_track
+from trailMng.store import SUFFIX
+from trailMng.track import Track
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Web map zoom levels the tracks are simplified for: region, trail and close-up views
+ZOOM_LEVELS = (10, 13, 16)
+# Metres per pixel at zoom 0 on the equator (256-pixel Web Mercator tiles)
+_ZOOM0_M = 2 * math.pi * 6_378_137 / 256
+HASH_CHARS = 12
+# GeoJSON coordinates keep 6 decimals (about 10 cm), encoded polylines 5 (about 1 m)
+GEOJSON_DECIMALS = 6
+POLYLINE_PRECISION = 1e5
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+
+def minified(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def content_name(stem: str, data: bytes, ext: str) -> str:
+    """``stem.<hash>.ext``, the hash covering ``data``."""
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_CHARS]}.{ext}"
+
+
+def _brotli() -> Optional[Callable[[bytes], bytes]]:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return lambda data: brotli.compress(data, quality=11)
+
+
+def compressors() -> Dict[str, Tuple[str, Callable[[bytes], bytes]]]:
+    """``{encoding: (file suffix, compress)}`` of the encodings available here."""
+    # mtime=0 keeps the gzip bytes identical from run to run
+    available = {"gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))}
+    br = _brotli()
+    if br is not None:
+        available["br"] = (".br", br)
+    return available
+
+
+def _write_file(path: str, data: bytes) -> None:
+    # Write under a temporary name so a server never sends a partial file
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def tolerance_m(zoom: int, lat: float, tolerance_px: float = DEFAULT_TOLERANCE_PX) -> float:
+    """Ground distance of ``tolerance_px`` screen pixels at ``zoom`` and latitude ``lat``."""
+    return _ZOOM0_M * math.cos(math.radians(lat)) / 2 ** zoom * tolerance_px
+
+
+def _segments(track: Track) -> List[Tuple[int, int]]:
+    bounds = [int(b) for b in track.segment_offsets if b < len(track)] + [len(track)]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def encode_polyline(lat: np.ndarray, lon: np.ndarray) -> str:
+    """Google encoded polyline of one line, vectorized over the points."""
+    fixed = np.rint(np.column_stack((lat, lon)) * POLYLINE_PRECISION).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    # Sign into the lowest bit, then 5-bit chunks, lowest first, 0x20 on all but the last
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).astype(np.uint64)
+    shifts = np.arange(7, dtype=np.uint64) * np.uint64(5)
+    chunks = (values[:, None] >> shifts) & np.uint64(0x1F)
+    count = 1 + np.count_nonzero(values[:, None] >> shifts[1:], axis=1)
+    position = np.arange(len(shifts))
+    chunks |= np.where(position < (count - 1)[:, None], np.uint64(0x20), np.uint64(0))
+    chunks += np.uint64(63)
+    return chunks[position < count[:, None]].astype(np.uint8).tobytes().decode("ascii")
+
+
+def track_geojson(track: Track, properties: Dict[str, Any]) -> Dict[str, Any]:
+    """A GeoJSON Feature of the track's line: a LineString, or a MultiLineString for several segments."""
+    lines = [np.round(np.column_stack((track.lon[start:end], track.lat[start:end])), GEOJSON_DECIMALS).tolist()
+             for start, end in _segments(track)]
+    geometry = ({"type": "LineString", "coordinates": lines[0]} if len(lines) == 1
+                else {"type": "MultiLineString", "coordinates": lines})
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+def track_levels(track: Track, zooms=ZOOM_LEVELS) -> Dict[int, Tuple[Track, float]]:
+    """``{zoom: (simplified track, tolerance in metres)}``."""
+    lat0 = float(np.nanmean(track.lat)) if len(track) else 0.0
+    levels = {}
+    for zoom in zooms:
+        tolerance = tolerance_m(zoom, lat0)
+        levels[zoom] = (simplify_track(track, tolerance), tolerance)
+    return levels
+
+
+@dataclass
+class ExportReport:
+    trails: int = 0
+    tracks: int = 0
+    written: int = 0
+    unchanged: int = 0
+    pruned: int = 0
+    # Total bytes per encoding ("identity" for the uncompressed files)
+    sizes: Dict[str, int] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        sizes = "  ".join(f"{encoding} {size:,} B" for encoding, size in self.sizes.items())
+        stages = "  ".join(f"{stage} {ms:.1f} ms" for stage, ms in self.timings.items())
+        return (f"{self.trails} trails, {self.tracks} tracks, {self.written} files written, "
+                f"{self.unchanged} unchanged, {self.pruned} pruned  ({sizes})  ({stages})")
+
+
+class Exporter:
+    """Writes the artifacts of a trail JSON directory (and its tracks) into ``output_dir``."""
+
+    def __init__(self, output_dir: str, zooms=ZOOM_LEVELS):
+        self.output_dir = os.path.abspath(output_dir)
+        self.zooms = tuple(zooms)
+        self.encoders = compressors()
+        self.report = ExportReport()
+        self._files: set = set()
+
+    def write(self, relative_dir: str, stem: str, ext: str, data: bytes) -> Dict[str, Any]:
+        """Write ``data`` under a content-hashed name, with its compressed variants; returns its manifest entry."""
+        path = f"{relative_dir}/{content_name(stem, data, ext)}"
+        entry = {"path": path, "bytes": len(data), "encodings": {}}
+        self._put(path, lambda: data, "identity")
+        for encoding, (suffix, compress) in self.encoders.items():
+            size = self._put(path + suffix, lambda: compress(data), encoding, limit=len(data))
+            if size is not None:
+                entry["encodings"][encoding] = size
+        return entry
+
+    def _put(self, relative: str, make: Callable[[], bytes], encoding: str,
+             limit: Optional[int] = None) -> Optional[int]:
+        """Write ``make()`` to ``relative`` and return its size; an existing file is kept as it is.
+
+        Names are content hashes, so an existing file already holds the same bytes. Nothing
+        is written, and None is returned, when the data is not smaller than ``limit``.
+        """
+        target = os.path.join(self.output_dir, relative)
+        if os.path.exists(target):
+            size = os.path.getsize(target)
+            self.report.unchanged += 1
+        else:
+            data = make()
+            size = len(data)
+            if limit is not None and size >= limit:
+                return None
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write_file(target, data)
+            self.report.written += 1
+        self._files.add(relative)
+        self.report.sizes[encoding] = self.report.sizes.get(encoding, 0) + size
+        return size
+
+    def export_track(self, trail_dir: str, track: Track) -> Dict[str, Any]:
+        levels = {}
+        for zoom, (simplified, tolerance) in track_levels(track, self.zooms).items():
+            properties = {"zoom": zoom, "tolerance_m": round(tolerance, 2), "points": len(simplified)}
+            polylines = "\n".join(encode_polyline(simplified.lat[start:end], simplified.lon[start:end])
+                                  for start, end in _segments(simplified))
+            levels[str(zoom)] = {
+                **properties,
+                "geojson": self.write(trail_dir, f"z{zoom}", "geojson", minified(track_geojson(simplified, properties))),
+                # One encoded line per track segment
+                "polyline": self.write(trail_dir, f"z{zoom}", "polyline", polylines.encode("ascii")),
+            }
+        return {"points": len(track), "zooms": levels}
+
+    def export(self, directory: str, gpx_dir: Optional[str] = None, jobs: int = os.cpu_count() or 1,
+               prune: bool = False) -> Dict[str, Any]:
+        """Export every trail of ``directory``; returns the manifest, which is written last."""
+        report = self.report
+
+        start = time.perf_counter()
+        pairs, _ = discover_pairs(directory)
+        results = compile_pairs(pairs, jobs)
+        report.timings["merge"] = (time.perf_counter() - start) * 1000
+
+        tracks = {}
+        if gpx_dir and os.path.isdir(gpx_dir):
+            for filename in sorted(os.listdir(gpx_dir)):
+                stem, ext = os.path.splitext(filename)
+                if ext.lower() in (".gpx", SUFFIX):
+                    # A converted track file is preferred over the GPX it came from
+                    if stem not in tracks or ext.lower() == SUFFIX:
+                        tracks[stem] = os.path.join(gpx_dir, filename)
+
+        trails: Dict[str, Any] = {}
+        track_ms = 0.0
+        start = time.perf_counter()
+        for pair, (entry, _) in zip(pairs, results):
+            trail_id = entry["trailId"] if entry else ""
+            if not trail_id:
+                report.skipped.append(f"{pair.key}: no trailId")
+                continue
+            if trail_id in trails:
+                report.skipped.append(f"{pair.key}: trailId {trail_id!r} already exported")
+                continue
+            trail_dir = f"trails/{_UNSAFE.sub('_', trail_id)}"
+            trails[trail_id] = {lang: self.write(trail_dir, lang, "json", minified(entry[lang]))
+                                for lang in entry["files"]}
+            if trail_id in tracks:
+                track_start = time.perf_counter()
+                try:
+                    track = load_track(tracks[trail_id])
+                except Exception as e:
+                    report.skipped.append(f"{tracks[trail_id]}: {e}")
+                else:
+                    if len(track):
+                        trails[trail_id]["track"] = self.export_track(trail_dir, track)
+                        report.tracks += 1
+                track_ms += (time.perf_counter() - track_start) * 1000
+        report.trails = len(trails)
+        report.timings["tracks"] = track_ms
+        report.timings["documents"] = (time.perf_counter() - start) * 1000 - track_ms
+
+        start = time.perf_counter()
+        manifest = {"version": MANIFEST_VERSION, "zooms": list(self.zooms), "trails": trails}
+        data = minified(manifest)
+        manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        os.makedirs(self.output_dir, exist_ok=True)
+        # The manifest keeps its name, so it and its variants are always rewritten
+        _write_file(manifest_path, data)
+        for suffix, compress in self.encoders.values():
+            _write_file(manifest_path + suffix, compress(data))
+        if prune:
+            report.pruned = self._prune()
+        report.timings["manifest"] = (time.perf_counter() - start) * 1000
+        return manifest
+
+    def _prune(self) -> int:
+        """Delete hashed files that the new manifest no longer names."""
+        removed = 0
+        for root, _, files in os.walk(os.path.join(self.output_dir, "trails")):
+            for filename in files:
+                relative = os.path.relpath(os.path.join(root, filename), self.output_dir).replace(os.sep, "/")
+                if relative not in self._files:
+                    os.remove(os.path.join(root, filename))
+                    removed += 1
+        return removed
+
+
+def export_catalog(directory: str, output_dir: str, gpx_dir: Optional[str] = None,
+                   jobs: int = os.cpu_count() or 1, prune: bool = False) -> ExportReport:
+    exporter = Exporter(output_dir)
+    exporter.export(directory, gpx_dir, jobs, prune)
+    return exporter.report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export trails and tracks as distribution artifacts.")
+    parser.add_argument("directory", nargs="?", default="trailjsons", help="Directory of *_en/*_he JSON files")
+    parser.add_argument("--gpx", default="gpx", help="Directory of <trailId>.gpx / .trk tracks")
+    parser.add_argument("-o", "--output", default="dist", help="Where the artifacts and manifest are written")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--prune", action="store_true", help="Delete files the new manifest no longer names")
+    args = parser.parse_args(argv)
+
+    report = export_catalog(args.directory, args.output, args.gpx, args.jobs, args.prune)
+    for reason in report.skipped:
+        print(f"skipped {reason}", file=sys.stderr)
+    if "br" not in compressors():
+        print("brotli is not installed: no .br files", file=sys.stderr)
+    print(report.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
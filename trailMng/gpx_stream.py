@@ -0,0 +1,185 @@
+"""
+Streaming GPX reader.
+
+Track points are read with incremental XML parsing and handed out in fixed-size
+chunks, so memory stays proportional to the output arrays instead of to a full
+gpxpy object tree. Anything the reader does not understand falls back to gpxpy.
+"""
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Iterator, List, Union
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from trailMng.store import MAGIC, StoredTrack, load_stored_track
+from trailMng.track import Track, epoch_seconds, track_from_gpx
+
+CHUNK_SIZE = 16384
+
+Source = Union[str, BinaryIO]
+
+
+class UnsupportedGPX(ValueError):
+    """Raised when a file uses GPX features the streaming reader does not handle."""
+
+
+@dataclass
+class PointChunk:
+    """A run of consecutive track points.
+
+    ``segment_starts`` holds the absolute index of the first point of every
+    segment opened while this chunk was being read.
+    """
+    lat: np.ndarray
+    lon: np.ndarray
+    ele: np.ndarray
+    time: np.ndarray
+    segment_starts: List[int]
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_times(values: List[str]) -> np.ndarray:
+    """Convert ISO-8601 strings ('' for missing) to epoch seconds."""
+    out = np.full(len(values), np.nan)
+    present = [i for i, v in enumerate(values) if v]
+    if not present:
+        return out
+    texts = [values[i] for i in present]
+    try:
+        # Fast path: UTC ('Z') or naive timestamps, which is what GPS devices write
+        if all(t.endswith("Z") or not any(c in t[19:] for c in "+-") for t in texts):
+            stamps = np.array([t.rstrip("Z") for t in texts], dtype="datetime64[ms]")
+            out[present] = stamps.astype(np.int64) / 1000.0
+        else:
+            out[present] = [epoch_seconds(datetime.fromisoformat(t)) for t in texts]
+    except ValueError as e:
+        raise UnsupportedGPX(f"Unrecognised time value: {e}") from e
+    return out
+
+
+def iter_chunks(source: Source, chunk_size: int = CHUNK_SIZE) -> Iterator[PointChunk]:
+    """Yield the track points of a GPX file in chunks of at most ``chunk_size``.
+
+    Only ``trk/trkseg/trkpt`` with ``lat``/``lon`` attributes and ``ele``/``time``
+    children are read; every parsed point element is discarded immediately.
+    """
+    lat, lon, ele, times = [], [], [], []
+    segment_starts = []
+    count = 0
+    depth = 0
+    root = segment = None
+    in_track = False
+
+    def flush() -> PointChunk:
+        chunk = PointChunk(
+            lat=np.array(lat, dtype=np.float64),
+            lon=np.array(lon, dtype=np.float64),
+            ele=np.array(ele, dtype=np.float64),
+            time=_parse_times(times),
+            segment_starts=list(segment_starts),
+        )
+        for buf in (lat, lon, ele, times, segment_starts):
+            buf.clear()
+        return chunk
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if segment is not None:
+                continue
+            tag = _local(elem.tag)
+            if root is None:
+                if tag != "gpx":
+                    raise UnsupportedGPX(f"Root element is <{tag}>, not <gpx>")
+                root = elem
+            elif tag == "trk" and depth == 2:
+                in_track = True
+            elif tag == "trkseg" and in_track:
+                segment = elem
+                segment_starts.append(count)
+            continue
+
+        depth -= 1
+        tag = _local(elem.tag)
+        if tag == "trkpt" and segment is not None:
+            try:
+                lat.append(float(elem.attrib["lat"]))
+                lon.append(float(elem.attrib["lon"]))
+            except (KeyError, ValueError) as e:
+                raise UnsupportedGPX(f"Track point without valid coordinates: {e}") from e
+            point_ele = point_time = None
+            for child in elem:
+                name = _local(child.tag)
+                if name == "ele":
+                    point_ele = child.text
+                elif name == "time":
+                    point_time = child.text
+            try:
+                ele.append(float(point_ele) if point_ele and point_ele.strip() else np.nan)
+            except ValueError as e:
+                raise UnsupportedGPX(f"Unrecognised elevation value: {point_ele!r}") from e
+            times.append(point_time.strip() if point_time else "")
+            count += 1
+            # Drop the parsed point so the element tree never grows
+            segment.remove(elem)
+            if len(lat) >= chunk_size:
+                yield flush()
+        elif tag == "trkseg" and elem is segment:
+            segment = None
+        elif depth == 1:
+            # A finished top-level element (trk, rte, wpt, metadata): nothing keeps it
+            in_track = False
+            root.clear()
+
+    if lat or segment_starts:
+        yield flush()
+
+
+def read_track(source: Source, chunk_size: int = CHUNK_SIZE) -> Track:
+    """Stream a GPX file into a Track without building a gpxpy object tree."""
+    columns = [array("d") for _ in range(4)]
+    offsets = array("q")
+    for chunk in iter_chunks(source, chunk_size):
+        for column, values in zip(columns, (chunk.lat, chunk.lon, chunk.ele, chunk.time)):
+            column.frombytes(values.tobytes())
+        offsets.extend(chunk.segment_starts)
+    lat, lon, ele, time = (np.frombuffer(c, dtype=np.float64) for c in columns)
+    return Track(lat=lat, lon=lon, ele=ele, time=time,
+                 segment_offsets=np.frombuffer(offsets, dtype=np.int64))
+
+
+def _is_track_file(source: Source) -> bool:
+    if hasattr(source, "seek"):
+        head = source.read(len(MAGIC))
+        source.seek(0)
+        return head == MAGIC
+    with open(source, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_track(source: Source) -> Track:
+    """Read a GPX file into a Track, streaming when possible.
+
+    Falls back to a full ``gpxpy.parse`` when the file is not a plain GPX track
+    document the streaming reader understands. Track files written by
+    ``trailMng.store`` are recognised by their header and decoded instead.
+    """
+    if _is_track_file(source):
+        return load_stored_track(source) if isinstance(source, str) else StoredTrack(source.read()).to_track()
+    try:
+        return read_track(source)
+    except (UnsupportedGPX, ET.ParseError):
+        pass
+
+    import gpxpy
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+        return track_from_gpx(gpxpy.parse(source))
+    with open(source, encoding="utf-8") as f:
+        return track_from_gpx(gpxpy.parse(f))
@@ -0,0 +1,307 @@
+"""
+Media previews and link checks.
+
+Each media URL is fetched once, concurrently over a pooled HTTP session, and the
+result is kept on disk: metadata (reachable or not, status, content type, size and
+image dimensions) per URL, plus a downscaled JPEG thumbnail stored under the hash
+of its own bytes. The editor renders previews from this cache instead of handing
+full-resolution URLs to the browser on every rerun, and the same cache backs a bulk
+link check over the whole catalog::
+
+    python -m trailMng.media check trailjsons
+    python -m trailMng.media check trailjsons --thumbnails -j 32
+"""
+import argparse
+from dataclasses import asdict, dataclass
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from trailMng.catalog import discover_pairs, load_document
+
+DEFAULT_CACHE_DIR = "mediacache"
+DEFAULT_WORKERS = 16
+DEFAULT_TIMEOUT = 10.0
+# Cached results older than this are checked again
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+THUMBNAIL_SIZE = (320, 320)
+# Images larger than this are not downloaded for a thumbnail
+MAX_IMAGE_BYTES = 32 * 2**20
+
+
+@dataclass
+class MediaInfo:
+    url: str
+    ok: bool
+    status: Optional[int] = None
+    content_type: str = ""
+    size: Optional[int] = None  # bytes, from the headers or the download
+    width: Optional[int] = None
+    height: Optional[int] = None
+    thumbnail: Optional[str] = None  # SHA-256 of the thumbnail JPEG
+    error: str = ""
+    checked_at: float = 0.0
+
+    @property
+    def is_image(self) -> bool:
+        return self.content_type.startswith("image/")
+
+    def describe(self) -> str:
+        """Short human-readable summary, e.g. ``image/jpeg, 1920×1080, 412 KB``."""
+        if not self.ok:
+            return f"unreachable ({self.error or self.status})"
+        parts = [self.content_type or "unknown type"]
+        if self.width and self.height:
+            parts.append(f"{self.width}×{self.height}")
+        if self.size is not None:
+            parts.append(f"{self.size / 1024:,.0f} KB")
+        if self.error:
+            parts.append(self.error.lower())
+        return ", ".join(parts)
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _content_length(headers: Mapping[str, str]) -> Optional[int]:
+    # A ranged GET reports the full size after the slash: "bytes 0-0/12345"
+    total = headers.get("Content-Range", "").rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    length = headers.get("Content-Length", "")
+    return int(length) if length.isdigit() else None
+
+
+def _needs_fetch(info: Optional[MediaInfo], thumbnail: bool) -> bool:
+    """True when there is no result yet, or a thumbnail is wanted and was never made."""
+    if info is None:
+        return True
+    return thumbnail and info.ok and info.is_image and info.thumbnail is None and not info.error
+
+
+def make_thumbnail(data: bytes, size: Tuple[int, int] = THUMBNAIL_SIZE) -> Tuple[bytes, int, int]:
+    """``(JPEG thumbnail, original width, original height)`` of image bytes."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        image.draft("RGB", size)  # lets JPEG decode at a reduced scale
+        image.thumbnail(size)
+        buf = io.BytesIO()
+        image.convert("RGB").save(buf, format="JPEG", quality=80, optimize=True)
+    return buf.getvalue(), width, height
+
+
+class MediaPreviewService:
+    """Fetches media URLs once and serves their metadata and thumbnails from disk."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, workers: int = DEFAULT_WORKERS,
+                 timeout: float = DEFAULT_TIMEOUT, max_age: float = DEFAULT_MAX_AGE):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.max_age = max_age
+        self.fetches = 0
+        os.makedirs(os.path.join(cache_dir, "meta"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "thumbs"), exist_ok=True)
+        self._infos: Dict[str, MediaInfo] = {}
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        # One keep-alive connection per worker and host
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_env(cls) -> "MediaPreviewService":
+        """Build a service from ``TRAILMNG_MEDIA_CACHE_DIR`` (default ``mediacache``)."""
+        return cls(os.environ.get("TRAILMNG_MEDIA_CACHE_DIR") or DEFAULT_CACHE_DIR)
+
+    def _meta_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, "meta", f"{_url_key(url)}.json")
+
+    def _thumb_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "thumbs", f"{digest}.jpg")
+
+    def _write(self, path: str, data: bytes) -> None:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def cached(self, url: str) -> Optional[MediaInfo]:
+        """The stored result for ``url``, if there is one and it is not stale."""
+        with self._lock:
+            info = self._infos.get(url)
+        if info is None:
+            try:
+                with open(self._meta_path(url), encoding="utf-8") as f:
+                    info = MediaInfo(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                return None
+            with self._lock:
+                self._infos[url] = info
+        if time.time() - info.checked_at > self.max_age:
+            return None
+        return info
+
+    def _store(self, info: MediaInfo) -> None:
+        with self._lock:
+            self._infos[info.url] = info
+        self._write(self._meta_path(info.url), json.dumps(asdict(info)).encode("utf-8"))
+
+    def fetch(self, url: str, thumbnail: bool = True) -> MediaInfo:
+        """Check ``url`` over the network and store the result.
+
+        Images are downloaded (up to MAX_IMAGE_BYTES) when a thumbnail is wanted; everything
+        else, videos included, only costs a one-byte ranged request.
+        """
+        import requests
+
+        with self._lock:
+            self.fetches += 1
+        info = MediaInfo(url=url, ok=False, checked_at=time.time())
+        try:
+            response = self.session.get(url, headers={"Range": "bytes=0-0"}, timeout=self.timeout, stream=True)
+            with response:
+                info.status = response.status_code
+                info.ok = response.ok
+                info.content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+                info.size = _content_length(response.headers)
+            if not info.ok:
+                info.error = f"HTTP {info.status}"
+            elif thumbnail and info.is_image:
+                if (info.size or 0) > MAX_IMAGE_BYTES:
+                    info.error = "Too large for a thumbnail"
+                else:
+                    self._add_thumbnail(info)
+        except requests.RequestException as e:
+            info.error = type(e).__name__
+        self._store(info)
+        return info
+
+    def _add_thumbnail(self, info: MediaInfo) -> None:
+        from PIL import Image
+
+        # Streamed, so a server that sends no Content-Length cannot push more than the limit
+        with self.session.get(info.url, timeout=self.timeout, stream=True) as response:
+            if not response.ok:
+                info.ok, info.status, info.error = False, response.status_code, f"HTTP {response.status_code}"
+                return
+            chunks, size = [], 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    info.error = "Too large for a thumbnail"
+                    return
+                chunks.append(chunk)
+        data = b"".join(chunks)
+        info.size = len(data)
+        try:
+            data, info.width, info.height = make_thumbnail(data)
+        except Image.DecompressionBombError:
+            info.error = "Too large for a thumbnail"
+            return
+        except (OSError, ValueError):  # PIL.UnidentifiedImageError is an OSError
+            info.error = "Not a readable image"
+            return
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._thumb_path(digest)
+        if not os.path.exists(path):
+            self._write(path, data)
+        info.thumbnail = digest
+
+    def info(self, url: str, thumbnail: bool = True) -> MediaInfo:
+        """Cached result for ``url``, fetching it on a miss."""
+        info = self.cached(url)
+        if _needs_fetch(info, thumbnail):
+            info = self.fetch(url, thumbnail)
+        return info
+
+    def thumbnail_bytes(self, info: MediaInfo) -> Optional[bytes]:
+        if info.thumbnail is None:
+            return None
+        try:
+            with open(self._thumb_path(info.thumbnail), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def fetch_many(self, urls: Iterable[str], thumbnail: bool = True, refresh: bool = False,
+                   on_result: Optional[Callable[[MediaInfo], None]] = None) -> Dict[str, MediaInfo]:
+        """Results for many URLs; the ones not cached are fetched concurrently."""
+        results: Dict[str, MediaInfo] = {}
+        todo = []
+        for url in dict.fromkeys(u for u in urls if u):
+            info = None if refresh else self.cached(url)
+            if _needs_fetch(info, thumbnail):
+                todo.append(url)
+                continue
+            results[url] = info
+            if on_result is not None:
+                on_result(info)
+        if not todo:
+            return results
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(todo))) as pool:
+            futures = [pool.submit(self.fetch, url, thumbnail) for url in todo]
+            for future in as_completed(futures):
+                info = future.result()
+                results[info.url] = info
+                if on_result is not None:
+                    on_result(info)
+        return results
+
+
+def catalog_media(directory: str) -> Dict[str, List[str]]:
+    """``{url: [files that reference it]}`` for every media item in a trail directory."""
+    pairs, _ = discover_pairs(directory)
+    urls: Dict[str, List[str]] = {}
+    for pair in pairs:
+        for path in pair.files.values():
+            data, _ = load_document(path)
+            for media in (data or {}).get("media", []):
+                if isinstance(media, dict) and media.get("url"):
+                    urls.setdefault(media["url"], []).append(os.path.basename(path))
+    return urls
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Media previews and link checks for the trail catalog.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Preview cache directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("check", help="Check every media link in a trail directory")
+    check.add_argument("directory", nargs="?", default="trailjsons")
+    check.add_argument("-j", "--jobs", type=int, default=DEFAULT_WORKERS, help="Concurrent requests")
+    check.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-request timeout in seconds")
+    check.add_argument("--thumbnails", action="store_true", help="Also download images and cache thumbnails")
+    check.add_argument("--refresh", action="store_true", help="Ignore cached results")
+    check.add_argument("--strict", action="store_true", help="Exit with status 1 if any link is broken")
+    args = parser.parse_args(argv)
+
+    service = MediaPreviewService(args.cache_dir, workers=args.jobs, timeout=args.timeout)
+    start = time.perf_counter()
+    urls = catalog_media(args.directory)
+    results = service.fetch_many(urls, thumbnail=args.thumbnails, refresh=args.refresh)
+    elapsed = time.perf_counter() - start
+
+    broken = [info for info in results.values() if not info.ok]
+    for info in sorted(broken, key=lambda i: i.url):
+        print(f"BROKEN  {info.url}: {info.describe()} [{', '.join(urls[info.url])}]", file=sys.stderr)
+    print(f"{len(results)} links, {len(broken)} broken, {service.fetches} fetched "
+          f"in {elapsed:.1f} s", file=sys.stderr)
+    return 1 if args.strict and broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+JSON Patch (RFC 6902) between two versions of a trail document.
+
+The editor keeps the files a draft was opened from and, on export, shows the changes
+against them as a patch, so a review reads the edits instead of two whole documents::
+
+    python -m trailMng.patch old/horashim_he.json new/horashim_he.json > horashim_he.patch.json
+
+Media items are matched by ``id``, as in the EN/HE merge: an edited description is
+one ``replace`` of that field, and reordering moves only the items outside the longest
+run that kept its order, each of them once, instead of rewriting every item after the
+first change.
+"""
+import argparse
+import copy
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+from trailMng.trails import longest_increasing, media_identities
+
+Operation = Dict[str, Any]
+
+
+def pointer(*parts: Any) -> str:
+    """JSON Pointer (RFC 6901) of a path, with ``~`` and ``/`` escaped."""
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts)
+
+
+def _diff_fields(old: Dict[str, Any], new: Dict[str, Any], prefix: str, ops: List[Operation]) -> None:
+    for name in old:
+        if name not in new:
+            ops.append({"op": "remove", "path": prefix + pointer(name)})
+    for name, value in new.items():
+        if name not in old:
+            ops.append({"op": "add", "path": prefix + pointer(name), "value": value})
+        elif old[name] != value:
+            ops.append({"op": "replace", "path": prefix + pointer(name), "value": value})
+
+
+def _diff_media(old: List[Dict[str, Any]], new: List[Dict[str, Any]], ops: List[Operation]) -> None:
+    old_items = dict(zip(media_identities(old), old))
+    new_ids = media_identities(new)
+    target = {identity: j for j, identity in enumerate(new_ids)}
+
+    # Removals from the end, so the indices of the earlier items stay valid
+    current = list(old_items)
+    for i in reversed(range(len(current))):
+        if current[i] not in target:
+            ops.append({"op": "remove", "path": pointer("media", i)})
+            del current[i]
+
+    # Items that already follow the new order stay where they are. Every other item, in
+    # the new order, is added or moved once: right after the item that precedes it there
+    stable = {current[i] for i in longest_increasing([target[identity] for identity in current])}
+    for j, identity in enumerate(new_ids):
+        if identity in stable:
+            continue
+        position = current.index(new_ids[j - 1]) + 1 if j else 0
+        if identity not in old_items:
+            ops.append({"op": "add", "path": pointer("media", position), "value": new[j]})
+            current.insert(position, identity)
+            continue
+        i = current.index(identity)
+        if i != position:
+            current.pop(i)
+            position = current.index(new_ids[j - 1]) + 1 if j else 0
+            ops.append({"op": "move", "from": pointer("media", i), "path": pointer("media", position)})
+            current.insert(position, identity)
+
+    # The list now has the new order
+    for j, (identity, item) in enumerate(zip(new_ids, new)):
+        if identity in old_items:
+            _diff_fields(old_items[identity], item, pointer("media", j), ops)
+
+
+def diff_documents(old: Dict[str, Any], new: Dict[str, Any]) -> List[Operation]:
+    """Operations that turn trail document ``old`` into ``new``."""
+    ops: List[Operation] = []
+    media = isinstance(old.get("media"), list) and isinstance(new.get("media"), list)
+    _diff_fields({k: v for k, v in old.items() if not (media and k == "media")},
+                 {k: v for k, v in new.items() if not (media and k == "media")}, "", ops)
+    if media:
+        _diff_media(old["media"], new["media"], ops)
+    return ops
+
+
+def _parent(document: Any, path: str):
+    parts = [part.replace("~1", "/").replace("~0", "~") for part in path.split("/")[1:]]
+    if not parts:
+        raise ValueError("The whole document cannot be the target of an operation")
+    parent = document
+    for part in parts[:-1]:
+        parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+    return parent, parts[-1]
+
+
+def _index(parent: list, part: str, insert: bool = False) -> int:
+    if insert and part == "-":
+        return len(parent)
+    index = int(part)
+    if not 0 <= index <= len(parent) - (0 if insert else 1):
+        raise IndexError(f"Index {index} out of range")
+    return index
+
+
+def _take(document: Any, path: str) -> Any:
+    parent, part = _parent(document, path)
+    return parent.pop(_index(parent, part)) if isinstance(parent, list) else parent.pop(part)
+
+
+def _put(document: Any, path: str, value: Any) -> None:
+    parent, part = _parent(document, path)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, part, insert=True), value)
+    else:
+        parent[part] = value
+
+
+def apply_patch(document: Dict[str, Any], ops: List[Operation]) -> Dict[str, Any]:
+    """A copy of ``document`` with ``ops`` applied (add, remove, replace and move)."""
+    document = copy.deepcopy(document)
+    for op in ops:
+        kind = op["op"]
+        if kind == "add":
+            _put(document, op["path"], copy.deepcopy(op["value"]))
+        elif kind == "remove":
+            _take(document, op["path"])
+        elif kind == "replace":
+            _take(document, op["path"])
+            _put(document, op["path"], copy.deepcopy(op["value"]))
+        elif kind == "move":
+            _put(document, op["path"], _take(document, op["from"]))
+        else:
+            raise ValueError(f"Unsupported operation {kind!r}")
+    return document
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="JSON Patch between two versions of a trail JSON file.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+
+    documents = []
+    for path in (args.old, args.new):
+        with open(path, encoding="utf-8") as f:
+            documents.append(json.load(f))
+    ops = diff_documents(*documents)
+    json.dump(ops, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    print(f"{len(ops)} operations", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Timing spans for the admin apps.
+
+A Profiler collects the wall time of named stages during one Streamlit rerun, plus a
+few counters (cache hits and the like) and the process's peak memory. Reports are
+appended to a JSONL log, one line per rerun, which this module can aggregate into
+latency percentiles::
+
+    python -m trailMng.profiling profile.jsonl
+
+When the profiler is disabled, ``span()`` returns a shared no-op context manager,
+so instrumented code pays one attribute check per stage.
+"""
+import argparse
+from contextlib import nullcontext
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_LOG = "profile.jsonl"
+PERCENTILES = (50, 90, 99)
+
+_NULL_SPAN = nullcontext()
+_log_lock = threading.Lock()
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident set size of this process, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.add(self.name, (time.perf_counter() - self.start) * 1000)
+
+
+class Profiler:
+    """Stage timings and counters of one rerun."""
+
+    def __init__(self, enabled: bool = False, log_path: Optional[str] = None, session: str = ""):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.session = session
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, Any] = {}
+
+    def span(self, name: str):
+        """Context manager timing a stage; repeated spans of one name add up."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name: str, ms: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def count(self, name: str, value: Any) -> None:
+        if self.enabled:
+            self.counters[name] = value
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "time": self.started,
+            "session": self.session,
+            "total_ms": (time.perf_counter() - self._start) * 1000,
+            "spans": self.spans,
+            "peak_mb": peak_memory_mb(),
+            "counters": self.counters,
+        }
+
+    def write(self) -> Optional[Dict[str, Any]]:
+        """Append this rerun's report to the log; returns the report, or None when disabled."""
+        if not self.enabled:
+            return None
+        report = self.report()
+        if self.log_path:
+            line = json.dumps(report, ensure_ascii=False) + "\n"
+            with _log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+        return report
+
+
+def aggregate(lines: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """``{stage: {count, p50, p90, p99, max}}`` in ms over many reports; ``total`` is the whole rerun."""
+    import numpy as np
+
+    samples: Dict[str, List[float]] = {}
+    for report in lines:
+        samples.setdefault("total", []).append(report["total_ms"])
+        for name, ms in report["spans"].items():
+            samples.setdefault(name, []).append(ms)
+    result = {}
+    for name, values in samples.items():
+        values = np.asarray(values)
+        row = {"count": len(values)}
+        row.update({f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES})
+        row["max"] = float(values.max())
+        result[name] = row
+    return result
+
+
+def read_log(path: str) -> List[Dict[str, Any]]:
+    reports = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                reports.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+    return reports
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Latency percentiles from an admin app profile log.")
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG, help="JSONL log written by the apps")
+    parser.add_argument("--session", help="Only reports of this session")
+    args = parser.parse_args(argv)
+
+    reports = read_log(args.log)
+    if args.session:
+        reports = [r for r in reports if r.get("session") == args.session]
+    if not reports:
+        print("No reports.", file=sys.stderr)
+        return 1
+
+    sessions = len({r.get("session") for r in reports})
+    print(f"{len(reports)} reruns from {sessions} sessions")
+    print(f"{'stage':32} {'count':>7} " + " ".join(f"{'p' + str(p):>10}" for p in PERCENTILES) + f" {'max':>10}")
+    for name, row in sorted(aggregate(reports).items(), key=lambda item: -item[1]["p50"]):
+        print(f"{name:32} {row['count']:7d} " + " ".join(f"{row['p' + str(p)]:10.1f}" for p in PERCENTILES)
+              + f" {row['max']:10.1f}")
+    peaks = [r["peak_mb"] for r in reports if r.get("peak_mb") is not None]
+    if peaks:
+        print(f"peak memory: {max(peaks):.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Rendered GPX figures.
+
+Figures are drawn with matplotlib's object API (no pyplot state, so nothing is left
+registered after a render) and returned as encoded PNG/SVG bytes. FigureCache keeps
+those bytes keyed by track hash and render parameters, so an unchanged GPX tab only
+has to send an image on a rerun.
+
+The elevation profile is not rasterized: profile_chart builds a Vega-Lite chart (via
+Altair) of a series already cut to about one point per pixel, which the browser draws
+and which can be zoomed by asking for a range at full resolution.
+"""
+from dataclasses import dataclass
+import io
+from typing import Callable, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from trailMng.cache import LRUCache
+from trailMng.simplify import DEFAULT_TOLERANCE_PX, axes_pixel_size, simplify_to_pixels
+from trailMng.track import Track, cumulative_distance
+
+DEFAULT_CACHE_MB = 64
+PROFILE_WIDTH_PX = 560
+PROFILE_HEIGHT_PX = 240
+# Name of the interval selection over distance on a zoomable profile
+ZOOM_SELECTION = "zoom"
+
+
+@dataclass(frozen=True)
+class RenderParams:
+    """Everything besides the track that changes the rendered image."""
+    width_in: float = 6.4
+    height_in: float = 4.8
+    dpi: int = 100
+    tolerance_px: float = DEFAULT_TOLERANCE_PX
+    fmt: str = "png"
+
+
+@dataclass
+class RenderedFigure:
+    data: bytes
+    fmt: str
+    track_points: int
+    profile_points: int = 0
+    original_points: int = 0
+
+    @property
+    def mime(self) -> str:
+        return "image/svg+xml" if self.fmt == "svg" else f"image/{self.fmt}"
+
+
+def _new_figure(params: RenderParams, ncols: int = 1):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(params.width_in, params.height_in), dpi=params.dpi)
+    axes = fig.subplots(1, ncols)
+    return fig, axes
+
+
+def _encode(fig, params: RenderParams) -> bytes:
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format=params.fmt, dpi=params.dpi)
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+
+def render_track_map(track: Track, params: RenderParams) -> RenderedFigure:
+    """Plain track plot (longitude vs latitude) with start and end marked."""
+    fig, ax = _new_figure(params)
+    simplified = simplify_to_pixels(track.lon, track.lat, *axes_pixel_size(ax), params.tolerance_px)
+    idx = simplified.indices
+    ax.plot(track.lon[idx], track.lat[idx], linestyle='-')
+    ax.plot(track.lon[[0, -1]], track.lat[[0, -1]], marker='o', linestyle='')
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.set_title("GPX Track")
+    ax.grid(True)
+    return RenderedFigure(data=_encode(fig, params), fmt=params.fmt,
+                          track_points=simplified.kept, original_points=len(track))
+
+
+def profile_chart(dist_m: np.ndarray, ele: np.ndarray, title: str, zoom: bool = False,
+                  km_range: Optional[Tuple[float, float]] = None,
+                  width_px: int = PROFILE_WIDTH_PX, height_px: int = PROFILE_HEIGHT_PX):
+    """Elevation profile as an Altair chart of the given (already downsampled) points.
+
+    The distance axis spans ``km_range``, or the points when it is not given. With
+    ``zoom``, dragging over the chart selects a distance range, reported in km under
+    ZOOM_SELECTION.
+    """
+    import altair as alt
+
+    values = [{"km": round(d / 1000, 4), "ele": round(e, 1)} for d, e in zip(dist_m.tolist(), ele.tolist())]
+    if km_range is None and values:
+        km_range = (values[0]["km"], values[-1]["km"])
+    x_scale = alt.Scale(domain=list(km_range), nice=False) if km_range else alt.Undefined
+    # Inline data as a plain dict: alt.Data would schema-check every point
+    chart = alt.Chart({"values": values}, title=title).mark_area(
+        color="green", opacity=0.3, line={"color": "green"}, clip=True,
+    ).encode(
+        x=alt.X("km:Q", title="Distance (km)", scale=x_scale),
+        y=alt.Y("ele:Q", title="Elevation (m)"),
+        tooltip=[alt.Tooltip("km:Q", title="Distance (km)", format=".2f"),
+                 alt.Tooltip("ele:Q", title="Elevation (m)", format=".0f")],
+    ).properties(width=width_px, height=height_px)
+    if zoom:
+        chart = chart.add_params(alt.selection_interval(name=ZOOM_SELECTION, encodings=["x"]))
+    return chart
+
+
+def render_tracks_overlay(tracks: Sequence[Track], labels: Sequence[str], params: RenderParams,
+                          profile: bool = False) -> RenderedFigure:
+    """All tracks on one map, optionally with their elevation profiles overlaid beside it."""
+    fig, axes = _new_figure(params, ncols=2 if profile else 1)
+    ax_map, ax_profile = axes if profile else (axes, None)
+    kept = profile_kept = original = 0
+    for track, label in zip(tracks, labels):
+        simplified = simplify_to_pixels(track.lon, track.lat, *axes_pixel_size(ax_map), params.tolerance_px)
+        idx = simplified.indices
+        line, = ax_map.plot(track.lon[idx], track.lat[idx], linestyle='-', label=label)
+        ax_map.plot(track.lon[0], track.lat[0], marker='o', color=line.get_color())
+        kept += simplified.kept
+        original += len(track)
+        if ax_profile is not None and track.has_elevation:
+            dist_km = cumulative_distance(track.lat, track.lon) / 1000
+            profile_simple = simplify_to_pixels(dist_km, track.ele, *axes_pixel_size(ax_profile),
+                                                params.tolerance_px)
+            ax_profile.plot(dist_km[profile_simple.indices], track.ele[profile_simple.indices],
+                            color=line.get_color(), linewidth=1.5)
+            profile_kept += profile_simple.kept
+
+    ax_map.set_title("Tracks")
+    ax_map.set_xlabel("Longitude")
+    ax_map.set_ylabel("Latitude")
+    ax_map.grid(True, alpha=0.3)
+    ax_map.legend(fontsize="small")
+    if ax_profile is not None:
+        ax_profile.set_title("Elevation Profiles")
+        ax_profile.set_xlabel("Distance (km)")
+        ax_profile.set_ylabel("Elevation (m)")
+        ax_profile.grid(True, alpha=0.3)
+    fig.tight_layout()
+    return RenderedFigure(data=_encode(fig, params), fmt=params.fmt, track_points=kept,
+                          profile_points=profile_kept, original_points=original)
+
+
+class FigureCache:
+    """Bounded LRU cache of rendered figure bytes."""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MB * 2**20):
+        self.memory = LRUCache(max_bytes)
+
+    @property
+    def hits(self) -> int:
+        return self.memory.hits
+
+    @property
+    def misses(self) -> int:
+        return self.memory.misses
+
+    def get_or_render(self, track_key: str, kind: str, params: RenderParams,
+                      render: Callable[[], RenderedFigure]) -> RenderedFigure:
+        """Return the cached figure for ``(track_key, kind, params)``, rendering on a miss."""
+        key: Hashable = (track_key, kind, params)
+        rendered = self.memory.get(key)
+        if rendered is None:
+            rendered = render()
+            self.memory.put(key, rendered, len(rendered.data))
+        return rendered
@@ -0,0 +1,296 @@
+"""
+Full-text search over the trail catalog.
+
+Trail names, descriptions and media descriptions of both languages are indexed in a
+local SQLite FTS5 database. Files are re-indexed only when their content changes, and
+queries never touch the JSON files::
+
+    python -m trailMng.search update trailjsons
+    python -m trailMng.search query "Nahal Kana"
+
+Hebrew text is normalized before indexing: niqqud and geresh marks are removed, final
+letters are folded to their regular form, and words that start with the one-letter
+prefixes (ו, ה, ב, ל, מ, ש, כ) are also indexed without them, so "בנחל" is found by
+"נחל".
+"""
+import argparse
+from contextlib import closing
+from dataclasses import dataclass
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import unicodedata
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from trailMng.catalog import discover_pairs, load_document, pair_key, split_language
+
+DEFAULT_DB = "trailsearch.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    pair_key TEXT NOT NULL,
+    trail_id TEXT NOT NULL,
+    trail_name TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    field TEXT NOT NULL,
+    media_id TEXT,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_path ON entries(path);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(terms, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+# Niqqud and cantillation marks, geresh/gershayim and the ASCII quotes used in their place
+_HEBREW_MARKS = re.compile("[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7\u05F3\u05F4'\"]")
+_FINAL_LETTERS = (("\u05DA", "\u05DB"), ("\u05DD", "\u05DE"), ("\u05DF", "\u05E0"),
+                  ("\u05E3", "\u05E4"), ("\u05E5", "\u05E6"))
+_FINAL_FORMS = {regular: final for final, regular in _FINAL_LETTERS}
+_HEBREW_PREFIXES = "\u05D5\u05D1\u05DB\u05DC\u05DE\u05E9\u05D4"
+_HEBREW_LETTER = re.compile("[\u05D0-\u05EA]")
+# Hebrew words of four or more letters that start with a prefix letter
+_PREFIXED_WORD = re.compile(f"(?<!\\w)[{_HEBREW_PREFIXES}][\u05D0-\u05EA]{{3,}}(?!\\w)")
+_WORD = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = text.replace("\u05BE", " ")  # maqaf, the Hebrew hyphen
+    text = _HEBREW_MARKS.sub("", text)
+    for final, regular in _FINAL_LETTERS:
+        text = text.replace(final, regular)
+    return text
+
+
+def _variants(token: str) -> List[str]:
+    """The token plus, for Hebrew, the forms without up to three prefix letters."""
+    variants = [token]
+    if _HEBREW_LETTER.match(token):
+        stem = token
+        while len(variants) < 4 and len(stem) > 3 and stem[0] in _HEBREW_PREFIXES:
+            stem = stem[1:]
+            variants.append(stem)
+    return variants
+
+
+def index_terms(text: str) -> str:
+    """The text as it is stored in the FTS column: normalized, plus the prefix-less forms."""
+    text = _normalize(text)
+    extra = [v for word in _PREFIXED_WORD.findall(text) for v in _variants(word)[1:]]
+    return f"{text} {' '.join(extra)}" if extra else text
+
+
+def build_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression: every word must match; the last one may be a prefix."""
+    tokens = _WORD.findall(_normalize(text))
+    if not tokens:
+        return None
+    clauses = []
+    for i, token in enumerate(tokens):
+        suffix = "*" if i == len(tokens) - 1 else ""
+        alternatives = " OR ".join(f'"{v}"{suffix}' for v in _variants(token))
+        clauses.append(f"({alternatives})")
+    return " AND ".join(clauses)
+
+
+def _raw_pattern(token: str) -> "re.Pattern[str]":
+    """Finds a normalized token, or its prefix-less forms, in text that was not normalized.
+
+    Marks may sit between the letters and a letter may be in its final form; the offsets
+    of the match are then offsets into the original text.
+    """
+    marks = _HEBREW_MARKS.pattern + "*"
+    forms = [marks.join(f"[{c}{_FINAL_FORMS[c]}]" if c in _FINAL_FORMS else re.escape(c) for c in variant)
+             for variant in _variants(token)]
+    return re.compile("|".join(forms), re.IGNORECASE)
+
+
+def _snippet(content: str, query: str, width: int = 80) -> str:
+    """A window of ``content`` around the first query word."""
+    matches = [_raw_pattern(token).search(content) for token in _WORD.findall(_normalize(query))]
+    positions = [m.start() for m in matches if m]
+    start = max(0, min(positions) - width // 2) if positions else 0
+    end = start + width
+    # Keep every letter together with its niqqud
+    while 0 < start < len(content) and unicodedata.combining(content[start]):
+        start -= 1
+    while end < len(content) and unicodedata.combining(content[end]):
+        end += 1
+    snippet = content[start:end].strip()
+    return ("…" if start else "") + snippet + ("…" if end < len(content) else "")
+
+
+@dataclass
+class SearchHit:
+    pair_key: str
+    trail_id: str
+    trail_name: str
+    lang: str
+    field: str  # "name", "description" or "media"
+    media_id: Optional[str]
+    snippet: str
+
+
+def _document_entries(data: dict) -> Iterator[Tuple[str, Optional[str], str]]:
+    """``(field, media_id, text)`` for every searchable text in a trail document."""
+    for field in ("name", "description"):
+        if data.get(field):
+            yield field, None, str(data[field])
+    for media in data.get("media", []):
+        if isinstance(media, dict) and media.get("description"):
+            yield "media", media.get("id", ""), str(media["description"])
+
+
+class TrailSearchIndex:
+    """SQLite FTS5 index of a trail JSON directory."""
+
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "TrailSearchIndex":
+        """Open the index named by ``TRAILMNG_SEARCH_DB`` (default ``trailsearch.sqlite``)."""
+        return cls(os.environ.get("TRAILMNG_SEARCH_DB") or DEFAULT_DB)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: Streamlit serves sessions from several threads
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _remove_path(self, conn: sqlite3.Connection, path: str) -> None:
+        ids = [row[0] for row in conn.execute("SELECT id FROM entries WHERE path = ?", (path,))]
+        conn.executemany("DELETE FROM entries_fts WHERE rowid = ?", ((i,) for i in ids))
+        conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+        conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def _index_file(self, conn: sqlite3.Connection, path: str, key: str, lang: str) -> None:
+        data, _ = load_document(path)
+        if data is None:
+            return
+        trail_id = str(data.get("trailId") or "")
+        trail_name = str(data.get("name") or trail_id)
+        for field, media_id, text in _document_entries(data):
+            cur = conn.execute(
+                "INSERT INTO entries (path, pair_key, trail_id, trail_name, lang, field, media_id, content) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, key, trail_id, trail_name, lang, field, media_id, text))
+            conn.execute("INSERT INTO entries_fts (rowid, terms) VALUES (?, ?)", (cur.lastrowid, index_terms(text)))
+
+    def update(self, directory: str) -> Dict[str, int]:
+        """Bring the index in line with ``directory``; only changed files are re-read.
+
+        Returns counts of indexed, removed and unchanged files.
+        """
+        pairs, _ = discover_pairs(directory)
+        files = {os.path.abspath(path): (pair.key, lang) for pair in pairs for lang, path in pair.files.items()}
+        counts = {"indexed": 0, "removed": 0, "unchanged": 0}
+        with closing(self._connect()) as conn, conn:
+            known = {row[0]: row[1:] for row in conn.execute("SELECT path, size, mtime_ns, sha256 FROM sources")}
+            for path in set(known) - set(files):
+                self._remove_path(conn, path)
+                counts["removed"] += 1
+            for path, (key, lang) in files.items():
+                st = os.stat(path)
+                old = known.get(path)
+                if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    counts["unchanged"] += 1
+                    continue
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                if not old or old[2] != digest:
+                    self._remove_path(conn, path)
+                    self._index_file(conn, path, key, lang)
+                    counts["indexed"] += 1
+                else:
+                    counts["unchanged"] += 1
+                conn.execute("INSERT OR REPLACE INTO sources (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                             (path, st.st_size, st.st_mtime_ns, digest))
+        return counts
+
+    def update_file(self, path: str) -> None:
+        """Re-index a single trail JSON file (e.g. right after it was saved)."""
+        path = os.path.abspath(path)
+        base, lang = split_language(os.path.basename(path))
+        if lang is None:
+            return
+        with closing(self._connect()) as conn, conn:
+            self._remove_path(conn, path)
+            if os.path.exists(path):
+                st = os.stat(path)
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                self._index_file(conn, path, pair_key(base), lang)
+                conn.execute("INSERT INTO sources (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                             (path, st.st_size, st.st_mtime_ns, digest))
+
+    def search(self, text: str, lang: Optional[str] = None, limit: int = 50) -> List[SearchHit]:
+        """Best matches first (FTS5 bm25 rank)."""
+        query = build_query(text)
+        if query is None:
+            return []
+        sql = ("SELECT e.pair_key, e.trail_id, e.trail_name, e.lang, e.field, e.media_id, e.content "
+               "FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid "
+               "WHERE entries_fts MATCH ?")
+        params: list = [query]
+        if lang:
+            sql += " AND e.lang = ?"
+            params.append(lang)
+        sql += " ORDER BY entries_fts.rank LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [SearchHit(*row[:6], snippet=_snippet(row[6], text)) for row in rows]
+
+    def trail_names(self, lang: str = "en") -> Dict[str, str]:
+        """``{trailId: name}`` of every indexed trail in one language."""
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT DISTINCT trail_id, trail_name FROM entries WHERE lang = ?", (lang,)))
+
+
+def group_by_trail(hits: List[SearchHit]) -> Dict[str, List[SearchHit]]:
+    """Hits grouped by trail pair, keeping the best-ranked trail first."""
+    grouped: Dict[str, List[SearchHit]] = {}
+    for hit in hits:
+        grouped.setdefault(hit.pair_key, []).append(hit)
+    return grouped
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Full-text search over trail JSON files.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite index file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="Index new and changed files")
+    update.add_argument("directory", nargs="?", default="trailjsons")
+    query = sub.add_parser("query", help="Search the index")
+    query.add_argument("text")
+    query.add_argument("--lang", choices=("en", "he"))
+    query.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    index = TrailSearchIndex(args.db)
+    if args.command == "update":
+        counts = index.update(args.directory)
+        print(", ".join(f"{n} {what}" for what, n in counts.items()), file=sys.stderr)
+        return 0
+
+    for hit in index.search(args.text, args.lang, args.limit):
+        where = f"media {hit.media_id}" if hit.field == "media" else hit.field
+        print(f"{hit.trail_name} [{hit.lang}, {where}]: {hit.snippet}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
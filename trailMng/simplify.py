@@ -0,0 +1,140 @@
+"""
+Polyline simplification for plotting.
+
+Dense recordings carry far more points than the figure has pixels. Douglas-Peucker
+drops every point that lies within ``tolerance`` of the simplified line, so start
+and end are always kept, as is every turn large enough to be visible.
+
+Series drawn in the browser, such as the elevation profile, are instead cut to a
+fixed number of points with Largest-Triangle-Three-Buckets, which keeps the point of
+each bucket that spans the largest triangle with its neighbours, so peaks and dips
+survive at any zoom.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# Half a pixel: the simplified line is indistinguishable from the full one
+DEFAULT_TOLERANCE_PX = 0.5
+
+
+@dataclass
+class Simplified:
+    """Indices of the kept points into the original arrays."""
+    indices: np.ndarray
+    original: int
+    tolerance_px: float
+
+    @property
+    def kept(self) -> int:
+        return len(self.indices)
+
+
+def _segment_distances(x: np.ndarray, y: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                       points: np.ndarray) -> np.ndarray:
+    """Distance of every point to the segment from its ``starts`` to its ``ends`` point."""
+    px = x[points] - x[starts]
+    py = y[points] - y[starts]
+    dx = x[ends] - x[starts]
+    dy = y[ends] - y[starts]
+    length2 = dx * dx + dy * dy
+    # Closed loop (start == end): fall back to the distance to that point
+    loop = length2 == 0
+    t = np.clip((px * dx + py * dy) / np.where(loop, 1.0, length2), 0.0, 1.0)
+    t[loop] = 0.0
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Sorted indices of the points kept by Douglas-Peucker at ``tolerance``.
+
+    Every split of one recursion depth is handled together, so the Python loop runs
+    once per depth rather than once per kept point, and each pass is a few vectorized
+    calls over the points still undecided.
+    """
+    n = len(x)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    while True:
+        inner = ends - starts - 1
+        has_inner = inner > 0
+        starts, ends, inner = starts[has_inner], ends[has_inner], inner[has_inner]
+        if not len(starts):
+            break
+        # The interior points of every range, range after range
+        first = np.cumsum(inner) - inner
+        owner = np.repeat(np.arange(len(starts)), inner)
+        points = np.arange(len(owner)) - first[owner] + starts[owner] + 1
+        dists = _segment_distances(x, y, starts[owner], ends[owner], points)
+        farthest = np.maximum.reduceat(dists, first)
+        # The first point at the largest distance of each range, as np.argmax picks it
+        at_max = np.flatnonzero(dists == farthest[owner])
+        ranges, at_first = np.unique(owner[at_max], return_index=True)
+        mids = points[at_max[at_first]]
+        split = farthest[ranges] > tolerance
+        ranges, mids = ranges[split], mids[split]
+        keep[mids] = True
+        starts, ends = np.concatenate((starts[ranges], mids)), np.concatenate((mids, ends[ranges]))
+    return np.flatnonzero(keep)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Sorted indices of at most ``points`` points picked by Largest-Triangle-Three-Buckets.
+
+    ``x`` must be ascending. The first and last points are always kept; the others are
+    split into ``points - 2`` buckets of nearly equal size, and each bucket keeps the
+    point spanning the largest triangle with the point kept before it and the mean of
+    the next bucket. Only the choice within a bucket depends on the previous one, so the
+    Python loop runs once per kept point over vectorized slices.
+    """
+    n = len(x)
+    if n <= points:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1][:max(points, 0)])
+    edges = 1 + (np.arange(points - 1) * (n - 2)) // (points - 2)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / sizes
+    # The last bucket looks ahead to the last point
+    next_x = np.append(mean_x[1:], x[-1]).tolist()
+    next_y = np.append(mean_y[1:], y[-1]).tolist()
+
+    kept = np.empty(points, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i, (lo, hi) in enumerate(zip(edges[:-1].tolist(), edges[1:].tolist())):
+        ax, ay = x[a], y[a]
+        # Twice the triangle area, up to sign
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def simplify_to_pixels(x: np.ndarray, y: np.ndarray, width_px: float, height_px: float,
+                       tolerance_px: float = DEFAULT_TOLERANCE_PX) -> Simplified:
+    """Simplify a line that will be drawn into a ``width_px`` x ``height_px`` box.
+
+    Both axes are scaled to pixels first, so the tolerance is in screen units and
+    the number of kept points depends on the figure size, not on the recording length.
+    Non-finite points are skipped.
+    """
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    xs, ys = x[finite], y[finite]
+    if len(xs) > 2:
+        x_span = np.ptp(xs) or 1.0
+        y_span = np.ptp(ys) or 1.0
+        kept = douglas_peucker(xs * (width_px / x_span), ys * (height_px / y_span), tolerance_px)
+        finite = finite[kept]
+    return Simplified(indices=finite, original=len(x), tolerance_px=tolerance_px)
+
+
+def axes_pixel_size(ax) -> tuple:
+    """Width and height in pixels of a matplotlib Axes at the figure's DPI."""
+    bbox = ax.get_window_extent()
+    return bbox.width, bbox.height
@@ -0,0 +1,449 @@
+"""
+Spatial index over the trail tracks.
+
+Every track is rasterized into a grid of small lat/lon tiles, and the tiles it passes
+through are stored in a local SQLite database against the trail's ``trailId``, with a
+simplified copy of the line for exact distances. "Trails within 500 m of this parking
+lot", "trails crossing this box" and "trails this new GPX runs along" then read only
+the tiles around the question instead of opening every GPX::
+
+    python -m trailMng.spatial update gpx
+    python -m trailMng.spatial near 32.71 35.13 --radius 500
+    python -m trailMng.spatial overlap new_recording.gpx
+
+GPX files are linked to trails by name: ``gpx/<trailId>.gpx`` is the track of the
+trail whose JSON files carry that ``trailId``. Converted ``<trailId>.trk`` track files
+(see ``trailMng.store``) are read the same way. Like the search index, files are only
+re-read when their content changes.
+"""
+import argparse
+from contextlib import closing
+from dataclasses import dataclass
+import hashlib
+import math
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from trailMng.gpx_stream import load_track
+from trailMng.simplify import douglas_peucker
+from trailMng.store import SUFFIX
+from trailMng.track import EARTH_RADIUS, Track
+
+DEFAULT_DB = "trailspatial.sqlite"
+# Tile edge in degrees: about 55 m north-south and 47 m east-west in Israel
+CELL_DEG = 0.0005
+# Tracks are stored simplified to this many metres; distances are exact to within it
+SIMPLIFY_M = 5.0
+DEFAULT_RADIUS_M = 500.0
+# Trails sharing less than this part of a new track are not reported as overlapping
+MIN_OVERLAP = 0.1
+# Tracks are sampled at half a tile so no tile they cross is skipped
+_SAMPLE_M = math.radians(CELL_DEG) * EARTH_RADIUS / 2
+
+# Bound parameters per statement, well under SQLite's limit
+_BATCH = 500
+# Tile keys pack the column above the row, so one column is one contiguous key range
+_ROW_BITS = 20
+# Candidate lookups use blocks of 16 x 16 tiles, so a query reads a few rows per trail
+_BLOCK_BITS = 4
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    trail_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    trail_id TEXT PRIMARY KEY,
+    path TEXT,
+    points BLOB NOT NULL,
+    segments BLOB NOT NULL,
+    cells INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cells (
+    cell INTEGER NOT NULL,
+    trail_id TEXT NOT NULL,
+    PRIMARY KEY (cell, trail_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cells_trail ON cells(trail_id);
+CREATE TABLE IF NOT EXISTS blocks (
+    block INTEGER NOT NULL,
+    trail_id TEXT NOT NULL,
+    PRIMARY KEY (block, trail_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS blocks_trail ON blocks(trail_id);
+"""
+
+
+def _column(lon):
+    return np.floor((np.asarray(lon) + 180.0) / CELL_DEG).astype(np.int64)
+
+
+def _row(lat):
+    return np.floor((np.asarray(lat) + 90.0) / CELL_DEG).astype(np.int64)
+
+
+def cell_keys(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Tile key of every point."""
+    return (_column(lon) << _ROW_BITS) | _row(lat)
+
+
+def block_keys(cells: np.ndarray) -> np.ndarray:
+    """Key of the block of every tile."""
+    columns, rows = cells >> _ROW_BITS, cells & ((1 << _ROW_BITS) - 1)
+    return ((columns >> _BLOCK_BITS) << _ROW_BITS) | (rows >> _BLOCK_BITS)
+
+
+def _neighbourhood(keys: np.ndarray) -> np.ndarray:
+    """``(len(keys), 9)`` keys of each tile and the eight around it."""
+    offsets = np.array([(dx << _ROW_BITS) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+    return keys[:, None] + offsets[None, :]
+
+
+def _project(lat: np.ndarray, lon: np.ndarray, lat0: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular metres around ``lat0``; accurate over the extent of a trail."""
+    return (np.radians(lon) * math.cos(math.radians(lat0)) * EARTH_RADIUS,
+            np.radians(lat) * EARTH_RADIUS)
+
+
+def _segment_steps(n: int, segment_offsets: np.ndarray) -> np.ndarray:
+    """Mask of the steps ``i -> i+1`` that stay inside one track segment."""
+    inside = np.ones(max(n - 1, 0), dtype=bool)
+    starts = segment_offsets[(segment_offsets > 0) & (segment_offsets < n)]
+    inside[starts - 1] = False
+    return inside
+
+
+def sample_line(lat: np.ndarray, lon: np.ndarray, segment_offsets: np.ndarray,
+                spacing_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Points along the track at most ``spacing_m`` apart; the gaps between segments are not filled."""
+    n = len(lat)
+    if n < 2:
+        return lat, lon
+    x, y = _project(lat, lon, float(np.mean(lat)))
+    steps = np.where(_segment_steps(n, segment_offsets), np.ceil(np.hypot(np.diff(x), np.diff(y)) / spacing_m), 1)
+    steps = np.maximum(steps, 1).astype(np.int64)
+    # Fractions 0, 1/k, ..., (k-1)/k along each step, then the last point
+    owner = np.repeat(np.arange(n - 1), steps)
+    frac = (np.arange(len(owner)) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[owner]
+    return (np.append(lat[owner] + (lat[owner + 1] - lat[owner]) * frac, lat[-1]),
+            np.append(lon[owner] + (lon[owner + 1] - lon[owner]) * frac, lon[-1]))
+
+
+def track_cells(track: Track) -> np.ndarray:
+    """Sorted keys of the tiles the track passes through."""
+    lat, lon = sample_line(track.lat, track.lon, track.segment_offsets, _SAMPLE_M)
+    return np.unique(cell_keys(lat, lon))
+
+
+def simplify_track(track: Track, tolerance_m: float = SIMPLIFY_M) -> Track:
+    """The track's line simplified to ``tolerance_m``, per segment; elevation and time are dropped."""
+    if len(track) < 3:
+        return Track(track.lat, track.lon, np.full(len(track), np.nan), np.full(len(track), np.nan),
+                     track.segment_offsets)
+    x, y = _project(track.lat, track.lon, float(np.mean(track.lat)))
+    bounds = list(track.segment_offsets[track.segment_offsets < len(track)]) + [len(track)]
+    kept, offsets = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            offsets.append(sum(len(k) for k in kept))
+            kept.append(start + douglas_peucker(x[start:end], y[start:end], tolerance_m))
+    indices = np.concatenate(kept)
+    return Track(track.lat[indices], track.lon[indices], np.full(len(indices), np.nan),
+                 np.full(len(indices), np.nan), np.array(offsets, dtype=np.int64))
+
+
+Line = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (lat, lon, segment_offsets)
+
+
+def _join(lines: Sequence[Line]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Several lines as one: ``(lat, lon, first point of every line, steps that stay inside one segment)``.
+
+    Step ``i`` joins points ``i`` and ``i + 1``.
+    """
+    sizes = np.array([len(line[0]) for line in lines], dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+    offsets = np.concatenate([starts] + [start + line[2] for start, line in zip(starts, lines)])
+    lat = np.concatenate([line[0] for line in lines])
+    return lat, np.concatenate([line[1] for line in lines]), starts, _segment_steps(len(lat), offsets)
+
+
+def distances_to_lines(lat: float, lon: float, lines: Sequence[Line]) -> np.ndarray:
+    """Shortest distance in metres from a point to each line, in one vectorized pass."""
+    if not lines:
+        return np.zeros(0)
+    line_lat, line_lon, starts, inside = _join(lines)
+    x, y = _project(line_lat, line_lon, lat)
+    px, py = _project(np.array(lat), np.array(lon), lat)
+    dx, dy = np.diff(x), np.diff(y)
+    length2 = dx * dx + dy * dy
+    t = np.clip(((px - x[:-1]) * dx + (py - y[:-1]) * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    along = np.where(inside, np.hypot(x[:-1] + t * dx - px, y[:-1] + t * dy - py), np.inf)
+    # The points themselves cover single-point segments, which have no step
+    nearest = np.minimum(np.hypot(x - px, y - py), np.append(along, np.inf))
+    return np.minimum.reduceat(nearest, starts)
+
+
+def lines_in_bbox(lines: Sequence[Line], bbox: Tuple[float, float, float, float]) -> np.ndarray:
+    """Whether any part of each line lies inside ``(min_lat, min_lon, max_lat, max_lon)``."""
+    if not lines:
+        return np.zeros(0, dtype=bool)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    line_lat, line_lon, starts, inside = _join(lines)
+    hit = (line_lat >= min_lat) & (line_lat <= max_lat) & (line_lon >= min_lon) & (line_lon <= max_lon)
+
+    # Steps that cross the box between two outside points: Liang-Barsky clipping of the
+    # few steps whose own extent meets the box
+    lat0, lat1, lon0, lon1 = line_lat[:-1], line_lat[1:], line_lon[:-1], line_lon[1:]
+    steps = np.flatnonzero(inside & (np.minimum(lat0, lat1) <= max_lat) & (np.maximum(lat0, lat1) >= min_lat)
+                           & (np.minimum(lon0, lon1) <= max_lon) & (np.maximum(lon0, lon1) >= min_lon))
+    x0, y0 = lon0[steps], lat0[steps]
+    dx, dy = lon1[steps] - x0, lat1[steps] - y0
+    t0, t1 = np.zeros(len(steps)), np.ones(len(steps))
+    crosses = np.ones(len(steps), dtype=bool)
+    for p, q in ((-dx, x0 - min_lon), (dx, max_lon - x0), (-dy, y0 - min_lat), (dy, max_lat - y0)):
+        parallel = p == 0
+        crosses &= ~(parallel & (q < 0))
+        r = np.divide(q, p, out=np.zeros_like(q), where=~parallel)
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+    hit[steps[crosses & (t0 <= t1)]] = True
+    return np.logical_or.reduceat(hit, starts)
+
+
+@dataclass
+class NearbyTrail:
+    trail_id: str
+    distance_m: float
+
+
+@dataclass
+class TrailOverlap:
+    trail_id: str
+    share: float  # part of the queried track that runs along this trail
+    covered: float  # part of this trail that the queried track runs along
+
+
+class SpatialIndex:
+    """SQLite tile index of trail tracks, keyed by ``trailId``."""
+
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "SpatialIndex":
+        """Open the index named by ``TRAILMNG_SPATIAL_DB`` (default ``trailspatial.sqlite``)."""
+        return cls(os.environ.get("TRAILMNG_SPATIAL_DB") or DEFAULT_DB)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: Streamlit serves sessions from several threads
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def _remove(self, conn: sqlite3.Connection, trail_id: str) -> None:
+        conn.execute("DELETE FROM cells WHERE trail_id = ?", (trail_id,))
+        conn.execute("DELETE FROM blocks WHERE trail_id = ?", (trail_id,))
+        conn.execute("DELETE FROM tracks WHERE trail_id = ?", (trail_id,))
+
+    def _add(self, conn: sqlite3.Connection, trail_id: str, track: Track, path: Optional[str]) -> None:
+        self._remove(conn, trail_id)
+        if len(track) == 0:
+            return
+        cells = track_cells(track)
+        line = simplify_track(track)
+        conn.executemany("INSERT INTO cells (cell, trail_id) VALUES (?, ?)",
+                         ((int(cell), trail_id) for cell in cells))
+        conn.executemany("INSERT INTO blocks (block, trail_id) VALUES (?, ?)",
+                         ((int(block), trail_id) for block in np.unique(block_keys(cells))))
+        conn.execute("INSERT INTO tracks (trail_id, path, points, segments, cells) VALUES (?, ?, ?, ?, ?)",
+                     (trail_id, path, np.stack([line.lat, line.lon]).tobytes(),
+                      line.segment_offsets.astype(np.int64).tobytes(), len(cells)))
+
+    def add_track(self, trail_id: str, track: Track) -> None:
+        """Index (or re-index) the track of one trail, e.g. right after its GPX was uploaded."""
+        with closing(self._connect()) as conn, conn:
+            self._add(conn, trail_id, track, None)
+
+    def remove(self, trail_id: str) -> None:
+        """Drop a trail's track; a ``<trailId>.gpx`` file still present is re-indexed by the next update."""
+        with closing(self._connect()) as conn, conn:
+            self._remove(conn, trail_id)
+            conn.execute("DELETE FROM sources WHERE trail_id = ?", (trail_id,))
+
+    def update(self, directory: str) -> Dict[str, int]:
+        """Bring the index in line with the ``<trailId>.gpx`` (or ``.trk``) files in ``directory``.
+
+        Only new and changed files are parsed; tracks of files that are gone are removed.
+        Tracks added with ``add_track`` are left alone. Returns counts of indexed, removed,
+        unchanged and unreadable files.
+        """
+        files = {}
+        if os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                stem, ext = os.path.splitext(filename)
+                if ext.lower() in (".gpx", SUFFIX):
+                    files[os.path.abspath(os.path.join(directory, filename))] = stem
+        counts = {"indexed": 0, "removed": 0, "unchanged": 0, "failed": 0}
+        with closing(self._connect()) as conn, conn:
+            known = {row[0]: row[1:] for row in
+                     conn.execute("SELECT path, size, mtime_ns, sha256, trail_id FROM sources")}
+            for path in set(known) - set(files):
+                self._remove(conn, known[path][3])
+                conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+                counts["removed"] += 1
+            for path, trail_id in files.items():
+                st = os.stat(path)
+                old = known.get(path)
+                if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    counts["unchanged"] += 1
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()
+                if not old or old[2] != digest:
+                    try:
+                        track = load_track(path)
+                    except Exception:
+                        # Recorded with its hash below, so it is retried only once it changes
+                        self._remove(conn, trail_id)
+                        counts["failed"] += 1
+                    else:
+                        self._add(conn, trail_id, track, path)
+                        counts["indexed"] += 1
+                else:
+                    counts["unchanged"] += 1
+                conn.execute("INSERT OR REPLACE INTO sources (path, size, mtime_ns, sha256, trail_id) "
+                             "VALUES (?, ?, ?, ?, ?)", (path, st.st_size, st.st_mtime_ns, digest, trail_id))
+        return counts
+
+    def _candidates(self, conn: sqlite3.Connection, bbox: Tuple[float, float, float, float]) -> List[str]:
+        """Trails with a block overlapping the box: one key range per block column."""
+        min_lat, min_lon, max_lat, max_lon = bbox
+        row0, row1 = int(_row(min_lat)) >> _BLOCK_BITS, int(_row(max_lat)) >> _BLOCK_BITS
+        ranges = [((column << _ROW_BITS) | row0, (column << _ROW_BITS) | row1)
+                  for column in range(int(_column(min_lon)) >> _BLOCK_BITS, (int(_column(max_lon)) >> _BLOCK_BITS) + 1)]
+        found = set()
+        for i in range(0, len(ranges), _BATCH // 2):
+            batch = ranges[i:i + _BATCH // 2]
+            found.update(row[0] for row in conn.execute(
+                "SELECT DISTINCT trail_id FROM blocks WHERE " + " OR ".join(["block BETWEEN ? AND ?"] * len(batch)),
+                [key for bounds in batch for key in bounds]))
+        return sorted(found)
+
+    def _lines(self, conn: sqlite3.Connection, trail_ids: List[str]) -> Tuple[List[str], List[Line]]:
+        ids, lines = [], []
+        for i in range(0, len(trail_ids), _BATCH):
+            batch = trail_ids[i:i + _BATCH]
+            for trail_id, points, segments in conn.execute(
+                    f"SELECT trail_id, points, segments FROM tracks WHERE trail_id IN ({','.join('?' * len(batch))})",
+                    batch):
+                lat, lon = np.frombuffer(points, dtype=np.float64).reshape(2, -1)
+                ids.append(trail_id)
+                lines.append((lat, lon, np.frombuffer(segments, dtype=np.int64)))
+        return ids, lines
+
+    def near(self, lat: float, lon: float, radius_m: float = DEFAULT_RADIUS_M) -> List[NearbyTrail]:
+        """Trails passing within ``radius_m`` of a point, nearest first."""
+        d_lat = math.degrees(radius_m / EARTH_RADIUS)
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        with closing(self._connect()) as conn:
+            ids, lines = self._lines(conn, self._candidates(conn, (lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon)))
+        distances = distances_to_lines(lat, lon, lines)
+        order = np.argsort(distances, kind="stable")
+        return [NearbyTrail(ids[i], float(distances[i])) for i in order if distances[i] <= radius_m]
+
+    def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Trails with any part inside the box."""
+        bbox = (min_lat, min_lon, max_lat, max_lon)
+        with closing(self._connect()) as conn:
+            ids, lines = self._lines(conn, self._candidates(conn, bbox))
+        return [trail_id for trail_id, inside in zip(ids, lines_in_bbox(lines, bbox)) if inside]
+
+    def overlaps(self, track: Track, min_share: float = MIN_OVERLAP,
+                 exclude: Optional[str] = None) -> List[TrailOverlap]:
+        """Trails the track runs along, largest shared part first.
+
+        A stretch of the track counts as shared when the trail passes through its tile or
+        one next to it, i.e. within roughly one tile (50 m) of it.
+        """
+        if len(track) == 0:
+            return []
+        # Evenly spaced samples, so the share is a share of length rather than of points
+        lat, lon = sample_line(track.lat, track.lon, track.segment_offsets, _SAMPLE_M)
+        own, weights = np.unique(cell_keys(lat, lon), return_counts=True)
+        around = _neighbourhood(own)
+        nearby = np.unique(around)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE query_cells (cell INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT INTO query_cells VALUES (?)", ((int(c),) for c in nearby))
+            rows = conn.execute("SELECT c.trail_id, c.cell, t.cells FROM cells c JOIN query_cells q ON q.cell = c.cell "
+                                "JOIN tracks t ON t.trail_id = c.trail_id").fetchall()
+        sizes = {trail_id: size for trail_id, _, size in rows}
+        rows = [(trail_id, cell) for trail_id, cell, _ in rows if trail_id != exclude]
+        if not rows:
+            return []
+        trail_ids = sorted({trail_id for trail_id, _ in rows})
+        column = {trail_id: i for i, trail_id in enumerate(trail_ids)}
+        # (nearby tile, trail) membership, then for each tile of the track: any trail tile around it
+        member = np.zeros((len(nearby), len(trail_ids)), dtype=bool)
+        member[np.searchsorted(nearby, [cell for _, cell in rows]), [column[t] for t, _ in rows]] = True
+        along = member[np.searchsorted(nearby, around)].any(axis=1)
+        shares = weights @ along / weights.sum()
+        shared_cells = member.sum(axis=0)
+
+        result = [TrailOverlap(trail_id, float(shares[i]), min(1.0, float(shared_cells[i]) / max(sizes[trail_id], 1)))
+                  for i, trail_id in enumerate(trail_ids) if shares[i] >= min_share]
+        return sorted(result, key=lambda o: -o.share)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Spatial queries over the trail tracks.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite index file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="Index new and changed <trailId>.gpx and .trk files")
+    update.add_argument("directory", nargs="?", default="gpx")
+    near = sub.add_parser("near", help="Trails passing near a point")
+    near.add_argument("lat", type=float)
+    near.add_argument("lon", type=float)
+    near.add_argument("--radius", type=float, default=DEFAULT_RADIUS_M, help="Metres")
+    bbox = sub.add_parser("bbox", help="Trails crossing a box")
+    for name in ("min_lat", "min_lon", "max_lat", "max_lon"):
+        bbox.add_argument(name, type=float)
+    overlap = sub.add_parser("overlap", help="Trails a GPX file runs along")
+    overlap.add_argument("gpx")
+    args = parser.parse_args(argv)
+
+    index = SpatialIndex(args.db)
+    start = time.perf_counter()
+    if args.command == "update":
+        counts = index.update(args.directory)
+        print(", ".join(f"{n} {what}" for what, n in counts.items()), file=sys.stderr)
+    elif args.command == "near":
+        for hit in index.near(args.lat, args.lon, args.radius):
+            print(f"{hit.trail_id}\t{hit.distance_m:.0f} m")
+    elif args.command == "bbox":
+        for trail_id in index.in_bbox(args.min_lat, args.min_lon, args.max_lat, args.max_lon):
+            print(trail_id)
+    else:
+        for hit in index.overlaps(load_track(args.gpx)):
+            print(f"{hit.trail_id}\t{hit.share:.0%} of the track, {hit.covered:.0%} of the trail")
+    print(f"{(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Compact columnar track files.
+
+A ``.trk`` file holds one Track as fixed-point columns behind a small header:
+
+- latitude and longitude in units of 1e-7 degree (about 1 cm), delta-encoded, so a
+  recording with steps under 30 m needs two bytes per coordinate;
+- elevation in decimetres above the lowest point of the track;
+- timestamps, when the track has them, in milliseconds after the first one;
+- the start index of every segment.
+
+Elevation and time columns are left out when no point has a value. Files are opened
+with ``mmap``: the stored columns are NumPy views of the page cache, and decoding a
+track is a few vectorized passes over them. A 1M-point recording takes about 10 MB,
+against about 100 MB of GPX::
+
+    python -m trailMng.store convert recording.gpx          # writes recording.trk
+    python -m trailMng.store convert gpx -o trk             # every GPX file of a directory
+    python -m trailMng.store info recording.trk
+
+Coordinates and timestamps written with up to 7 decimals and millisecond precision,
+which covers what GPS devices write, decode to exactly the values parsed from the GPX.
+"""
+import argparse
+from dataclasses import dataclass
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from trailMng.track import Track
+
+MAGIC = b"TRKS"
+VERSION = 1
+SUFFIX = ".trk"
+COORD_UNITS = 10_000_000  # per degree
+ELE_UNITS = 10  # per metre
+TIME_UNITS = 1000  # per second
+
+_HEADER = struct.Struct("<4sHHQ")  # magic, version, columns, points
+# name, dtype, delta-encoded, base (in units), units per value, offset, count
+_COLUMN = struct.Struct("<8s4s?7xddQQ")
+_ALIGN = 64
+
+
+@dataclass
+class Column:
+    name: str
+    dtype: np.dtype
+    delta: bool
+    base: float
+    units: float
+    offset: int
+    count: int
+
+    @property
+    def nbytes(self) -> int:
+        return self.dtype.itemsize * self.count
+
+
+def _smallest(values: np.ndarray, dtypes: Tuple[str, ...], reserve: int = 0) -> np.dtype:
+    """The first of ``dtypes`` that holds every value, keeping the top ``reserve`` values free."""
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for name in dtypes:
+        info = np.iinfo(name)
+        if info.min <= low and high <= info.max - reserve:
+            return np.dtype(name)
+    raise ValueError(f"Values from {low} to {high} do not fit in {dtypes[-1]}")
+
+
+def _coordinate(values: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Delta-encoded fixed-point column and its base."""
+    fixed = np.rint(values * COORD_UNITS).astype(np.int64)
+    deltas = np.diff(fixed, prepend=fixed[:1])
+    return deltas.astype(_smallest(deltas, ("<i2", "<i4", "<i8"))), float(fixed[0]) if len(fixed) else 0.0
+
+
+def _quantized(values: np.ndarray, units: int, dtypes: Tuple[str, ...]) -> Tuple[np.ndarray, float]:
+    """Offset fixed-point column with NaN stored as the dtype's largest value, and its base."""
+    missing = np.isnan(values)
+    fixed = np.rint(np.where(missing, 0.0, values) * units).astype(np.int64)
+    base = int(fixed[~missing].min())
+    fixed -= base
+    dtype = _smallest(fixed[~missing], dtypes, reserve=1)
+    fixed[missing] = np.iinfo(dtype).max
+    return fixed.astype(dtype), float(base)
+
+
+def encode_track(track: Track) -> bytes:
+    """The ``.trk`` bytes of a track."""
+    columns = []
+    for name, values in (("lat", track.lat), ("lon", track.lon)):
+        data, base = _coordinate(values)
+        columns.append((name, data, True, base, COORD_UNITS))
+    if track.has_elevation:
+        data, base = _quantized(track.ele, ELE_UNITS, ("<u2", "<u4"))
+        columns.append(("ele", data, False, base, ELE_UNITS))
+    if track.has_time:
+        data, base = _quantized(track.time, TIME_UNITS, ("<u4", "<i8"))
+        columns.append(("time", data, False, base, TIME_UNITS))
+    columns.append(("segments", track.segment_offsets.astype("<i8"), False, 0.0, 1))
+
+    offset = _HEADER.size + _COLUMN.size * len(columns)
+    descriptors, blobs = [], []
+    for name, data, delta, base, units in columns:
+        offset += -offset % _ALIGN
+        descriptors.append(_COLUMN.pack(name.encode("ascii"), data.dtype.str.encode("ascii"), delta,
+                                        base, units, offset, len(data)))
+        blobs.append((offset, data.tobytes()))
+        offset += data.nbytes
+
+    out = bytearray(offset)
+    out[:_HEADER.size] = _HEADER.pack(MAGIC, VERSION, len(columns), len(track))
+    out[_HEADER.size:_HEADER.size + _COLUMN.size * len(columns)] = b"".join(descriptors)
+    for start, blob in blobs:
+        out[start:start + len(blob)] = blob
+    return bytes(out)
+
+
+def save_track(track: Track, path: str) -> int:
+    """Write a track to ``path``; returns the file size."""
+    data = encode_track(track)
+    # Write under a temporary name so concurrent readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class StoredTrack:
+    """A ``.trk`` file or buffer; ``raw`` holds the stored columns as zero-copy views."""
+
+    def __init__(self, buffer):
+        if len(buffer) < _HEADER.size or bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a track file")
+        magic, version, count, self.points = _HEADER.unpack_from(buffer, 0)
+        if version != VERSION:
+            raise ValueError(f"Unsupported track file version {version}")
+        if len(buffer) < _HEADER.size + count * _COLUMN.size:
+            raise ValueError("Truncated track file")
+        self.columns: Dict[str, Column] = {}
+        self.raw: Dict[str, np.ndarray] = {}
+        for i in range(count):
+            name, dtype, delta, base, units, offset, n = _COLUMN.unpack_from(buffer, _HEADER.size + i * _COLUMN.size)
+            column = Column(name.rstrip(b"\0").decode("ascii"), np.dtype(dtype.rstrip(b"\0").decode("ascii")),
+                            delta, base, units, offset, n)
+            if offset + column.nbytes > len(buffer):
+                raise ValueError("Truncated track file")
+            self.columns[column.name] = column
+            self.raw[column.name] = np.frombuffer(buffer, dtype=column.dtype, count=n, offset=offset)
+        self.nbytes = len(buffer)
+
+    def __len__(self) -> int:
+        return self.points
+
+    def _decode(self, name: str) -> np.ndarray:
+        column = self.columns.get(name)
+        if column is None:
+            return np.full(self.points, np.nan)
+        raw = self.raw[name]
+        if column.delta:
+            fixed = np.cumsum(raw, dtype=np.int64)
+            fixed += int(column.base)
+            return fixed / column.units
+        values = raw.astype(np.float64)
+        values += column.base
+        values /= column.units
+        values[raw == np.iinfo(column.dtype).max] = np.nan
+        return values
+
+    def to_track(self) -> Track:
+        """Decode the columns into a Track; the segment table stays a view of the file."""
+        return Track(lat=self._decode("lat"), lon=self._decode("lon"), ele=self._decode("ele"),
+                     time=self._decode("time"), segment_offsets=self.raw["segments"])
+
+
+def open_track(path: str) -> StoredTrack:
+    """Map a ``.trk`` file; the mapping stays open as long as a view of it is alive."""
+    with open(path, "rb") as f:
+        # mmap refuses empty files with a ValueError as well
+        return StoredTrack(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def load_stored_track(path: str) -> Track:
+    return open_track(path).to_track()
+
+
+def convert(source: str, output: str) -> Tuple[int, int]:
+    """Convert a GPX file to a track file; returns the GPX and the track file size."""
+    from trailMng.gpx_stream import load_track
+
+    return os.path.getsize(source), save_track(load_track(source), output)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert GPX files to compact track files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="Convert a GPX file or a directory of them")
+    conv.add_argument("source")
+    conv.add_argument("-o", "--output", help="Track file, or directory for a directory (default: next to the GPX)")
+    info = sub.add_parser("info", help="Describe a track file")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        stored = open_track(args.path)
+        start = time.perf_counter()
+        stored.to_track()
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(stored):,} points, {stored.nbytes:,} bytes, decoded in {elapsed:.1f} ms")
+        for column in stored.columns.values():
+            print(f"  {column.name:8} {column.dtype.str:4} {'delta' if column.delta else 'plain':5} "
+                  f"{column.nbytes:>12,} bytes")
+        return 0
+
+    if os.path.isdir(args.source):
+        output_dir = args.output or args.source
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = [(os.path.join(args.source, name), os.path.join(output_dir, name[:-len(".gpx")] + SUFFIX))
+                for name in sorted(os.listdir(args.source)) if name.lower().endswith(".gpx")]
+    else:
+        jobs = [(args.source, args.output or os.path.splitext(args.source)[0] + SUFFIX)]
+    failures = 0
+    for source, output in jobs:
+        start = time.perf_counter()
+        try:
+            gpx_bytes, trk_bytes = convert(source, output)
+        except Exception as e:
+            print(f"{source}: {e}", file=sys.stderr)
+            failures += 1
+            continue
+        print(f"{source} -> {output}: {gpx_bytes:,} -> {trk_bytes:,} bytes "
+              f"({trk_bytes / max(gpx_bytes, 1):.1%}) in {(time.perf_counter() - start) * 1000:.0f} ms",
+              file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Array-backed GPX track representation.
+
+A parsed GPX is flattened into contiguous NumPy arrays (one entry per track point,
+in file order) so distance and elevation statistics are computed in a few batched
+calls instead of a Python loop over every gpxpy point object.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Same radius gpxpy uses, so distances agree with point.distance_2d()
+EARTH_RADIUS = 6378137.0
+
+
+@dataclass
+class Track:
+    """Track points as parallel arrays.
+
+    ``ele`` and ``time`` hold NaN where the GPX point has no value. ``time`` is in
+    seconds since the epoch. ``segment_offsets`` holds the start index of every
+    track segment.
+    """
+    lat: np.ndarray
+    lon: np.ndarray
+    ele: np.ndarray
+    time: np.ndarray
+    segment_offsets: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.lat, self.lon, self.ele, self.time, self.segment_offsets))
+
+    @property
+    def has_elevation(self) -> bool:
+        return bool(len(self)) and not np.isnan(self.ele).all()
+
+    @property
+    def has_time(self) -> bool:
+        return bool(len(self)) and not np.isnan(self.time).all()
+
+
+@dataclass
+class TrackStats:
+    """Summary numbers shown in the GPX tab. Distances are in metres."""
+    distance_m: float
+    min_ele: Optional[float]
+    max_ele: Optional[float]
+    bbox: Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+    points: int
+    duration_s: Optional[float] = None  # first to last timestamp; None without timestamps
+
+
+def epoch_seconds(time: datetime) -> float:
+    """Seconds since the epoch, reading a time without a UTC offset as UTC (as GPX specifies)."""
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return time.timestamp()
+
+
+def track_from_gpx(gpx) -> Track:
+    """Flatten the track points of a parsed ``gpxpy.gpx.GPX`` into a Track."""
+    rows = []
+    offsets = []
+    for track in gpx.tracks:
+        for segment in track.segments:
+            offsets.append(len(rows))
+            rows.extend(
+                (p.latitude, p.longitude,
+                 np.nan if p.elevation is None else p.elevation,
+                 np.nan if p.time is None else epoch_seconds(p.time))
+                for p in segment.points
+            )
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return Track(
+        lat=np.ascontiguousarray(data[:, 0]),
+        lon=np.ascontiguousarray(data[:, 1]),
+        ele=np.ascontiguousarray(data[:, 2]),
+        time=np.ascontiguousarray(data[:, 3]),
+        segment_offsets=np.array(offsets, dtype=np.int64),
+    )
+
+
+def cumulative_distance(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Haversine distance in metres from the first point to every point.
+
+    Consecutive points are joined across segment boundaries, matching the running
+    total the GPX tab has always shown.
+    """
+    if len(lat) == 0:
+        return np.zeros(0)
+    lat_r = np.radians(lat)
+    lon_r = np.radians(lon)
+    d_lat = np.diff(lat_r)
+    d_lon = np.diff(lon_r)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat_r[:-1]) * np.cos(lat_r[1:]) * np.sin(d_lon / 2) ** 2
+    step = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    dist = np.empty(len(lat))
+    dist[0] = 0.0
+    np.cumsum(step, out=dist[1:])
+    return dist
+
+
+def track_stats(track: Track, dist: Optional[np.ndarray] = None) -> TrackStats:
+    """Total distance, elevation range and bounding box of a track.
+
+    Points without elevation are ignored for the elevation range; ``min_ele`` and
+    ``max_ele`` are None when no point has one, and ``duration_s`` when no point has a
+    timestamp. Pass ``dist`` to reuse an already computed ``cumulative_distance``.
+    """
+    if len(track) == 0:
+        raise ValueError("Track has no points")
+    if dist is None:
+        dist = cumulative_distance(track.lat, track.lon)
+
+    min_ele = max_ele = None
+    if track.has_elevation:
+        min_ele = float(np.nanmin(track.ele))
+        max_ele = float(np.nanmax(track.ele))
+
+    return TrackStats(
+        distance_m=float(dist[-1]),
+        min_ele=min_ele,
+        max_ele=max_ele,
+        bbox=(float(track.lat.min()), float(track.lon.min()),
+              float(track.lat.max()), float(track.lon.max())),
+        points=len(track),
+        duration_s=float(np.nanmax(track.time) - np.nanmin(track.time)) if track.has_time else None,
+    )
@@ -0,0 +1,282 @@
+"""
+Trail description documents.
+
+Each trail is stored as one JSON document per language (``trailId``, ``name``,
+``description`` and a ``media`` list). The editor works on a merged view where every
+media item carries both ``description_en`` and ``description_he``.
+
+Media items are matched across languages by ``id``: the n-th item with an id in one
+document pairs with the n-th item with that id in the other, and items without an id
+are never paired. ``find_mismatches`` lists what the merge had to reconcile.
+"""
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import os
+
+LANGUAGES = ("en", "he")
+MEDIA_TYPES = ("image", "video")
+
+# Editor-only field: a stable identity for a media item, independent of its position
+# and of its (editable, possibly empty or repeated) "id". Never exported.
+MEDIA_KEY = "_key"
+
+
+MediaIdentity = Tuple[str, int]  # (id, occurrence of that id so far)
+
+
+def media_identities(media: Iterable[Dict[str, Any]]) -> List[MediaIdentity]:
+    """``(id, n)`` of every item, ``n`` counting the earlier items with the same id."""
+    seen: Dict[str, int] = {}
+    identities = []
+    for item in media:
+        media_id = str(item.get("id") or "")
+        identities.append((media_id, seen.get(media_id, 0)))
+        seen[media_id] = seen.get(media_id, 0) + 1
+    return identities
+
+
+def longest_increasing(values: Sequence[int]) -> List[int]:
+    """Positions of a longest strictly increasing subsequence of ``values``, in O(n log n)."""
+    tails: List[int] = []  # tails[k]: smallest last value of an increasing run of length k + 1
+    tail_at: List[int] = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_at.append(i)
+        else:
+            tails[k] = value
+            tail_at[k] = i
+        previous[i] = tail_at[k - 1] if k else -1
+    positions = []
+    i = tail_at[-1] if tail_at else -1
+    while i >= 0:
+        positions.append(i)
+        i = previous[i]
+    return positions[::-1]
+
+
+class MediaList:
+    """Media items in order, indexed by their ``MEDIA_KEY``.
+
+    A doubly linked list over dicts: lookup, insertion next to an item, moving and
+    removal are O(1) whatever the length of the list. The editor keeps the media of
+    the open draft in one and addresses items by key, as DraftStore does.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = ()):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        # None is the sentinel: _next[None] is the first key and _prev[None] the last
+        self._next: Dict[Optional[str], Optional[str]] = {None: None}
+        self._prev: Dict[Optional[str], Optional[str]] = {None: None}
+        for item in items:
+            self.append(item)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        return self._items[key]
+
+    def keys(self) -> Iterator[str]:
+        key = self._next[None]
+        while key is not None:
+            yield key
+            key = self._next[key]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._items[key] for key in self.keys())
+
+    def _link(self, key: str, before: Optional[str]) -> None:
+        after = self._prev[before]
+        self._prev[key], self._next[key] = after, before
+        self._next[after] = key
+        self._prev[before] = key
+
+    def _unlink(self, key: str) -> None:
+        before, after = self._prev.pop(key), self._next.pop(key)
+        self._next[before] = after
+        self._prev[after] = before
+
+    def insert_before(self, anchor: Optional[str], item: Dict[str, Any]) -> str:
+        """Insert ``item`` before the item keyed ``anchor`` (at the end for None); returns its key."""
+        key = with_media_key(item)[MEDIA_KEY]
+        if key in self._items:
+            raise KeyError(f"Media key {key!r} is already in the list")
+        if anchor is not None and anchor not in self._items:
+            raise KeyError(anchor)
+        self._items[key] = item
+        self._link(key, anchor)
+        return key
+
+    def insert_after(self, anchor: Optional[str], item: Dict[str, Any]) -> str:
+        """Insert ``item`` after the item keyed ``anchor`` (at the start for None); returns its key."""
+        if anchor is not None and anchor not in self._items:
+            raise KeyError(anchor)
+        return self.insert_before(self._next[anchor], item)
+
+    def append(self, item: Dict[str, Any]) -> str:
+        return self.insert_before(None, item)
+
+    def move_after(self, key: str, anchor: Optional[str]) -> None:
+        """Move the item keyed ``key`` after ``anchor`` (to the start for None)."""
+        if anchor is not None and anchor not in self._items:
+            raise KeyError(anchor)
+        if key != anchor:
+            self._unlink(key)
+            self._link(key, self._next[anchor])
+
+    def remove(self, key: str) -> Dict[str, Any]:
+        self._unlink(key)
+        return self._items.pop(key)
+
+    def key_before(self, key: str) -> Optional[str]:
+        """Key of the item before ``key``, None for the first item."""
+        return self._prev[key]
+
+    def key_after(self, key: str) -> Optional[str]:
+        """Key of the item after ``key``, None for the last item."""
+        return self._next[key]
+
+
+@dataclass
+class MergedTrail:
+    """English and Hebrew documents folded into one editable record."""
+    trail_id: str = ""
+    name_en: str = ""
+    description_en: str = ""
+    name_he: str = ""
+    description_he: str = ""
+    media_list: MediaList = field(default_factory=MediaList)
+
+
+def merge_trail_documents(trail_data_en: Optional[Dict[str, Any]],
+                          trail_data_he: Optional[Dict[str, Any]]) -> MergedTrail:
+    """Merge the English and Hebrew documents of a trail.
+
+    Media items follow the English order; an item only the Hebrew document has is
+    placed right after the item it follows there. The Hebrew ``trailId`` and the Hebrew
+    media ``type``/``url`` take precedence when both documents define them.
+    """
+    merged = MergedTrail()
+    media = MediaList()
+    paired: Dict[MediaIdentity, str] = {}
+
+    for lang, trail_data in (("en", trail_data_en), ("he", trail_data_he)):
+        if trail_data is None:
+            continue
+        merged.trail_id = trail_data.get("trailId", merged.trail_id)
+        setattr(merged, f"name_{lang}", trail_data.get("name", ""))
+        setattr(merged, f"description_{lang}", trail_data.get("description", ""))
+        description = f"description_{lang}"
+        seen: Dict[str, int] = {}
+        anchor = None
+        for item in trail_data.get("media", []):
+            # Same identities as media_identities, inlined: this loop is the whole merge
+            media_id = str(item.get("id") or "")
+            identity = (media_id, seen.get(media_id, 0))
+            seen[media_id] = identity[1] + 1
+            key = paired.get(identity)
+            if key is None:
+                target = {"id": item.get("id", "")}
+                key = media.insert_after(anchor, target)
+                if media_id:
+                    paired[identity] = key
+            else:
+                target = media[key]
+            if "type" in item or "type" not in target:
+                target["type"] = item.get("type", "")
+            if "url" in item or "url" not in target:
+                target["url"] = item.get("url", "")
+            target[description] = item.get("description", "")
+            anchor = key
+
+    merged.media_list = media
+    return merged
+
+
+@dataclass
+class Mismatch:
+    kind: str  # "trailId", "missing", "type", "url", "order" or "no_id"
+    message: str
+    lang: Optional[str] = None  # the language the item is in, when only one has it
+    media_id: Optional[str] = None
+
+
+def _label(identity: MediaIdentity) -> str:
+    media_id, n = identity
+    return f"Media {media_id!r}" + (f" (#{n + 1})" if n else "")
+
+
+def find_mismatches(trail_data_en: Dict[str, Any], trail_data_he: Dict[str, Any]) -> List[Mismatch]:
+    """Differences between the English and Hebrew documents of one trail."""
+    mismatches = []
+    if trail_data_en.get("trailId") != trail_data_he.get("trailId"):
+        mismatches.append(Mismatch("trailId", f"trailId differs: en={trail_data_en.get('trailId')!r} "
+                                              f"he={trail_data_he.get('trailId')!r}"))
+    media = {}
+    for lang, trail_data in (("en", trail_data_en), ("he", trail_data_he)):
+        items = trail_data.get("media", [])
+        media[lang] = dict(zip(media_identities(items), items))
+        for i, item in enumerate(items, start=1):
+            if not item.get("id"):
+                mismatches.append(Mismatch("no_id", f"Media item {i} in {lang} has no id and cannot be matched",
+                                           lang))
+    en, he = ({identity: item for identity, item in media[lang].items() if identity[0]} for lang in LANGUAGES)
+    for lang, here, there in (("en", en, he), ("he", he, en)):
+        for identity in (identity for identity in here if identity not in there):
+            mismatches.append(Mismatch("missing", f"{_label(identity)} only in {lang}", lang, identity[0]))
+    common = [identity for identity in en if identity in he]
+    for identity in common:
+        for attr in ("type", "url"):
+            if en[identity].get(attr) != he[identity].get(attr):
+                mismatches.append(Mismatch(attr, f"{_label(identity)} has a different {attr} in en and he",
+                                           media_id=identity[0]))
+    # Items outside a longest common order are the ones that moved
+    he_position = {identity: i for i, identity in enumerate(he)}
+    in_order = set(longest_increasing([he_position[identity] for identity in common]))
+    for i, identity in enumerate(common):
+        if i not in in_order:
+            mismatches.append(Mismatch("order", f"{_label(identity)} is at a different position in en and he",
+                                       media_id=identity[0]))
+    return mismatches
+
+
+def with_media_key(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Give a media item its editor key if it does not have one yet."""
+    if MEDIA_KEY not in item:
+        # The hex of a random 128-bit value, like uuid4().hex without building a UUID
+        item[MEDIA_KEY] = os.urandom(16).hex()
+    return item
+
+
+def build_trail_json(trail_id: str, name: str, description: str,
+                     media_list: Iterable[Dict], lang_suffix: str) -> Dict[str, Any]:
+    """Build trail JSON for a specific language."""
+    return {
+        "trailId": trail_id,
+        "name": name,
+        "description": description,
+        "media": [
+            {
+                "id": m.get("id"),
+                "type": m.get("type"),
+                "url": m.get("url"),
+                "description": m.get(f"description_{lang_suffix}")
+            } for m in media_list
+        ]
+    }
+
+
+def build_trail_documents(merged: MergedTrail) -> Dict[str, Dict[str, Any]]:
+    """Per-language documents for a merged trail, keyed by language code."""
+    return {
+        lang: build_trail_json(merged.trail_id, getattr(merged, f"name_{lang}"),
+                               getattr(merged, f"description_{lang}"), merged.media_list, lang)
+        for lang in LANGUAGES
+    }